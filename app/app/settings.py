@@ -46,6 +46,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -79,12 +80,135 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+#
+# DB_ENGINE selects SQLite, the default, or PostgreSQL (needs psycopg2) with the DB_HOST, DB_PORT, DB_NAME, DB_USER and
+# DB_PASS settings. Connections are kept open between requests for DB_CONN_MAX_AGE seconds rather than opened and
+# closed by each request, 0 closing them after every request. With DB_POOLER set to pgbouncer, connections go through
+# a PgBouncer pool in transaction mode, which can't hold the server side cursors of iterator() across transactions.
+
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite3')
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+DB_POOLER = os.environ.get('DB_POOLER', '')
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '6432' if DB_POOLER == 'pgbouncer' else '5432'),
+            'NAME': os.environ.get('DB_NAME', 'app'),
+            'USER': os.environ.get('DB_USER', 'postgres'),
+            'PASSWORD': os.environ.get('DB_PASS', ''),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'DISABLE_SERVER_SIDE_CURSORS': DB_POOLER == 'pgbouncer',
+            'OPTIONS': {
+                'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', 5)),
+            },
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', os.path.join(BASE_DIR, 'db.sqlite3')),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        }
+    }
+
+# List and detail reads of the API go to the DB_REPLICAS databases, comma separated hosts for PostgreSQL or file names
+# for SQLite, except for users who wrote within DB_REPLICA_STICKY_SECONDS so they read their own writes. The window
+# should exceed the replication lag and is shared by workers through the DB_REPLICA_STICKY_CACHE_ALIAS cache.
+DATABASE_REPLICAS = []
+for index, replica in enumerate(filter(None, os.environ.get('DB_REPLICAS', '').split(','))):
+    alias = f'replica{index + 1}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST' if DB_ENGINE == 'postgresql' else 'NAME': replica,
+        'TEST': {'MIRROR': 'default'},
     }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+DB_REPLICA_STICKY_SECONDS = int(os.environ.get('DB_REPLICA_STICKY_SECONDS', 5))
+DB_REPLICA_STICKY_CACHE_ALIAS = os.environ.get('DB_REPLICA_STICKY_CACHE_ALIAS', 'default')
+
+# /readyz checks the databases, caches and media storage at most once every HEALTH_CHECK_CACHE_SECONDS per process.
+HEALTH_CHECK_CACHE_SECONDS = int(os.environ.get('HEALTH_CHECK_CACHE_SECONDS', 5))
+
+# The latency, queries, serializer time and response size of the views of METRICS_VIEW_MODULES are served on /metrics
+# in the Prometheus format, to a METRICS_TOKEN bearer when set. They are kept per process, so every worker is scraped.
+# Requests running more than METRICS_QUERY_WARNING or METRICS_QUERY_CRITICAL queries are logged, 0 disabling either.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+METRICS_VIEW_MODULES = ('recipe.views', 'user.views')
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_QUERY_WARNING = int(os.environ.get('METRICS_QUERY_WARNING', 20))
+METRICS_QUERY_CRITICAL = int(os.environ.get('METRICS_QUERY_CRITICAL', 100))
+
+# Recipe API requests are profiled when sent with an `X-Profile: <PROFILING_SECRET>` header, or at random with the
+# PROFILING_SAMPLE_RATE probability, by the 'sampler' reading their stack every PROFILING_SAMPLE_INTERVAL seconds or by
+# 'cprofile', exact but slower. Profiles of requests over PROFILING_THRESHOLD_MS, or asking for it, are stored with
+# their PROFILING_TOP_FRAMES top functions and first PROFILING_MAX_QUERIES queries, see the profiles command.
+PROFILING_SECRET = os.environ.get('PROFILING_SECRET', '')
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+PROFILING_PROFILER = os.environ.get('PROFILING_PROFILER', 'sampler')
+PROFILING_SAMPLE_INTERVAL = float(os.environ.get('PROFILING_SAMPLE_INTERVAL', 0.005))
+PROFILING_THRESHOLD_MS = int(os.environ.get('PROFILING_THRESHOLD_MS', 500))
+PROFILING_TOP_FRAMES = int(os.environ.get('PROFILING_TOP_FRAMES', 40))
+PROFILING_MAX_QUERIES = int(os.environ.get('PROFILING_MAX_QUERIES', 200))
+
+
+# Cache
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+#
+# The recipe attribute cache holds the tag and ingredient list responses. The local memory backend evicts the least
+# recently used entries but is private to each process, so deployments running several workers should point it at a
+# shared backend such as Redis to have writes invalidate every worker.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'recipe_attrs': {
+        'BACKEND': os.environ.get('RECIPE_ATTR_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('RECIPE_ATTR_CACHE_LOCATION', 'recipe-attrs'),
+        'TIMEOUT': int(os.environ.get('RECIPE_ATTR_CACHE_TIMEOUT', 300)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('RECIPE_ATTR_CACHE_MAX_ENTRIES', 10000)),
+        },
+    },
+}
+
+RECIPE_ATTR_CACHE_ALIAS = 'recipe_attrs'
+
+# Authentication tokens are cached for TOKEN_AUTH_CACHE_TTL seconds in the TOKEN_AUTH_CACHE_ALIAS cache, which must
+# be shared by every process (e.g. Redis or Memcached) for revocations to apply everywhere right away. Without an alias
+# tokens are not cached, unless TOKEN_AUTH_CACHE_LOCAL opts into a per-process LRU of TOKEN_AUTH_CACHE_SIZE entries,
+# where other processes may accept a revoked token until it expires.
+TOKEN_AUTH_CACHE_SIZE = int(os.environ.get('TOKEN_AUTH_CACHE_SIZE', 1024))
+TOKEN_AUTH_CACHE_TTL = int(os.environ.get('TOKEN_AUTH_CACHE_TTL', 60))
+TOKEN_AUTH_CACHE_ALIAS = os.environ.get('TOKEN_AUTH_CACHE_ALIAS', '')
+TOKEN_AUTH_CACHE_LOCAL = os.environ.get('TOKEN_AUTH_CACHE_LOCAL', '0') == '1'
+
+
+# Password hashing
+# New passwords are hashed with PASSWORD_HASHER: pbkdf2, argon2 (needs argon2-cffi) or bcrypt (needs bcrypt). The other
+# hashers still check existing hashes, which are rehashed with the preferred hasher and costs on the next login.
+
+PASSWORD_HASHER_CHOICES = {
+    'pbkdf2': 'core.hashers.TunablePBKDF2PasswordHasher',
+    'argon2': 'core.hashers.TunableArgon2PasswordHasher',
+    'bcrypt': 'core.hashers.TunableBCryptSHA256PasswordHasher',
 }
+PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'pbkdf2')
+PASSWORD_HASHERS = [PASSWORD_HASHER_CHOICES[PASSWORD_HASHER]] + [
+    hasher for name, hasher in PASSWORD_HASHER_CHOICES.items() if name != PASSWORD_HASHER
+] + ['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']
+
+PASSWORD_PBKDF2_ITERATIONS = int(os.environ.get('PASSWORD_PBKDF2_ITERATIONS', 150000))
+PASSWORD_ARGON2_TIME_COST = int(os.environ.get('PASSWORD_ARGON2_TIME_COST', 2))
+PASSWORD_ARGON2_MEMORY_COST = int(os.environ.get('PASSWORD_ARGON2_MEMORY_COST', 512))
+PASSWORD_ARGON2_PARALLELISM = int(os.environ.get('PASSWORD_ARGON2_PARALLELISM', 2))
+PASSWORD_BCRYPT_ROUNDS = int(os.environ.get('PASSWORD_BCRYPT_ROUNDS', 12))
 
 
 # Password validation
@@ -129,6 +253,50 @@ MEDIA_URL = '/media/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Media files are cached by clients for MEDIA_CACHE_MAX_AGE seconds. Set MEDIA_SENDFILE_HEADER to X-Sendfile, or to
+# X-Accel-Redirect with the internal location MEDIA_ACCEL_REDIRECT_PREFIX, to let the front server send the files.
+MEDIA_CACHE_MAX_AGE = int(os.environ.get('MEDIA_CACHE_MAX_AGE', 365 * 24 * 60 * 60))
+MEDIA_SENDFILE_HEADER = os.environ.get('MEDIA_SENDFILE_HEADER', '')
+MEDIA_ACCEL_REDIRECT_PREFIX = os.environ.get('MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+
 
 # Custom User model
 AUTH_USER_MODEL = 'core.User'
+
+
+# Django REST framework
+# https://www.django-rest-framework.org/api-guide/settings/
+
+REST_FRAMEWORK = {
+    'PAGE_SIZE': int(os.environ.get('API_PAGE_SIZE', 100)),
+}
+
+# Pagination is set per view set, PAGE_SIZE only provides their default page size.
+SILENCED_SYSTEM_CHECKS = ['rest_framework.W001']
+
+API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', 1000))
+
+RECIPE_BULK_MAX_ITEMS = int(os.environ.get('RECIPE_BULK_MAX_ITEMS', 10000))
+
+# Recipe image variants are generated by a pool of RECIPE_IMAGE_WORKERS threads, or in the request with 'sync'.
+RECIPE_IMAGE_PROCESSING = os.environ.get('RECIPE_IMAGE_PROCESSING', 'thread')
+RECIPE_IMAGE_WORKERS = int(os.environ.get('RECIPE_IMAGE_WORKERS', 2))
+RECIPE_IMAGE_QUALITY = int(os.environ.get('RECIPE_IMAGE_QUALITY', 85))
+# Images pending or processing for longer are assumed lost with their process and processed again by retry_images.
+RECIPE_IMAGE_STALLED_TIMEOUT = int(os.environ.get('RECIPE_IMAGE_STALLED_TIMEOUT', 600))
+
+# Uploaded recipe images are refused past RECIPE_IMAGE_MAX_UPLOAD_SIZE bytes or RECIPE_IMAGE_MAX_PIXELS pixels.
+RECIPE_IMAGE_MAX_UPLOAD_SIZE = int(os.environ.get('RECIPE_IMAGE_MAX_UPLOAD_SIZE', 10 * 2 ** 20))
+RECIPE_IMAGE_MAX_PIXELS = int(os.environ.get('RECIPE_IMAGE_MAX_PIXELS', 40000000))
+RECIPE_IMAGE_FORMATS = os.environ.get('RECIPE_IMAGE_FORMATS', 'JPEG,PNG,WEBP,GIF').split(',')
+
+# Image files are shared by content, so unreferenced ones are only deleted once untouched for this many seconds.
+RECIPE_IMAGE_ORPHAN_GRACE = int(os.environ.get('RECIPE_IMAGE_ORPHAN_GRACE', 300))
+
+# Recipe search uses an FTS5 table on SQLite builds that have it with 'auto', and the portable term index otherwise
+# or with 'index'. Run rebuild_search_index after changing it.
+RECIPE_SEARCH_BACKEND = os.environ.get('RECIPE_SEARCH_BACKEND', 'auto')
+
+# Delta sync: seconds a sync token is backdated by, and days deletions are kept for. Older tokens need a full sync.
+SYNC_TOKEN_OVERLAP = int(os.environ.get('SYNC_TOKEN_OVERLAP', 5))
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.environ.get('SYNC_TOMBSTONE_RETENTION_DAYS', 30))
@@ -15,12 +15,17 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from django.conf.urls.static import static
 from django.conf import settings
 
+from core.views import healthz, readyz, serve_media, serve_metrics
+
 
 urlpatterns = [
+    path('healthz', healthz, name='healthz'),
+    path('readyz', readyz, name='readyz'),
+    path('metrics', serve_metrics, name='metrics'),
     path('admin/', admin.site.urls),
     path('api/users/', include('user.urls')),
     path('api/recipe/', include('recipe.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    path(f'{settings.MEDIA_URL.lstrip("/")}<path:path>', serve_media, name='media'),
+]
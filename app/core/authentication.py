@@ -0,0 +1,113 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+class LocalTokenCache:
+    """Thread safe LRU of at most `max_size` entries, each expiring `ttl` seconds after it is set."""
+
+    def __init__(self, max_size: int, ttl: int) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_local_cache = LocalTokenCache(settings.TOKEN_AUTH_CACHE_SIZE, settings.TOKEN_AUTH_CACHE_TTL)
+
+
+def _cache_key(key: str) -> str:
+    return f'auth-token:{key}'
+
+
+def get_cached_token(key: str) -> Optional[Token]:
+    """Return the token `key` with its user from the cache, a fresh copy on each call."""
+    if settings.TOKEN_AUTH_CACHE_ALIAS:
+        data = caches[settings.TOKEN_AUTH_CACHE_ALIAS].get(_cache_key(key))
+    elif settings.TOKEN_AUTH_CACHE_LOCAL:
+        data = _local_cache.get(key)
+    else:
+        data = None
+
+    return pickle.loads(data) if data is not None else None
+
+
+def cache_token(token: Token) -> None:
+    """Cache a token with its user, pickled so requests never share or mutate the cached instances."""
+    if settings.TOKEN_AUTH_CACHE_ALIAS:
+        caches[settings.TOKEN_AUTH_CACHE_ALIAS].set(
+            _cache_key(token.key), pickle.dumps(token), settings.TOKEN_AUTH_CACHE_TTL
+        )
+    elif settings.TOKEN_AUTH_CACHE_LOCAL:
+        _local_cache.set(token.key, pickle.dumps(token))
+
+
+def invalidate_token(key: str) -> None:
+    """Remove a token from the cache, so its next use is checked against the database again."""
+    if settings.TOKEN_AUTH_CACHE_ALIAS:
+        caches[settings.TOKEN_AUTH_CACHE_ALIAS].delete(_cache_key(key))
+    _local_cache.delete(key)
+
+
+def invalidate_user_tokens(user_ids: Iterable[int]) -> None:
+    """
+    Remove the tokens of users from the cache.
+
+    Saving a user calls this through a signal. Writes bypassing the signals, such as deactivating users with
+    `QuerySet.update()`, must call it themselves, else the cached tokens stay valid until they expire.
+    """
+    for key in Token.objects.filter(user_id__in=user_ids).values_list('key', flat=True):
+        invalidate_token(key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication caching the token and its user for `TOKEN_AUTH_CACHE_TTL` seconds.
+
+    Tokens are cached in the `TOKEN_AUTH_CACHE_ALIAS` cache, which should be shared by all processes: deleting a token
+    or saving its user then invalidates it everywhere right away. Without an alias tokens are looked up on every
+    request, unless `TOKEN_AUTH_CACHE_LOCAL` enables a per-process LRU, where other processes than the one revoking a
+    token keep accepting it until it expires. Bulk writes skipping the signals must call `invalidate_user_tokens()`.
+    """
+
+    def authenticate_credentials(self, key: str) -> Tuple:
+        token = get_cached_token(key)
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            cache_token(token)
+
+        return token.user, token
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, BCryptSHA256PasswordHasher, PBKDF2PasswordHasher
+
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2 hasher running `PASSWORD_PBKDF2_ITERATIONS` iterations."""
+
+    @property
+    def iterations(self) -> int:
+        return settings.PASSWORD_PBKDF2_ITERATIONS
+
+
+class TunableArgon2PasswordHasher(Argon2PasswordHasher):
+    """Argon2 hasher with the `PASSWORD_ARGON2_*` costs, needs argon2-cffi."""
+
+    @property
+    def time_cost(self) -> int:
+        return settings.PASSWORD_ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self) -> int:
+        return settings.PASSWORD_ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self) -> int:
+        return settings.PASSWORD_ARGON2_PARALLELISM
+
+
+class TunableBCryptSHA256PasswordHasher(BCryptSHA256PasswordHasher):
+    """bcrypt hasher with `PASSWORD_BCRYPT_ROUNDS` rounds, needs bcrypt."""
+
+    @property
+    def rounds(self) -> int:
+        return settings.PASSWORD_BCRYPT_ROUNDS
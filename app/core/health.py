@@ -0,0 +1,75 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from functools import partial
+from typing import Callable, Dict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+from core.storage import content_storage
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_results = {}
+
+
+def check_database(alias: str) -> None:
+    """Run a trivial query on a database, connecting to it if needed."""
+    with connections[alias].cursor() as cursor:
+        cursor.execute('SELECT 1')
+
+
+def check_cache(alias: str) -> None:
+    """Write, read back and delete a key in a cache."""
+    cache = caches[alias]
+    key = f'health-check:{uuid.uuid4().hex}'
+    cache.set(key, 'ok', 10)
+    if cache.get(key) != 'ok':
+        raise RuntimeError(f'Cache {alias} lost a key.')
+    cache.delete(key)
+
+
+def check_storage() -> None:
+    """Check that uploaded files can be written to the media storage."""
+    location = content_storage.location
+    os.makedirs(location, exist_ok=True)
+    if not os.access(location, os.W_OK | os.X_OK):
+        raise PermissionError(f'{location} is not writable.')
+
+
+def checks() -> Dict[str, Callable[[], None]]:
+    """Return the checks of readiness by name: every database, every cache and the media storage."""
+    return {
+        **{f'database:{alias}': partial(check_database, alias) for alias in connections},
+        **{f'cache:{alias}': partial(check_cache, alias) for alias in settings.CACHES},
+        'storage': check_storage,
+    }
+
+
+def run_checks() -> Dict[str, bool]:
+    """
+    Return whether each check passes, reusing the results of the last `HEALTH_CHECK_CACHE_SECONDS` seconds.
+
+    Checks run one probe at a time, so concurrent probes wait for the running checks and share their results rather
+    than all hitting the database.
+    """
+    results = {}
+    with _lock:
+        for name, check in checks().items():
+            expires, ok = _results.get(name, (0, False))
+            if expires <= time.monotonic():
+                try:
+                    check()
+                    ok = True
+                except Exception:
+                    logger.exception('Health check %s failed.', name)
+                    ok = False
+                _results[name] = (time.monotonic() + settings.HEALTH_CHECK_CACHE_SECONDS, ok)
+            results[name] = ok
+
+    return results
@@ -0,0 +1,67 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory
+from rest_framework.authtoken.models import Token
+
+
+class Command(BaseCommand):
+    """Django command to compare the request latency with connections closed after each request and kept open."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Number of timed requests per setting.')
+        parser.add_argument('--path', default='/api/recipe/stats/', help='Authenticated path requested.')
+        parser.add_argument('--host', default='localhost', help='Host header of the requests, one of ALLOWED_HOSTS.')
+        parser.add_argument('--max-age', type=int, default=settings.DB_CONN_MAX_AGE or 600,
+                            help='CONN_MAX_AGE compared with closing connections after each request.')
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.create_user(email='benchmark-connections@example.com')
+        token = Token.objects.create(user=user)
+        settings_dict = connections['default'].settings_dict
+        max_age = settings_dict['CONN_MAX_AGE']
+        try:
+            for conn_max_age in (0, options['max_age']):
+                settings_dict['CONN_MAX_AGE'] = conn_max_age
+                self.run(conn_max_age, options['path'], options['host'], token.key, options['requests'])
+        except Exception as exc:
+            raise CommandError(f'Benchmark failed: {exc}') from exc
+        finally:
+            settings_dict['CONN_MAX_AGE'] = max_age
+            connections['default'].close()
+            user.delete()
+
+    def run(self, conn_max_age: int, path: str, host: str, token: str, requests: int) -> None:
+        """
+        Time `requests` sequential requests through the WSGI handler, which closes old connections as a server does.
+
+        The Django test client keeps the connection open between requests, so it can't show the difference.
+        """
+        handler = WSGIHandler()
+        environ = RequestFactory().get(path, HTTP_HOST=host, HTTP_AUTHORIZATION=f'Token {token}').environ
+        opened = []
+
+        def count_connection(sender, connection, **kwargs):
+            opened.append(connection.alias)
+
+        connections['default'].close()
+        connection_created.connect(count_connection)
+        try:
+            start = time.perf_counter()
+            for _ in range(requests):
+                response = handler(dict(environ), lambda status, headers: None)
+                response.close()
+                if response.status_code != 200:
+                    raise CommandError(f'{path} returned {response.status_code}.')
+            elapsed = time.perf_counter() - start
+        finally:
+            connection_created.disconnect(count_connection)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'CONN_MAX_AGE={conn_max_age}: {requests} requests in {elapsed:.2f} s, '
+            f'{elapsed / requests * 1000:.2f} ms per request, {len(opened)} connections opened'))
@@ -0,0 +1,73 @@
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core import profiling
+from core.models import RequestProfile
+
+
+class Command(BaseCommand):
+    """Django command to list, show and summarize the stored request profiles."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', nargs='?', choices=('list', 'show', 'summary', 'prune'), default='list')
+        parser.add_argument('profile_id', nargs='?', type=int, help='Profile to show.')
+        parser.add_argument('--view', help='Only the profiles of this view, such as RecipeViewSet.list.')
+        parser.add_argument('--limit', type=int, default=20, help='Number of profiles, frames or queries shown.')
+        parser.add_argument('--days', type=int, default=7, help='Age in days of the profiles pruned.')
+
+    def handle(self, *args, **options):
+        profiles = RequestProfile.objects.all()
+        if options['view']:
+            profiles = profiles.filter(view=options['view'])
+        getattr(self, f'handle_{options["action"]}')(profiles, options)
+
+    def handle_list(self, profiles, options):
+        """Print the latest profiles."""
+        for profile in profiles.defer('frames', 'queries').order_by('-created')[:options['limit']]:
+            self.stdout.write(
+                f'{profile.pk:>6} {profile.created:%Y-%m-%d %H:%M:%S} {profile.duration_ms:>9.1f} ms '
+                f'{profile.query_count:>4} queries {profile.status_code} {profile.method} {profile.path} '
+                f'[{profile.view}, {profile.profiler}]'
+            )
+
+    def handle_show(self, profiles, options):
+        """Print the top frames and queries of a profile."""
+        if options['profile_id'] is None:
+            raise CommandError('Give the ID of the profile to show.')
+        profile = profiles.filter(pk=options['profile_id']).first()
+        if profile is None:
+            raise CommandError(f'Profile {options["profile_id"]} not found.')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{profile.method} {profile.path} [{profile.view}]: {profile.status_code} in {profile.duration_ms:.1f} ms, '
+            f'{profile.query_count} queries in {profile.query_duration_ms:.1f} ms, {profile.profiler}'
+        ))
+        self.stdout.write('\ncumulative ms    self ms    calls  function')
+        for frame in json.loads(profile.frames)[:options['limit']]:
+            calls = '' if frame['calls'] is None else frame['calls']
+            self.stdout.write(
+                f'{frame["cumulative_ms"]:>13.1f} {frame["self_ms"]:>10.1f} {calls:>8}  {frame["function"]}')
+        self.stdout.write('\nqueries')
+        for query in json.loads(profile.queries)[:options['limit']]:
+            self.stdout.write(f'{query["duration_ms"]:>9.2f} ms  {query["sql"]}')
+
+    def handle_summary(self, profiles, options):
+        """Print the latency of the profiled views and the functions they spend the most time in."""
+        self.stdout.write('profiles  average ms   p95 ms   max ms  queries  view')
+        for view, summary in profiling.summarize(profiles):
+            self.stdout.write(
+                f'{summary["count"]:>8} {summary["average_ms"]:>11.1f} {summary["p95_ms"]:>8.1f} '
+                f'{summary["max_ms"]:>8.1f} {summary["average_queries"]:>8.1f}  {view}'
+            )
+        self.stdout.write('\ncumulative ms  profiles  function')
+        for function, cumulative_ms, count in profiling.hot_frames(profiles, options['limit']):
+            self.stdout.write(f'{cumulative_ms:>13.1f} {count:>9}  {function}')
+
+    def handle_prune(self, profiles, options):
+        """Delete the profiles older than `--days`."""
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        count, _ = profiles.filter(created__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {count} profiles.'))
@@ -1,21 +1,49 @@
 import time
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.db import connections
 from django.db.utils import OperationalError
 
 
 class Command(BaseCommand):
-    """Django command to pause execution until database is available."""
+    """
+    Django command to pause execution until the databases accept connections.
+
+    Every database is connected to for real, retrying with exponentially growing delays until `--timeout` seconds.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', action='append', dest='databases',
+                            help='Alias of a database to wait for, may be repeated. Defaults to all.')
+        parser.add_argument('--timeout', type=float, default=60, help='Seconds to wait before giving up.')
+        parser.add_argument('--delay', type=float, default=0.5, help='Seconds to wait before the first retry.')
+        parser.add_argument('--max-delay', type=float, default=5, help='Longest wait between two retries.')
 
     def handle(self, *args, **options):
-        self.stdout.write('Waiting for database...')
-        db_conn = None
-        while not db_conn:
+        aliases = options['databases'] or list(connections)
+        unknown = [alias for alias in aliases if alias not in connections.databases]
+        if unknown:
+            raise CommandError(f'Unknown databases: {", ".join(unknown)}.')
+
+        deadline = time.monotonic() + options['timeout']
+        for alias in aliases:
+            self.wait_for(alias, deadline, options['delay'], options['max_delay'])
+
+    def wait_for(self, alias: str, deadline: float, delay: float, max_delay: float) -> None:
+        """Connect to a database, retrying until `deadline`."""
+        self.stdout.write(f'Waiting for database {alias}...')
+        connection = connections[alias]
+        while True:
             try:
-                db_conn = connections['default']
-            except OperationalError:
-                self.stdout.write('Database unavailable, waiting for 1 second...')
-                time.sleep(1)
+                connection.ensure_connection()
+                break
+            except OperationalError as exc:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise CommandError(f'Database {alias} unavailable: {exc}')
+                delay = min(delay, max_delay, remaining)
+                self.stdout.write(f'Database {alias} unavailable, waiting for {delay:.1f} seconds...')
+                time.sleep(delay)
+                delay *= 2
 
-        self.stdout.write(self.style.SUCCESS('Database available!!!'))
+        self.stdout.write(self.style.SUCCESS(f'Database {alias} available!!!'))
@@ -0,0 +1,193 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+_current = threading.local()
+_collectors = []
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    labels = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        labels.append(extra)
+
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """Thread safe Prometheus counter, by label values."""
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] += amount
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        with self._lock:
+            return [(self.name, _format_labels(self.labels, key), value) for key, value in sorted(self._values.items())]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram:
+    """Thread safe Prometheus histogram, by label values, counting observations in cumulative `buckets`."""
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str], buckets: Sequence[float]) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # Per label values: the number of observations falling in each bucket, the last one being +Inf, and their sum.
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, *label_values: str, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(label_values) or ([0] * (len(self.buckets) + 1), 0)
+            counts[index] += 1
+            self._values[label_values] = (counts, total + value)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        with self._lock:
+            values = sorted((key, list(counts), total) for key, (counts, total) in self._values.items())
+
+        samples = []
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'), ), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                samples.append((f'{self.name}_bucket', _format_labels(self.labels, key, f'le="{le}"'), cumulative))
+            samples.append((f'{self.name}_sum', _format_labels(self.labels, key), total))
+            samples.append((f'{self.name}_count', _format_labels(self.labels, key), cumulative))
+
+        return samples
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+REQUEST_DURATION = Histogram('api_request_duration_seconds', 'Time to build the response of an API view.',
+                             ('view', 'method', 'status'), LATENCY_BUCKETS)
+DB_QUERIES = Histogram('api_request_db_queries', 'Database queries run per API request.', ('view', ), QUERY_BUCKETS)
+DB_DURATION = Histogram('api_request_db_duration_seconds', 'Time spent in database queries per API request.',
+                        ('view', ), LATENCY_BUCKETS)
+SERIALIZER_DURATION = Histogram('api_request_serializer_duration_seconds',
+                                'Time spent validating and rendering serializers per API request.', ('view', ),
+                                LATENCY_BUCKETS)
+RESPONSE_SIZE = Histogram('api_response_size_bytes', 'Size of the API response bodies.', ('view', ), SIZE_BUCKETS)
+QUERY_THRESHOLD = Counter('api_requests_over_query_threshold_total',
+                          'API requests running more queries than a threshold.', ('view', 'threshold'))
+METRICS = [REQUEST_DURATION, DB_QUERIES, DB_DURATION, SERIALIZER_DURATION, RESPONSE_SIZE, QUERY_THRESHOLD]
+
+
+class RequestMetrics:
+    """Measures of the request the current thread is serving."""
+
+    def __init__(self) -> None:
+        self.queries = 0
+        self.db_duration = 0.0
+        self.serializer_duration = 0.0
+        self.serializer_depth = 0
+
+    def execute_wrapper(self, execute: Callable, sql: str, params, many: bool, context: dict):
+        """Database execute wrapper counting and timing the queries."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_duration += time.perf_counter() - start
+            self.queries += 1
+
+
+def start_request() -> RequestMetrics:
+    """Start measuring the request served by the current thread."""
+    _current.request = RequestMetrics()
+
+    return _current.request
+
+
+def end_request() -> None:
+    _current.request = None
+
+
+def current_request() -> Optional[RequestMetrics]:
+    """Return the measures of the request the current thread is serving, None when it isn't measured."""
+    return getattr(_current, 'request', None)
+
+
+class TimedSerializerMixin:
+    """
+    Serializer mixin adding the time spent validating and rendering the data to the metrics of the current request.
+
+    Nested serializers run within their parent, so only the outermost ones are timed.
+    """
+
+    def run_validation(self, *args, **kwargs):
+        return self._timed(super().run_validation, *args, **kwargs)
+
+    def to_representation(self, *args, **kwargs):
+        return self._timed(super().to_representation, *args, **kwargs)
+
+    @staticmethod
+    def _timed(method: Callable, *args, **kwargs):
+        metrics = current_request()
+        if metrics is None or metrics.serializer_depth:
+            return method(*args, **kwargs)
+
+        metrics.serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            metrics.serializer_duration += time.perf_counter() - start
+            metrics.serializer_depth -= 1
+
+
+def register_collector(collector: Callable[[], Dict[Tuple[str, str, str], List[Tuple[str, str, float]]]]) -> None:
+    """
+    Add the metrics returned by `collector` to the rendered ones.
+
+    It is called on every scrape and maps the (name, type, documentation) of its metrics to their samples.
+    """
+    _collectors.append(collector)
+
+
+def render() -> str:
+    """Return the metrics in the Prometheus text format."""
+    families = [((metric.name, metric.type, metric.documentation), metric.samples()) for metric in METRICS]
+    for collector in _collectors:
+        families.extend(collector().items())
+    lines = []
+    for (name, metric_type, documentation), samples in families:
+        lines.append(f'# HELP {name} {documentation}')
+        lines.append(f'# TYPE {name} {metric_type}')
+        lines.extend(f'{sample}{labels} {_format_value(value)}' for sample, labels, value in samples)
+
+    return '\n'.join(lines) + '\n'
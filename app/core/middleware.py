@@ -0,0 +1,78 @@
+import logging
+import time
+from contextlib import ExitStack
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpRequest, HttpResponse
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def view_name(request: HttpRequest) -> Optional[str]:
+    """Return the name of the DRF view and action serving a request, None outside of `METRICS_VIEW_MODULES`."""
+    match = request.resolver_match
+    view_class = getattr(match.func, 'cls', None) if match else None
+    if view_class is None or view_class.__module__ not in settings.METRICS_VIEW_MODULES:
+        return None
+
+    actions = getattr(match.func, 'actions', None)
+    action = actions.get(request.method.lower(), request.method.lower()) if actions else request.method.lower()
+    return f'{view_class.__module__}.{view_class.__name__}.{action}'
+
+
+class MetricsMiddleware:
+    """
+    Record the latency, database queries, serializer time and response size of the API views.
+
+    Queries are counted by an execute wrapper on each connection and serializers timed by TimedSerializerMixin, which
+    only cost a couple of clock reads each, so the metrics can stay on in production. Requests running more than
+    `METRICS_QUERY_WARNING` or `METRICS_QUERY_CRITICAL` queries are logged with their view. The body of streaming
+    responses is produced after the response is returned, so their queries and size are not counted.
+    """
+
+    def __init__(self, get_response: Callable) -> None:
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        request_metrics = metrics.start_request()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(request_metrics.execute_wrapper))
+                response = self.get_response(request)
+        finally:
+            metrics.end_request()
+        duration = time.perf_counter() - start
+
+        view = view_name(request)
+        if view is not None:
+            self.record(view, request, response, request_metrics, duration)
+
+        return response
+
+    @staticmethod
+    def record(view: str, request: HttpRequest, response: HttpResponse, request_metrics: metrics.RequestMetrics,
+               duration: float) -> None:
+        metrics.REQUEST_DURATION.observe(view, request.method, str(response.status_code), value=duration)
+        metrics.DB_QUERIES.observe(view, value=request_metrics.queries)
+        metrics.DB_DURATION.observe(view, value=request_metrics.db_duration)
+        metrics.SERIALIZER_DURATION.observe(view, value=request_metrics.serializer_duration)
+        if not response.streaming:
+            metrics.RESPONSE_SIZE.observe(view, value=len(response.content))
+
+        for threshold, level in ((settings.METRICS_QUERY_CRITICAL, logging.ERROR),
+                                 (settings.METRICS_QUERY_WARNING, logging.WARNING)):
+            if threshold and request_metrics.queries > threshold:
+                metrics.QUERY_THRESHOLD.inc(view, str(threshold))
+                logger.log(level, '%s %s ran %d queries in %.1f ms, over the threshold of %d.', request.method,
+                           request.get_full_path(), request_metrics.queries, request_metrics.db_duration * 1000,
+                           threshold)
+                break
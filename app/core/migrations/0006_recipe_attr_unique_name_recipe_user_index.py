@@ -0,0 +1,45 @@
+# Generated by Django 2.2.28 on 2026-10-18 03:38
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_names(apps, schema_editor):
+    """Merge tags and ingredients sharing a name for the same user into the oldest one."""
+    Recipe = apps.get_model('core', 'Recipe')
+    for model_name, relation in (('Tag', 'tags'), ('Ingredient', 'ingredients')):
+        model = apps.get_model('core', model_name)
+        through = getattr(Recipe, relation).through
+        field = f'{model_name.lower()}_id'
+        duplicates = model.objects.values('user', 'name').annotate(keep=Min('id'), count=Count('id')).filter(count__gt=1)
+        for duplicate in duplicates:
+            others = model.objects.filter(user=duplicate['user'], name=duplicate['name']).exclude(id=duplicate['keep'])
+            linked = through.objects.filter(**{field: duplicate['keep']}).values('recipe_id')
+            for other in others:
+                through.objects.filter(**{field: other.id}).exclude(recipe_id__in=linked).update(
+                    **{field: duplicate['keep']}
+                )
+            others.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_recipe_image'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_names, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'id'], name='recipe_user_id_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='unique_ingredient_name_per_user'),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='unique_tag_name_per_user'),
+        ),
+    ]
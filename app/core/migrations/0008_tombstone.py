@@ -0,0 +1,27 @@
+# Generated by Django 2.2.28 on 2026-10-18 03:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_modified_timestamps'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.IntegerField()),
+                ('model', models.CharField(max_length=32)),
+                ('object_id', models.IntegerField()),
+                ('deleted', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['user_id', 'model', 'deleted'], name='tombstone_user_model_idx'),
+        ),
+    ]
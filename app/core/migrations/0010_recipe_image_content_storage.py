@@ -0,0 +1,25 @@
+# Generated by Django 2.2.28 on 2026-10-18 03:49
+
+import core.models
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(null=True, storage=core.storage.ContentAddressedStorage(), upload_to=core.models.recipe_image_file_path),
+        ),
+        migrations.AlterField(
+            model_name='recipeimagevariant',
+            name='image',
+            field=models.ImageField(height_field='height', storage=core.storage.ContentAddressedStorage(), upload_to=core.models.recipe_image_variant_file_path, width_field='width'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 2.2.28 on 2026-10-18 03:54
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.utils import OperationalError
+import django.db.models.deletion
+
+
+def create_fts_table(apps, schema_editor):
+    """Create the FTS5 recipe search table on SQLite builds that have FTS5, others use the portable index."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE recipe_search_fts USING fts5("
+            "title, tags, ingredients, owner, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+    except OperationalError:
+        pass
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS recipe_search_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_recipe_image_content_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSearchTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.PositiveSmallIntegerField()),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='core.Recipe')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='recipesearchterm',
+            index=models.Index(fields=['user', 'term'], name='recipe_search_user_term_idx'),
+        ),
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 2.2.28 on 2026-10-18 04:04
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_recipe_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='recipe_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('recipe_count', models.IntegerField(default=0)),
+                ('time_minutes_total', models.BigIntegerField(default=0)),
+                ('price_total', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RecipeStatsValue',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(max_length=16)),
+                ('value', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RecipeStatsUsage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('relation', models.CharField(max_length=16)),
+                ('object_id', models.IntegerField()),
+                ('count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='recipestatsvalue',
+            constraint=models.UniqueConstraint(fields=('user', 'field', 'value'), name='unique_recipe_stats_value'),
+        ),
+        migrations.AddIndex(
+            model_name='recipestatsusage',
+            index=models.Index(fields=['user', 'relation', '-count'], name='recipe_stats_usage_top_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipestatsusage',
+            constraint=models.UniqueConstraint(fields=('user', 'relation', 'object_id'), name='unique_recipe_stats_usage'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 2.2.28 on 2026-10-18 04:19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_recipe_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('method', models.CharField(max_length=10)),
+                ('path', models.CharField(max_length=2048)),
+                ('view', models.CharField(max_length=255)),
+                ('status_code', models.PositiveSmallIntegerField()),
+                ('duration_ms', models.FloatField()),
+                ('profiler', models.CharField(max_length=16)),
+                ('query_count', models.PositiveIntegerField()),
+                ('query_duration_ms', models.FloatField()),
+                ('frames', models.TextField()),
+                ('queries', models.TextField()),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='requestprofile',
+            index=models.Index(fields=['view', '-created'], name='request_profile_view_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='requestprofile',
+            index=models.Index(fields=['-created'], name='request_profile_created_idx'),
+        ),
+    ]
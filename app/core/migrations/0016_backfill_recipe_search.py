@@ -0,0 +1,81 @@
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import migrations
+
+# Frozen copies of the index format of recipe.search when this migration was written, so later changes to the app
+# code don't change what the migration does.
+FTS_TABLE = 'recipe_search_fts'
+WEIGHTS = {'title': 3, 'tags': 2, 'ingredients': 1}
+TERM_MAX_LENGTH = 64
+TERM_RE = re.compile(r'\w+')
+BATCH_SIZE = 500
+
+
+def tokenize(text):
+    text = ''.join(c for c in unicodedata.normalize('NFKD', text.lower()) if not unicodedata.combining(c))
+    return TERM_RE.findall(text)
+
+
+def backfill_search_index(apps, schema_editor):
+    """
+    Index the recipes that existed before the search index, in the FTS5 table when searches use it, else in the term
+    index. Recipes written afterwards are indexed as they are saved. Existing entries are replaced, so recipes already
+    indexed since the index was created are not duplicated.
+    """
+    Recipe = apps.get_model('core', 'Recipe')
+    RecipeSearchTerm = apps.get_model('core', 'RecipeSearchTerm')
+    connection = schema_editor.connection
+    use_fts = settings.RECIPE_SEARCH_BACKEND == 'auto' and connection.vendor == 'sqlite' \
+        and FTS_TABLE in connection.introspection.table_names()
+
+    recipes = Recipe.objects.using(connection.alias).order_by('pk')
+    last_pk = 0
+    while True:
+        batch = list(recipes.filter(pk__gt=last_pk).prefetch_related('tags', 'ingredients')[:BATCH_SIZE])
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+
+        documents = {
+            recipe.pk: {
+                'user_id': recipe.user_id,
+                'title': recipe.title,
+                'tags': ' '.join(tag.name for tag in recipe.tags.all()),
+                'ingredients': ' '.join(ingredient.name for ingredient in recipe.ingredients.all()),
+            }
+            for recipe in batch
+        }
+        if use_fts:
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({", ".join(["%s"] * len(documents))})',
+                               list(documents))
+                cursor.executemany(
+                    f'INSERT INTO {FTS_TABLE} (rowid, title, tags, ingredients, owner) VALUES (%s, %s, %s, %s, %s)',
+                    [(pk, doc['title'], doc['tags'], doc['ingredients'], f'u{doc["user_id"]}')
+                     for pk, doc in documents.items()],
+                )
+            continue
+
+        entries = []
+        for pk, doc in documents.items():
+            weights = {}
+            for field, weight in WEIGHTS.items():
+                for term in set(tokenize(doc[field])):
+                    weights[term[:TERM_MAX_LENGTH]] = weights.get(term[:TERM_MAX_LENGTH], 0) + weight
+            entries.extend(RecipeSearchTerm(user_id=doc['user_id'], recipe_id=pk, term=term, weight=weight)
+                           for term, weight in weights.items())
+        RecipeSearchTerm.objects.using(connection.alias).filter(recipe_id__in=documents).delete()
+        RecipeSearchTerm.objects.using(connection.alias).bulk_create(entries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_sync_modified_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_search_index, migrations.RunPython.noop),
+    ]
@@ -1,17 +1,24 @@
-import uuid
 import os
 
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.db import models
 from django.contrib.auth import settings
 
+from core.storage import content_storage
+
 
 def recipe_image_file_path(instance, filename: str):
-    """Generate file path for new recipe image."""
-    ext = filename.split('.')[-1]
-    filename = f'{uuid.uuid4()}.{ext}'
+    """Generate file path for new recipe image, which the storage names after the hash of its content."""
+    ext = filename.split('.')[-1].lower()
+
+    return os.path.join('uploads/recipe/', f'image.{ext}')
+
 
-    return os.path.join('uploads/recipe/', filename)
+def recipe_image_variant_file_path(instance, filename: str):
+    """Generate file path for new recipe image variant, which the storage names after the hash of its content."""
+    ext = filename.split('.')[-1].lower()
+
+    return os.path.join('uploads/recipe/variants/', f'variant.{ext}')
 
 
 class UserManager(BaseUserManager):
@@ -52,6 +59,15 @@ class Tag(models.Model):
     """Tag to be used for recipes."""
     name = models.CharField(max_length=255)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    modified = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'name'], name='unique_tag_name_per_user'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'modified'], name='tag_user_modified_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -61,11 +77,32 @@ class Ingredient(models.Model):
     """Ingredient to be used in recipes."""
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     name = models.CharField(max_length=255)
+    modified = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'name'], name='unique_ingredient_name_per_user'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'modified'], name='ingredient_user_modified_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
 
+IMAGE_PENDING = 'pending'
+IMAGE_PROCESSING = 'processing'
+IMAGE_READY = 'ready'
+IMAGE_FAILED = 'failed'
+IMAGE_STATUS_CHOICES = (
+    (IMAGE_PENDING, 'Pending'),
+    (IMAGE_PROCESSING, 'Processing'),
+    (IMAGE_READY, 'Ready'),
+    (IMAGE_FAILED, 'Failed'),
+)
+
+
 class Recipe(models.Model):
     """Recipe object."""
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -77,7 +114,141 @@ class Recipe(models.Model):
     time_minutes = models.IntegerField()
     price = models.DecimalField(max_digits=5, decimal_places=2)
     link = models.CharField(max_length=255, blank=True)
-    image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    image = models.ImageField(null=True, upload_to=recipe_image_file_path, storage=content_storage)
+    image_status = models.CharField(max_length=16, blank=True, choices=IMAGE_STATUS_CHOICES)
+    modified = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'], name='recipe_user_id_idx'),
+            models.Index(fields=['user', 'title'], name='recipe_user_title_idx'),
+            models.Index(fields=['user', 'time_minutes'], name='recipe_user_time_idx'),
+            models.Index(fields=['user', 'price'], name='recipe_user_price_idx'),
+            models.Index(fields=['user', 'modified'], name='recipe_user_modified_idx'),
+        ]
 
     def __str__(self):
         return self.title
+
+
+class RecipeSearchTerm(models.Model):
+    """Entry of the portable recipe search index: a term of a recipe and the weight of the fields it appears in."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    recipe = models.ForeignKey('Recipe', on_delete=models.CASCADE, related_name='search_terms')
+    term = models.CharField(max_length=64)
+    weight = models.PositiveSmallIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'term'], name='recipe_search_user_term_idx'),
+        ]
+
+    def __str__(self):
+        return self.term
+
+
+class RecipeImageVariant(models.Model):
+    """Resized copy of a recipe image."""
+    recipe = models.ForeignKey('Recipe', on_delete=models.CASCADE, related_name='image_variants')
+    name = models.CharField(max_length=32)
+    image = models.ImageField(upload_to=recipe_image_variant_file_path, storage=content_storage,
+                              width_field='width', height_field='height')
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['recipe', 'name'], name='unique_variant_name_per_recipe'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} ({self.name})'
+
+
+class RecipeStats(models.Model):
+    """Running totals of the recipes of a user, kept up to date as recipes are written."""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True,
+                                related_name='recipe_stats')
+    recipe_count = models.IntegerField(default=0)
+    time_minutes_total = models.BigIntegerField(default=0)
+    price_total = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f'{self.recipe_count} recipes'
+
+
+class RecipeStatsValue(models.Model):
+    """Number of recipes of a user with a given time or price, the histogram percentiles are read from."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    field = models.CharField(max_length=16)
+    value = models.DecimalField(max_digits=12, decimal_places=2)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'field', 'value'], name='unique_recipe_stats_value'),
+        ]
+
+    def __str__(self):
+        return f'{self.field} {self.value}: {self.count}'
+
+
+class RecipeStatsUsage(models.Model):
+    """Number of recipes of a user using one of their tags or ingredients."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    relation = models.CharField(max_length=16)
+    object_id = models.IntegerField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'relation', 'object_id'], name='unique_recipe_stats_usage'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'relation', '-count'], name='recipe_stats_usage_top_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.relation} {self.object_id}: {self.count}'
+
+
+class Tombstone(models.Model):
+    """Record of a deleted user owned object, kept for the clients syncing their changes."""
+    # Not a foreign key, so the tombstones of a user's objects can be written while the user is being deleted.
+    user_id = models.IntegerField()
+    model = models.CharField(max_length=32)
+    object_id = models.IntegerField()
+    deleted = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user_id', 'model', 'deleted'], name='tombstone_user_model_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.model} {self.object_id}'
+
+
+class RequestProfile(models.Model):
+    """Profile of a slow or explicitly profiled API request, with its top frames and SQL queries as JSON."""
+    created = models.DateTimeField(auto_now_add=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=2048)
+    view = models.CharField(max_length=255)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    profiler = models.CharField(max_length=16)
+    query_count = models.PositiveIntegerField()
+    query_duration_ms = models.FloatField()
+    frames = models.TextField()
+    queries = models.TextField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['view', '-created'], name='request_profile_view_idx'),
+            models.Index(fields=['-created'], name='request_profile_created_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.method} {self.path} ({self.duration_ms:.0f} ms)'
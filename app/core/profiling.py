@@ -0,0 +1,240 @@
+import cProfile
+import json
+import logging
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+from typing import Callable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connections
+from django.utils.crypto import constant_time_compare
+
+from core.models import RequestProfile
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+SQL_MAX_LENGTH = 2000
+
+
+def frame_name(filename: str, line: int, name: str) -> str:
+    """Return a readable name for a function, its path shortened to the project or the installed package."""
+    if filename == '~':
+        return name
+    if filename.startswith(settings.BASE_DIR):
+        filename = os.path.relpath(filename, settings.BASE_DIR)
+    elif 'site-packages' in filename:
+        filename = filename.split('site-packages' + os.sep, 1)[-1]
+
+    return f'{filename}:{line}({name})'
+
+
+class DeterministicProfiler:
+    """cProfile, recording every call with exact call counts at the cost of slowing the request down."""
+    name = 'cprofile'
+
+    def __init__(self) -> None:
+        self.profile = cProfile.Profile()
+
+    def start(self) -> None:
+        self.profile.enable()
+
+    def stop(self) -> None:
+        self.profile.disable()
+
+    def top_frames(self, limit: int) -> List[dict]:
+        rows = pstats.Stats(self.profile).stats.items()
+        rows = sorted(rows, key=lambda row: row[1][3], reverse=True)[:limit]
+        return [
+            {'function': frame_name(*key), 'calls': calls, 'self_ms': self_time * 1000,
+             'cumulative_ms': cumulative * 1000}
+            for key, (_, calls, self_time, cumulative, _) in rows
+        ]
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler reading the stack of the profiled thread every `interval` seconds from another thread.
+
+    The profiled code runs at full speed, so it suits production, and times are estimated from the number of samples
+    a function appears in. Frames above the one that started the profiler are left out.
+    """
+    name = 'sampler'
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self.samples = 0
+        self.inclusive = Counter()
+        self.leaf = Counter()
+        self._thread_id = threading.get_ident()
+        self._stopped = threading.Event()
+        self._root = None
+        self._thread = None
+
+    def start(self) -> None:
+        self._root = sys._getframe(1)
+        self._thread = threading.Thread(target=self._run, name='request-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            seen = set()
+            while frame is not None:
+                code = frame.f_code
+                key = (code.co_filename, code.co_firstlineno, code.co_name)
+                if not seen:
+                    self.leaf[key] += 1
+                if key not in seen:
+                    seen.add(key)
+                    self.inclusive[key] += 1
+                if frame is self._root:
+                    break
+                frame = frame.f_back
+            if seen:
+                self.samples += 1
+
+    def top_frames(self, limit: int) -> List[dict]:
+        return [
+            {'function': frame_name(*key), 'calls': None, 'self_ms': self.leaf[key] * self.interval * 1000,
+             'cumulative_ms': samples * self.interval * 1000}
+            for key, samples in self.inclusive.most_common(limit)
+        ]
+
+
+class QueryRecorder:
+    """Database execute wrapper recording the first `limit` queries, and counting and timing all of them."""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.count = 0
+        self.duration = 0.0
+        self.queries = []
+
+    def __call__(self, execute: Callable, sql: str, params, many: bool, context: dict):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.duration += duration
+            if len(self.queries) < self.limit:
+                self.queries.append({'sql': sql[:SQL_MAX_LENGTH], 'many': many, 'duration_ms': duration * 1000})
+
+
+def requested(request) -> bool:
+    """Return whether the request asks to be profiled with the `X-Profile: <PROFILING_SECRET>` header."""
+    secret = settings.PROFILING_SECRET
+    return bool(secret) and constant_time_compare(request.META.get(PROFILE_HEADER, ''), secret)
+
+
+def make_profiler():
+    if settings.PROFILING_PROFILER == 'cprofile':
+        return DeterministicProfiler()
+    return SamplingProfiler(settings.PROFILING_SAMPLE_INTERVAL)
+
+
+class ProfilingMixin:
+    """
+    View mixin profiling requests asking for it with the `X-Profile` header, or a `PROFILING_SAMPLE_RATE` share of them.
+
+    Profiles of requests slower than `PROFILING_THRESHOLD_MS`, or asking for it, are stored with their top frames and
+    SQL queries, and the ID of the profile returned in the `X-Profile-Id` header of the requests asking for it. Other
+    requests only pay for drawing a random number.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        forced = requested(request)
+        if not forced and random.random() >= settings.PROFILING_SAMPLE_RATE:
+            return super().dispatch(request, *args, **kwargs)
+
+        profiler = make_profiler()
+        recorder = QueryRecorder(settings.PROFILING_MAX_QUERIES)
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            try:
+                profiler.start()
+            except ValueError:
+                # Another profiler, such as a debugger, already traces the thread.
+                return super().dispatch(request, *args, **kwargs)
+            try:
+                response = super().dispatch(request, *args, **kwargs)
+            finally:
+                profiler.stop()
+        duration_ms = (time.perf_counter() - start) * 1000
+
+        if forced or duration_ms >= settings.PROFILING_THRESHOLD_MS:
+            profile = self.save_profile(response, profiler, recorder, duration_ms)
+            if forced and profile is not None:
+                response['X-Profile-Id'] = profile.pk
+
+        return response
+
+    def save_profile(self, response, profiler, recorder: QueryRecorder, duration_ms: float) -> Optional[RequestProfile]:
+        """Store the profile of the request, logging rather than failing the request when it can't be stored."""
+        request = self.request
+        # The user is only read once authenticated, so storing a profile never authenticates the request again.
+        user = getattr(request, '_user', None)
+        try:
+            return RequestProfile.objects.create(
+                user=user if user is not None and user.is_authenticated else None,
+                method=request.method,
+                path=request.get_full_path()[:RequestProfile._meta.get_field('path').max_length],
+                view=f'{self.__class__.__name__}.{getattr(self, "action", None) or request.method.lower()}',
+                status_code=response.status_code,
+                duration_ms=duration_ms,
+                profiler=profiler.name,
+                query_count=recorder.count,
+                query_duration_ms=recorder.duration * 1000,
+                frames=json.dumps(profiler.top_frames(settings.PROFILING_TOP_FRAMES)),
+                queries=json.dumps(recorder.queries),
+            )
+        except Exception:
+            logger.exception('Storing the profile of %s %s failed.', request.method, request.get_full_path())
+            return None
+
+
+def summarize(profiles) -> List[Tuple[str, dict]]:
+    """Return, by view and slowest first, the number of profiles, their latency and query statistics."""
+    views = {}
+    for view, duration_ms, query_count in profiles.values_list('view', 'duration_ms', 'query_count'):
+        summary = views.setdefault(view, {'count': 0, 'durations': [], 'queries': 0})
+        summary['count'] += 1
+        summary['durations'].append(duration_ms)
+        summary['queries'] += query_count
+
+    result = []
+    for view, summary in views.items():
+        durations = sorted(summary.pop('durations'))
+        summary['average_ms'] = sum(durations) / len(durations)
+        summary['p95_ms'] = durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+        summary['max_ms'] = durations[-1]
+        summary['average_queries'] = summary.pop('queries') / summary['count']
+        result.append((view, summary))
+
+    return sorted(result, key=lambda item: item[1]['average_ms'], reverse=True)
+
+
+def hot_frames(profiles, limit: int) -> List[Tuple[str, float, int]]:
+    """Return the functions with the most cumulative time over the profiles, and the number of profiles showing them."""
+    cumulative = Counter()
+    appearances = Counter()
+    for frames in profiles.values_list('frames', flat=True):
+        for frame in json.loads(frames):
+            cumulative[frame['function']] += frame['cumulative_ms']
+            appearances[frame['function']] += 1
+
+    return [(function, total, appearances[function]) for function, total in cumulative.most_common(limit)]
@@ -0,0 +1,67 @@
+import random
+import threading
+from typing import List, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_state = threading.local()
+
+
+def replicas() -> List[str]:
+    """Return the aliases of the replicas reads can be sent to."""
+    # Test mirrors point at the primary database, reading through their own connection would miss the writes of the
+    # test transaction.
+    primary = _location(DEFAULT_DB_ALIAS)
+    return [alias for alias in settings.DATABASE_REPLICAS if _location(alias) != primary]
+
+
+def _location(alias: str) -> tuple:
+    settings_dict = connections[alias].settings_dict
+    return settings_dict['HOST'], settings_dict['PORT'], settings_dict['NAME']
+
+
+def use_replica() -> Optional[str]:
+    """Send the reads of the current thread to a random replica, the same one until use_primary(), and return it."""
+    aliases = replicas()
+    _state.alias = random.choice(aliases) if aliases else None
+
+    return _state.alias
+
+
+def use_primary() -> None:
+    """Send the reads of the current thread back to the primary."""
+    _state.alias = None
+
+
+def _pin_key(user_id: int) -> str:
+    return f'replica-pin:{user_id}'
+
+
+def pin(user_id: int) -> None:
+    """Read the data of a user from the primary for `DB_REPLICA_STICKY_SECONDS`, so they see their own writes."""
+    caches[settings.DB_REPLICA_STICKY_CACHE_ALIAS].set(_pin_key(user_id), True, settings.DB_REPLICA_STICKY_SECONDS)
+
+
+def is_pinned(user_id: int) -> bool:
+    """Return whether a user wrote recently enough for the replicas to lag behind."""
+    return caches[settings.DB_REPLICA_STICKY_CACHE_ALIAS].get(_pin_key(user_id)) is not None
+
+
+class ReplicaRouter:
+    """
+    Route the reads of threads set to use_replica() to their replica, and every write to the primary.
+
+    Other reads are left to the default routing, so objects keep being read from the database they were loaded from.
+    """
+
+    def db_for_read(self, model, **hints) -> Optional[str]:
+        return getattr(_state, 'alias', None)
+
+    def db_for_write(self, model, **hints) -> str:
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints) -> bool:
+        # The replicas hold the same data as the primary.
+        return True
@@ -0,0 +1,19 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from core.authentication import invalidate_token, invalidate_user_tokens
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """Stop accepting a deleted token from the authentication cache."""
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_saved_user_tokens(sender, instance, created, **kwargs):
+    """Drop the cached tokens of a saved user, so deactivations and profile changes apply to the next request."""
+    if not created:
+        invalidate_user_tokens([instance.pk])
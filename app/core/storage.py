@@ -0,0 +1,63 @@
+import hashlib
+import os
+import re
+import time
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+CONTENT_NAME_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage naming files after the SHA-256 of their content.
+
+    Identical files map to the same name, so saving a file already stored only refreshes its access time instead of
+    writing another copy, the modification time staying the one of the content. Several rows may then share a file,
+    which must only be deleted once none references it.
+    """
+
+    def save(self, name: str, content, max_length: int = None) -> str:
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        name = self.content_name(name, content)
+        if self.exists(name):
+            # The refreshed time keeps the file out of orphan sweeps until the new reference is committed.
+            path = self.path(name)
+            os.utime(path, (time.time(), os.stat(path).st_mtime))
+            return name
+
+        return super().save(name, content, max_length=max_length)
+
+    @staticmethod
+    def content_name(name: str, content: File) -> str:
+        """Return the name of `content` in the directory of `name`, keeping its extension."""
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        directory, filename = os.path.split(name)
+        ext = os.path.splitext(filename)[1].lower()
+
+        return os.path.join(directory, f'{digest.hexdigest()}{ext}')
+
+
+def content_hash(name: str) -> str:
+    """Return the SHA-256 a content addressed file is named after, or an empty string for other files."""
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return stem if CONTENT_NAME_RE.match(stem) else ''
+
+
+def last_saved(path: str) -> float:
+    """Return when a file was last saved, deduplicated saves included, as a timestamp."""
+    stat = os.stat(path)
+    return max(stat.st_atime, stat.st_mtime)
+
+
+content_storage = ContentAddressedStorage()
@@ -0,0 +1,126 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import authentication
+
+ME_URL = reverse('user:me')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+@override_settings(TOKEN_AUTH_CACHE_ALIAS='default')
+class CachedTokenAuthenticationTestCase(TestCase):
+
+    def setUp(self) -> None:
+        caches['default'].clear()
+        authentication._local_cache.clear()
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='password')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_token_lookup_cached(self):
+        """The token is looked up once, later requests authenticate without querying it."""
+        self.client.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(ME_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['email'], self.user.email)
+
+    def test_deleted_token_rejected(self):
+        """A deleted token is rejected on the next request."""
+        self.client.get(ME_URL)
+        self.token.delete()
+
+        response = self.client.get(TAGS_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_rejected(self):
+        """The token of a deactivated user is rejected on the next request."""
+        self.client.get(ME_URL)
+        self.user.is_active = False
+        self.user.save()
+
+        response = self.client.get(ME_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cached_user_not_shared(self):
+        """Changes made to the user of a request do not leak into the cache."""
+        self.client.get(ME_URL)
+        user, _ = authentication.CachedTokenAuthentication().authenticate_credentials(self.token.key)
+        user.name = 'Changed'
+
+        response = self.client.get(ME_URL)
+
+        self.assertEqual(response.data['name'], '')
+
+    def test_shared_cache(self):
+        """The tokens are cached in the cache of the alias and invalidated there too."""
+        self.client.get(ME_URL)
+
+        self.assertIsNotNone(authentication.get_cached_token(self.token.key))
+
+        self.token.delete()
+
+        self.assertIsNone(authentication.get_cached_token(self.token.key))
+
+    def test_bulk_deactivation_invalidated(self):
+        """Users deactivated by an update skipping the signals are rejected once their tokens are invalidated."""
+        self.client.get(ME_URL)
+        get_user_model().objects.filter(pk=self.user.pk).update(is_active=False)
+        authentication.invalidate_user_tokens([self.user.pk])
+
+        response = self.client.get(ME_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(TOKEN_AUTH_CACHE_ALIAS='')
+    def test_not_cached_without_alias(self):
+        """Without a cache alias the token is looked up on every request, so revocations apply in every process."""
+        self.client.get(ME_URL)
+
+        self.assertIsNone(authentication.get_cached_token(self.token.key))
+        with self.assertNumQueries(1):
+            self.client.get(ME_URL)
+
+    @override_settings(TOKEN_AUTH_CACHE_ALIAS='', TOKEN_AUTH_CACHE_LOCAL=True)
+    def test_local_cache(self):
+        """The per-process cache is used when enabled, and invalidated by the process revoking the token."""
+        self.client.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            self.client.get(ME_URL)
+
+        self.token.delete()
+
+        self.assertIsNone(authentication.get_cached_token(self.token.key))
+
+
+class LocalTokenCacheTestCase(TestCase):
+
+    def test_least_recently_used_evicted(self):
+        """Entries past the maximum size are evicted least recently used first."""
+        cache = authentication.LocalTokenCache(max_size=2, ttl=60)
+        cache.set('a', b'1')
+        cache.set('b', b'2')
+        cache.get('a')
+        cache.set('c', b'3')
+
+        self.assertEqual(cache.get('a'), b'1')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), b'3')
+
+    def test_expired(self):
+        """Entries expire after the TTL."""
+        cache = authentication.LocalTokenCache(max_size=2, ttl=0)
+        cache.set('a', b'1')
+
+        self.assertIsNone(cache.get('a'))
@@ -1,25 +1,66 @@
+from io import StringIO
 from unittest.mock import patch
 
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 
 
 class CommandsTestCase(TestCase):
 
     def test_wait_for_db_ready(self):
         """Wait for db when db is already available."""
-        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.return_value = True
-            call_command('wait_for_db')
+        with patch('django.db.backends.base.base.BaseDatabaseWrapper.ensure_connection') as ensure_connection:
+            call_command('wait_for_db', stdout=StringIO())
 
-            self.assertEqual(1, gi.call_count)
+            self.assertEqual(1, ensure_connection.call_count)
 
     @patch('time.sleep', return_value=True)
     def test_wait_for_db(self, time_sleep):
-        """Wait for db to be available."""
-        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.side_effect = [OperationalError] * 5 + [True]
-            call_command('wait_for_db')
+        """Wait for db to be available, backing off exponentially."""
+        with patch('django.db.backends.base.base.BaseDatabaseWrapper.ensure_connection') as ensure_connection:
+            ensure_connection.side_effect = [OperationalError] * 5 + [None]
+            call_command('wait_for_db', delay=0.5, max_delay=4, stdout=StringIO())
 
-            self.assertEqual(6, gi.call_count)
+            self.assertEqual(6, ensure_connection.call_count)
+            self.assertEqual([0.5, 1, 2, 4, 4], [c[0][0] for c in time_sleep.call_args_list])
+
+    @patch('time.sleep', return_value=True)
+    def test_wait_for_db_timeout(self, time_sleep):
+        """Give up with an error once the timeout is over."""
+        with patch('django.db.backends.base.base.BaseDatabaseWrapper.ensure_connection') as ensure_connection, \
+                patch('time.monotonic', side_effect=[0, 1, 2, 11]):
+            ensure_connection.side_effect = OperationalError('refused')
+            with self.assertRaisesMessage(CommandError, 'Database default unavailable: refused'):
+                call_command('wait_for_db', timeout=10, stdout=StringIO())
+
+        self.assertEqual(2, time_sleep.call_count)
+
+    def test_wait_for_db_aliases(self):
+        """Every database given is connected to, and unknown ones are refused."""
+        with patch('django.db.backends.base.base.BaseDatabaseWrapper.ensure_connection') as ensure_connection:
+            call_command('wait_for_db', databases=['default', 'default'], stdout=StringIO())
+            self.assertEqual(2, ensure_connection.call_count)
+
+            with self.assertRaisesMessage(CommandError, 'Unknown databases: missing.'):
+                call_command('wait_for_db', databases=['default', 'missing'], stdout=StringIO())
+            self.assertEqual(2, ensure_connection.call_count)
+
+
+class BenchmarkConnectionsTestCase(TransactionTestCase):
+    """
+    The benchmark closes connections as a server does, which a test transaction can't survive.
+
+    The in-memory test database is never closed, so the connections opened are only compared on a real database.
+    """
+
+    def test_benchmark_connections(self):
+        """Both settings are timed and the benchmark user is removed."""
+        out = StringIO()
+        call_command('benchmark_connections', requests=3, max_age=60, host='testserver', stdout=out)
+
+        self.assertIn('CONN_MAX_AGE=0: 3 requests', out.getvalue())
+        self.assertIn('CONN_MAX_AGE=60: 3 requests', out.getvalue())
+        self.assertFalse(get_user_model().objects.exists())
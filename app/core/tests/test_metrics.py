@@ -0,0 +1,113 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core import metrics
+from core.models import Recipe
+
+RECIPES_URL = reverse('recipe:recipe-list')
+RECIPES_VIEW = 'recipe.views.RecipeViewSet.list'
+
+
+def sample(metric, name: str, labels: str) -> float:
+    """Return the value of one sample of a metric."""
+    return dict((f'{sample}{sample_labels}', value) for sample, sample_labels, value in metric.samples())[name + labels]
+
+
+class HistogramTestCase(TestCase):
+
+    def test_render(self):
+        """Buckets are cumulative, with the sum and count of the observations."""
+        histogram = metrics.Histogram('latency_seconds', 'Latency.', ('view', ), (0.1, 1))
+        for value in (0.05, 0.5, 0.5, 5):
+            histogram.observe('list', value=value)
+        metrics.METRICS.append(histogram)
+        try:
+            text = metrics.render()
+        finally:
+            metrics.METRICS.remove(histogram)
+
+        self.assertIn('# TYPE latency_seconds histogram\n', text)
+        self.assertIn('latency_seconds_bucket{view="list",le="0.1"} 1\n', text)
+        self.assertIn('latency_seconds_bucket{view="list",le="1.0"} 3\n', text)
+        self.assertIn('latency_seconds_bucket{view="list",le="+Inf"} 4\n', text)
+        self.assertIn('latency_seconds_sum{view="list"} 6.05\n', text)
+        self.assertIn('latency_seconds_count{view="list"} 4\n', text)
+
+
+class MetricsMiddlewareTestCase(TestCase):
+
+    def setUp(self) -> None:
+        for metric in metrics.METRICS:
+            metric.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='password')
+        self.client.force_authenticate(self.user)
+        Recipe.objects.create(user=self.user, title='Pancakes', time_minutes=10, price=5)
+
+    def test_api_request_recorded(self):
+        """The latency, queries, serializer time and response size of API requests are recorded by view."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(RECIPES_URL)
+
+        labels = f'{{view="{RECIPES_VIEW}"}}'
+        self.assertEqual(sample(metrics.REQUEST_DURATION, 'api_request_duration_seconds_count',
+                                f'{{view="{RECIPES_VIEW}",method="GET",status="200"}}'), 1)
+        self.assertEqual(sample(metrics.DB_QUERIES, 'api_request_db_queries_sum', labels), len(queries))
+        self.assertGreater(sample(metrics.DB_DURATION, 'api_request_db_duration_seconds_sum', labels), 0)
+        serializer_duration = sample(metrics.SERIALIZER_DURATION, 'api_request_serializer_duration_seconds_sum', labels)
+        self.assertGreater(serializer_duration, 0)
+        self.assertEqual(sample(metrics.RESPONSE_SIZE, 'api_response_size_bytes_sum', labels), len(response.content))
+
+    def test_user_views_recorded(self):
+        """Views of the user app are recorded too."""
+        self.client.get(reverse('user:me'))
+
+        self.assertEqual(sample(metrics.DB_QUERIES, 'api_request_db_queries_count',
+                                '{view="user.views.ManageUserView.get"}'), 1)
+
+    def test_other_views_not_recorded(self):
+        """Views outside of the API modules are not recorded."""
+        self.client.get(reverse('healthz'))
+
+        self.assertEqual(metrics.REQUEST_DURATION.samples(), [])
+
+    def test_disabled(self):
+        """Nothing is recorded with the metrics disabled."""
+        with self.settings(METRICS_ENABLED=False):
+            self.client.get(RECIPES_URL)
+
+        self.assertEqual(metrics.REQUEST_DURATION.samples(), [])
+
+    def test_query_threshold(self):
+        """Requests over a query threshold are logged and counted under the highest threshold crossed."""
+        with self.settings(METRICS_QUERY_WARNING=1, METRICS_QUERY_CRITICAL=1000), \
+                self.assertLogs('core.middleware', 'WARNING') as logs:
+            self.client.get(RECIPES_URL)
+
+        self.assertIn(f'GET {RECIPES_URL} ran', logs.output[0])
+        self.assertEqual(sample(metrics.QUERY_THRESHOLD, 'api_requests_over_query_threshold_total',
+                                f'{{view="{RECIPES_VIEW}",threshold="1"}}'), 1)
+
+    def test_metrics_endpoint(self):
+        """The metrics are served in the Prometheus text format, with the cache counters."""
+        self.client.get(RECIPES_URL)
+
+        response = self.client.get(reverse('metrics'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn(f'api_request_db_queries_count{{view="{RECIPES_VIEW}"}} 1', response.content.decode())
+        self.assertIn('# TYPE recipe_attr_cache_requests_total counter', response.content.decode())
+
+    def test_metrics_token(self):
+        """With METRICS_TOKEN set, the metrics are only served to its bearer."""
+        with self.settings(METRICS_TOKEN='secret'):
+            unauthorized = self.client.get(reverse('metrics'))
+            authorized = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+
+        self.assertEqual(unauthorized.status_code, 401)
+        self.assertEqual(authorized.status_code, 200)
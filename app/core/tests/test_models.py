@@ -1,9 +1,12 @@
-from unittest.mock import patch
+import hashlib
+import tempfile
 
 from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
 from django.test import TestCase
 
 from core import models
+from core.storage import ContentAddressedStorage
 
 
 def sample_user(email: str = 'test@example.com', password: str = 'password') -> models.User:
@@ -64,13 +67,15 @@ class ModelTestCase(TestCase):
 
         self.assertEqual(str(recipe), recipe.title)
 
-    @patch('uuid.uuid4')
-    def test_recipe_file_name_uuid(self, mock_uuid):
-        """Test that image is saved in the correct location."""
-        uuid = 'test-uuid'
-        mock_uuid.return_value = uuid
-        expected_path = f'uploads/recipe/{uuid}.jpg'
+    def test_recipe_file_name_content_hash(self):
+        """Test that image is saved in the correct location, under the hash of its content."""
+        content = b'image content'
+        expected_path = f'uploads/recipe/{hashlib.sha256(content).hexdigest()}.jpg'
 
-        file_path = models.recipe_image_file_path(None, 'image.jpg')
+        with tempfile.TemporaryDirectory() as tmp:
+            storage = ContentAddressedStorage(location=tmp)
+            file_path = storage.save(models.recipe_image_file_path(None, 'photo.JPG'), ContentFile(content))
+            duplicate_path = storage.save(models.recipe_image_file_path(None, 'copy.jpg'), ContentFile(content))
 
         self.assertEqual(file_path, expected_path)
+        self.assertEqual(duplicate_path, expected_path)
@@ -0,0 +1,160 @@
+import json
+import time
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core import profiling
+from core.models import Recipe, RequestProfile
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def busy_wait(seconds: float) -> None:
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class SamplingProfilerTestCase(TestCase):
+
+    def test_top_frames(self):
+        """The functions running while sampled are reported with their estimated time, slowest first."""
+        profiler = profiling.SamplingProfiler(0.001)
+        profiler.start()
+        busy_wait(0.05)
+        profiler.stop()
+
+        frames = profiler.top_frames(5)
+
+        self.assertGreater(profiler.samples, 0)
+        self.assertTrue(any('busy_wait' in frame['function'] for frame in frames))
+        self.assertFalse(any('unittest' in frame['function'] for frame in frames))
+        self.assertEqual(frames, sorted(frames, key=lambda frame: frame['cumulative_ms'], reverse=True))
+
+
+@override_settings(PROFILING_SECRET='secret', PROFILING_SAMPLE_RATE=0, PROFILING_THRESHOLD_MS=10000)
+class ProfilingMixinTestCase(TestCase):
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='password')
+        self.client.force_authenticate(self.user)
+        Recipe.objects.create(user=self.user, title='Pancakes', time_minutes=10, price=5)
+
+    def test_not_profiled(self):
+        """Requests are not profiled unless they ask for it or are sampled."""
+        response = self.client.get(RECIPES_URL)
+
+        self.assertFalse(response.has_header('X-Profile-Id'))
+        self.assertFalse(RequestProfile.objects.exists())
+
+    @override_settings(PROFILING_PROFILER='cprofile')
+    def test_profiled_by_header(self):
+        """A request with the secret header is profiled and stored whatever its latency."""
+        response = self.client.get(RECIPES_URL, {'title': 'x'}, HTTP_X_PROFILE='secret')
+
+        profile = RequestProfile.objects.get()
+        self.assertEqual(response['X-Profile-Id'], str(profile.pk))
+        self.assertEqual(profile.user, self.user)
+        self.assertEqual(profile.path, f'{RECIPES_URL}?title=x')
+        self.assertEqual(profile.view, 'RecipeViewSet.list')
+        self.assertEqual(profile.status_code, 200)
+        self.assertEqual(profile.profiler, 'cprofile')
+        self.assertGreater(profile.query_count, 0)
+        self.assertEqual(len(json.loads(profile.queries)), profile.query_count)
+        frames = json.loads(profile.frames)
+        self.assertTrue(any('recipe/views.py' in frame['function'] for frame in frames))
+        self.assertTrue(all(frame['calls'] for frame in frames))
+
+    def test_wrong_secret(self):
+        """The header needs the configured secret."""
+        self.client.get(RECIPES_URL, HTTP_X_PROFILE='guess')
+
+        self.assertFalse(RequestProfile.objects.exists())
+
+    @override_settings(PROFILING_SECRET='')
+    def test_header_disabled_without_secret(self):
+        """The header is ignored without a secret configured."""
+        self.client.get(RECIPES_URL, HTTP_X_PROFILE='')
+
+        self.assertFalse(RequestProfile.objects.exists())
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_sampled_requests_over_threshold(self):
+        """Sampled requests are only stored when slower than the threshold."""
+        self.client.get(RECIPES_URL)
+        self.assertFalse(RequestProfile.objects.exists())
+
+        with self.settings(PROFILING_THRESHOLD_MS=0):
+            response = self.client.get(RECIPES_URL)
+
+        profile = RequestProfile.objects.get()
+        self.assertEqual(profile.profiler, 'sampler')
+        self.assertFalse(response.has_header('X-Profile-Id'))
+
+    @override_settings(PROFILING_MAX_QUERIES=1)
+    def test_queries_limited(self):
+        """Only the first queries are kept, but all of them are counted."""
+        self.client.get(RECIPES_URL, HTTP_X_PROFILE='secret')
+
+        profile = RequestProfile.objects.get()
+        self.assertEqual(len(json.loads(profile.queries)), 1)
+        self.assertGreater(profile.query_count, 1)
+
+
+class ProfilesCommandTestCase(TestCase):
+
+    def setUp(self) -> None:
+        frames = [{'function': 'recipe/views.py:10(list)', 'calls': 1, 'self_ms': 5.0, 'cumulative_ms': 90.0}]
+        queries = [{'sql': 'SELECT 1', 'many': False, 'duration_ms': 2.0}]
+        for duration_ms in (100, 300):
+            self.profile = RequestProfile.objects.create(
+                method='GET', path='/api/recipe/recipes/', view='RecipeViewSet.list', status_code=200,
+                duration_ms=duration_ms, profiler='cprofile', query_count=3, query_duration_ms=6,
+                frames=json.dumps(frames), queries=json.dumps(queries),
+            )
+
+    def call(self, *args, **options) -> str:
+        out = StringIO()
+        call_command('profiles', *args, stdout=out, **options)
+        return out.getvalue()
+
+    def test_list(self):
+        """The latest profiles are listed."""
+        output = self.call()
+
+        self.assertEqual(output.count('/api/recipe/recipes/'), 2)
+        self.assertIn('300.0 ms', output)
+
+    def test_show(self):
+        """A profile is shown with its frames and queries."""
+        output = self.call('show', self.profile.pk)
+
+        self.assertIn('recipe/views.py:10(list)', output)
+        self.assertIn('SELECT 1', output)
+        with self.assertRaises(CommandError):
+            self.call('show', self.profile.pk + 1)
+
+    def test_summary(self):
+        """Profiles are summarized by view, with the functions taking the most time."""
+        output = self.call('summary', view='RecipeViewSet.list')
+
+        self.assertRegex(output, r'2\s+200\.0\s+300\.0\s+300\.0\s+3\.0\s+RecipeViewSet\.list')
+        self.assertRegex(output, r'180\.0\s+2\s+recipe/views\.py:10\(list\)')
+
+    def test_prune(self):
+        """Profiles older than the given days are deleted."""
+        RequestProfile.objects.filter(pk=self.profile.pk).update(created=timezone.now() - timedelta(days=10))
+
+        output = self.call('prune', days=7)
+
+        self.assertIn('Deleted 1 profiles.', output)
+        self.assertEqual(RequestProfile.objects.count(), 1)
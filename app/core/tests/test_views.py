@@ -0,0 +1,180 @@
+import hashlib
+import os
+import tempfile
+from unittest.mock import patch
+
+from django.core.files.base import ContentFile
+from django.db.utils import OperationalError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils.http import http_date
+
+from core import health
+from core.storage import ContentAddressedStorage, last_saved
+
+
+class MediaViewTestCase(TestCase):
+
+    def setUp(self) -> None:
+        self.media_root = tempfile.TemporaryDirectory()
+        self.settings_override = self.settings(MEDIA_ROOT=self.media_root.name)
+        self.settings_override.enable()
+        os.makedirs(os.path.join(self.media_root.name, 'uploads/recipe'))
+        self.path = os.path.join(self.media_root.name, 'uploads/recipe/abc.jpg')
+        with open(self.path, 'wb') as f:
+            f.write(b'0123456789')
+        self.url = reverse('media', args=['uploads/recipe/abc.jpg'])
+
+    def tearDown(self) -> None:
+        self.settings_override.disable()
+        self.media_root.cleanup()
+
+    def test_serve_file(self):
+        """The file is streamed with long-lived caching headers."""
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertTrue(response.has_header('ETag'))
+        response.close()
+
+    def test_not_modified(self):
+        """A matching ETag or an up-to-date If-Modified-Since returns 304 without the file."""
+        etag = self.client.get(self.url)['ETag']
+
+        by_etag = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        by_date = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=http_date(os.path.getmtime(self.path)))
+        stale = self.client.get(self.url, HTTP_IF_NONE_MATCH='"other"')
+
+        self.assertEqual(by_etag.status_code, 304)
+        self.assertEqual(by_date.status_code, 304)
+        self.assertEqual(stale.status_code, 200)
+        stale.close()
+
+    def test_range(self):
+        """Byte ranges return 206 with the requested bytes only."""
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2-5')
+        suffix = self.client.get(self.url, HTTP_RANGE='bytes=-3')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(response['Content-Length'], '4')
+        self.assertEqual(b''.join(suffix.streaming_content), b'789')
+        response.close()
+        suffix.close()
+
+    def test_range_not_satisfiable(self):
+        """A range past the end of the file returns 416."""
+        response = self.client.get(self.url, HTTP_RANGE='bytes=20-')
+
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+
+    def test_if_range_mismatch(self):
+        """A range for another version of the file returns the whole file."""
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"old"')
+
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+    @override_settings(MEDIA_SENDFILE_HEADER='X-Accel-Redirect')
+    def test_accel_redirect(self):
+        """With X-Accel-Redirect the front server is told which file to send."""
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/uploads/recipe/abc.jpg')
+        self.assertEqual(response.content, b'')
+
+    @override_settings(MEDIA_SENDFILE_HEADER='X-Sendfile')
+    def test_sendfile(self):
+        """With X-Sendfile the front server is given the file path."""
+        response = self.client.get(self.url)
+
+        self.assertEqual(response['X-Sendfile'], self.path)
+
+    def test_content_addressed_file(self):
+        """A file named after its content is tagged with its hash, which a deduplicated save of it doesn't change."""
+        storage = ContentAddressedStorage(location=self.media_root.name)
+        name = storage.save('uploads/recipe/photo.jpg', ContentFile(b'photo'))
+        os.utime(storage.path(name), (1000000000, 1000000000))
+        url = reverse('media', args=[name])
+        response = self.client.get(url)
+
+        storage.save('uploads/recipe/copy.jpg', ContentFile(b'photo'))
+        again = self.client.get(url)
+
+        self.assertEqual(response['ETag'], '"%s"' % hashlib.sha256(b'photo').hexdigest())
+        self.assertEqual((again['ETag'], again['Last-Modified']), (response['ETag'], response['Last-Modified']))
+        self.assertGreater(last_saved(storage.path(name)), 1000000000)
+        response.close()
+        again.close()
+
+    def test_missing_and_outside_files(self):
+        """Missing files, directories and paths outside of the media root are not found."""
+        self.assertEqual(self.client.get(reverse('media', args=['uploads/recipe/missing.jpg'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('media', args=['uploads/recipe'])).status_code, 404)
+        self.assertEqual(self.client.get('/media/../settings.py').status_code, 404)
+
+
+class HealthViewTestCase(TestCase):
+
+    def setUp(self) -> None:
+        health._results.clear()
+
+    def test_healthz(self):
+        """The liveness probe answers without checking anything."""
+        with patch('core.health.run_checks') as run_checks:
+            response = self.client.get(reverse('healthz'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'status': 'ok'})
+        run_checks.assert_not_called()
+
+    def test_readyz(self):
+        """The readiness probe checks every database and cache and the media storage."""
+        with tempfile.TemporaryDirectory() as media_root, self.settings(MEDIA_ROOT=media_root):
+            response = self.client.get(reverse('readyz'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['checks'], {
+            'database:default': 'ok', 'cache:default': 'ok', 'cache:recipe_attrs': 'ok', 'storage': 'ok',
+        })
+        self.assertIn('no-cache', response['Cache-Control'])
+
+    def test_readyz_failing(self):
+        """A failing check makes the instance unready."""
+        with patch('core.health.check_database', side_effect=OperationalError('down')), \
+                self.assertLogs('core.health', 'ERROR'):
+            response = self.client.get(reverse('readyz'))
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['status'], 'unavailable')
+        self.assertEqual(response.json()['checks']['database:default'], 'failing')
+
+    def test_readyz_storage_not_writable(self):
+        """The media storage must be writable."""
+        with tempfile.TemporaryDirectory() as media_root, self.settings(MEDIA_ROOT=media_root), \
+                patch('os.access', return_value=False), self.assertLogs('core.health', 'ERROR'):
+            response = self.client.get(reverse('readyz'))
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['checks']['storage'], 'failing')
+
+    def test_readyz_cached(self):
+        """Results are reused for HEALTH_CHECK_CACHE_SECONDS, so probes don't hit the database every time."""
+        with patch('core.health.check_database') as check_database:
+            self.client.get(reverse('readyz'))
+            self.client.get(reverse('readyz'))
+            self.assertEqual(check_database.call_count, 1)
+
+            with self.settings(HEALTH_CHECK_CACHE_SECONDS=0):
+                health._results.clear()
+                self.client.get(reverse('readyz'))
+                self.client.get(reverse('readyz'))
+            self.assertEqual(check_database.call_count, 3)
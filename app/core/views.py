@@ -0,0 +1,189 @@
+import mimetypes
+import os
+import re
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpRequest, HttpResponse, HttpResponseNotModified, JsonResponse
+from django.utils._os import safe_join
+from django.utils.crypto import constant_time_compare
+from django.utils.http import http_date, parse_etags
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_safe
+from django.views.static import was_modified_since
+
+from core import health, metrics
+from core.storage import content_hash
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class MediaFileResponse(FileResponse):
+    """File response streaming larger blocks when the server has no `wsgi.file_wrapper` to send the file itself."""
+
+    block_size = 64 * 2 ** 10
+
+
+class FileRange:
+    """
+    Read-only view of `length` bytes of a file from `start`.
+
+    It keeps the file descriptor of the underlying file, so a server's `wsgi.file_wrapper` can still send the range with
+    `sendfile()` from the current offset, for the `Content-Length` of the response.
+    """
+
+    def __init__(self, file, start: int, length: int) -> None:
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+
+        return data
+
+    def fileno(self) -> int:
+        return self.file.fileno()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Return the first and last byte of a single range `Range` header, None without one.
+
+    Raise ValueError for a range outside of the file. Multiple ranges are not supported and the whole file is sent.
+    """
+    match = RANGE_RE.match(header or '')
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+
+    first, last = match.groups()
+    if first == '':
+        first, last = max(size - int(last), 0), size - 1
+    else:
+        first, last = int(first), min(int(last), size - 1) if last else size - 1
+    if first > last or first >= size:
+        raise ValueError('Range not satisfiable.')
+
+    return first, last
+
+
+@require_safe
+def serve_media(request: HttpRequest, path: str) -> HttpResponse:
+    """
+    Serve an uploaded file from `MEDIA_ROOT`.
+
+    Stored files are named after their content and never change, so they are cached for `MEDIA_CACHE_MAX_AGE` as
+    immutable and revalidated by `ETag`, the content hash in their name, or `If-Modified-Since`. With
+    `MEDIA_SENDFILE_HEADER` set, the response only names the file and the front server sends it, ranges included.
+    Otherwise the file, or the requested byte range of it, is handed to the WSGI server, which sends it with
+    `sendfile()` when it provides `wsgi.file_wrapper`.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('File not found.')
+    try:
+        stat = os.stat(full_path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404('File not found.')
+    if not os.path.isfile(full_path):
+        raise Http404('File not found.')
+
+    digest = content_hash(path)
+    etag = f'"{digest}"' if digest else f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        not_modified = etag in parse_etags(if_none_match) or if_none_match.strip() == '*'
+    else:
+        not_modified = not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime, stat.st_size)
+
+    if not_modified:
+        response = HttpResponseNotModified()
+    elif settings.MEDIA_SENDFILE_HEADER:
+        response = sendfile_response(path, full_path)
+    else:
+        response = file_response(request, full_path, stat.st_size, etag)
+        if response.status_code == 416:
+            return response
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}, immutable'
+
+    return response
+
+
+def sendfile_response(path: str, full_path: str) -> HttpResponse:
+    """Return an empty response telling the front server which file to send."""
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    response = HttpResponse(content_type=content_type)
+    if settings.MEDIA_SENDFILE_HEADER.lower() == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX + path
+    else:
+        response[settings.MEDIA_SENDFILE_HEADER] = full_path
+
+    return response
+
+
+def file_response(request: HttpRequest, full_path: str, size: int, etag: str) -> HttpResponse:
+    """Return the file, or the byte range requested if `If-Range` still matches it."""
+    try:
+        byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range is not None and if_range != etag:
+        byte_range = None
+
+    file = open(full_path, 'rb')
+    if byte_range is None:
+        response = MediaFileResponse(file)
+    else:
+        first, last = byte_range
+        response = MediaFileResponse(FileRange(file, first, last - first + 1), status=206)
+        response['Content-Type'] = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+        response['Content-Length'] = last - first + 1
+        response['Content-Range'] = f'bytes {first}-{last}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+
+    return response
+
+
+@never_cache
+@require_safe
+def healthz(request: HttpRequest) -> JsonResponse:
+    """Liveness probe, answering as long as the process serves requests whatever the state of its dependencies."""
+    return JsonResponse({'status': 'ok'})
+
+
+@never_cache
+@require_safe
+def readyz(request: HttpRequest) -> JsonResponse:
+    """Readiness probe, answering 503 while a database, a cache or the media storage fails its check."""
+    results = health.run_checks()
+    ready = all(results.values())
+
+    return JsonResponse({
+        'status': 'ok' if ready else 'unavailable',
+        'checks': {name: 'ok' if ok else 'failing' for name, ok in results.items()},
+    }, status=200 if ready else 503)
+
+
+@never_cache
+@require_safe
+def serve_metrics(request: HttpRequest) -> HttpResponse:
+    """Serve the metrics of this process in the Prometheus text format, to a `METRICS_TOKEN` bearer when it is set."""
+    token = settings.METRICS_TOKEN
+    if token and not constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'):
+        return HttpResponse(status=401)
+
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class RecipeConfig(AppConfig):
     name = 'recipe'
+
+    def ready(self):
+        from core import metrics
+        from recipe import cache, signals  # noqa: F401
+
+        metrics.register_collector(cache.collect_metrics)
@@ -0,0 +1,160 @@
+import random
+from collections import OrderedDict
+from typing import Callable, Dict
+
+from django.contrib.auth import get_user_model
+from django.db.models.query import QuerySet
+from django.test import RequestFactory
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from core.models import Tag, Ingredient, Recipe
+from recipe import filters, search, views
+
+SCENARIOS: Dict[str, Callable] = OrderedDict()
+
+
+def scenario(name: str) -> Callable:
+    """Register a function returning the queryset of an API query under `name`."""
+    def decorator(func: Callable) -> Callable:
+        SCENARIOS[name] = func
+        return func
+    return decorator
+
+
+def view_queryset(viewset, user, action: str = 'list', **params) -> QuerySet:
+    """Return the queryset `viewset` builds for `action` when requested by `user` with the query `params`."""
+    request = Request(RequestFactory().get('/', params))
+    request.user = user
+    view = viewset(request=request, action=action, format_kwarg=None, kwargs={})
+
+    return view.get_queryset()
+
+
+def populate(user, recipes: int, tags: int, ingredients: int, per_recipe: int) -> None:
+    """Create `recipes` recipes for `user`, each linked to `per_recipe` random tags and ingredients."""
+    Tag.objects.bulk_create(Tag(user=user, name=f'Tag {i}') for i in range(tags))
+    Ingredient.objects.bulk_create(Ingredient(user=user, name=f'Ingredient {i}') for i in range(ingredients))
+    tag_ids = list(Tag.objects.filter(user=user).values_list('id', flat=True))
+    ingredient_ids = list(Ingredient.objects.filter(user=user).values_list('id', flat=True))
+
+    Recipe.objects.bulk_create(
+        (Recipe(user=user, title=f'Recipe {i}', time_minutes=random.randint(1, 240),
+                price=random.randint(100, 99999) / 100) for i in range(recipes))
+    )
+    recipe_ids = Recipe.objects.filter(user=user).values_list('id', flat=True)
+
+    tag_links = []
+    ingredient_links = []
+    for recipe_id in recipe_ids.iterator():
+        tag_links.extend(
+            Recipe.tags.through(recipe_id=recipe_id, tag_id=pk)
+            for pk in random.sample(tag_ids, min(per_recipe, len(tag_ids)))
+        )
+        ingredient_links.extend(
+            Recipe.ingredients.through(recipe_id=recipe_id, ingredient_id=pk)
+            for pk in random.sample(ingredient_ids, min(per_recipe, len(ingredient_ids)))
+        )
+    Recipe.tags.through.objects.bulk_create(tag_links)
+    Recipe.ingredients.through.objects.bulk_create(ingredient_links)
+    search.reindex(recipe_ids)
+
+
+def create_user(email: str = 'benchmark@example.com'):
+    """Create the user owning the benchmark data."""
+    return get_user_model().objects.create_user(email=email, password=None)
+
+
+@scenario('tags')
+def tags(user) -> QuerySet:
+    return view_queryset(views.TagViewSet, user)
+
+
+@scenario('tags_assigned_only')
+def tags_assigned_only(user) -> QuerySet:
+    return view_queryset(views.TagViewSet, user, assigned_only=1)
+
+
+@scenario('tags_assigned_only_join_distinct')
+def tags_assigned_only_join_distinct(user) -> QuerySet:
+    """The join then distinct query the assigned only filter used to run, kept for comparison."""
+    return Tag.objects.filter(recipe__isnull=False, user=user).order_by('-name').distinct()
+
+
+@scenario('tags_usage_count')
+def tags_usage_count(user) -> QuerySet:
+    return view_queryset(views.TagViewSet, user, assigned_only=1, usage_count=1)
+
+
+@scenario('ingredients_assigned_only')
+def ingredients_assigned_only(user) -> QuerySet:
+    return view_queryset(views.IngredientViewSet, user, assigned_only=1)
+
+
+@scenario('ingredients_usage_count')
+def ingredients_usage_count(user) -> QuerySet:
+    return view_queryset(views.IngredientViewSet, user, assigned_only=1, usage_count=1)
+
+
+@scenario('recipes')
+def recipes(user) -> QuerySet:
+    """The first page of the recipe list."""
+    return view_queryset(views.RecipeViewSet, user).order_by('id')[:api_settings.PAGE_SIZE]
+
+
+@scenario('recipes_by_tags')
+def recipes_by_tags(user) -> QuerySet:
+    """The first page of recipes filtered by two tags."""
+    tag_ids = ','.join(str(pk) for pk in Tag.objects.filter(user=user).values_list('id', flat=True)[:2])
+    return view_queryset(views.RecipeViewSet, user, tags=tag_ids).order_by('id')[:api_settings.PAGE_SIZE]
+
+
+@scenario('recipes_by_ingredients')
+def recipes_by_ingredients(user) -> QuerySet:
+    """The first page of recipes filtered by two ingredients."""
+    ingredient_ids = ','.join(str(pk) for pk in Ingredient.objects.filter(user=user).values_list('id', flat=True)[:2])
+    return view_queryset(views.RecipeViewSet, user, ingredients=ingredient_ids).order_by('id')[:api_settings.PAGE_SIZE]
+
+
+@scenario('recipes_search')
+def recipes_search(user) -> QuerySet:
+    """The first page of recipes matching an ingredient name, best ranked first."""
+    queryset = view_queryset(views.RecipeViewSet, user, q='ingredient 17')
+    return queryset.order_by('search_rank', 'id')[:api_settings.PAGE_SIZE]
+
+
+@scenario('recipes_by_all_tags')
+def recipes_by_all_tags(user) -> QuerySet:
+    """The first page of recipes having both of two tags."""
+    tag_ids = ','.join(str(pk) for pk in Tag.objects.filter(user=user).values_list('id', flat=True)[:2])
+    return view_queryset(views.RecipeViewSet, user, tags_all=tag_ids).order_by('id')[:api_settings.PAGE_SIZE]
+
+
+@scenario('recipes_by_all_ingredients')
+def recipes_by_all_ingredients(user) -> QuerySet:
+    """The first page of recipes having both of two ingredients."""
+    ingredient_ids = ','.join(str(pk) for pk in Ingredient.objects.filter(user=user).values_list('id', flat=True)[:2])
+    queryset = view_queryset(views.RecipeViewSet, user, ingredients_all=ingredient_ids)
+    return queryset.order_by('id')[:api_settings.PAGE_SIZE]
+
+
+@scenario('recipes_by_time_range')
+def recipes_by_time_range(user) -> QuerySet:
+    """The first page of recipes taking 10 to 20 minutes, quickest first."""
+    queryset = view_queryset(views.RecipeViewSet, user, time_minutes_min=10, time_minutes_max=20,
+                             ordering='time_minutes')
+    return queryset[:api_settings.PAGE_SIZE]
+
+
+@scenario('recipes_by_price')
+def recipes_by_price(user) -> QuerySet:
+    """The first page of recipes under 10.00, most expensive first."""
+    return view_queryset(views.RecipeViewSet, user, price_max='10.00', ordering='-price')[:api_settings.PAGE_SIZE]
+
+
+@scenario('recipes_cookable')
+def recipes_cookable(user) -> QuerySet:
+    """The first page of recipes ranked by how many of five ingredients on hand they use."""
+    on_hand = list(Ingredient.objects.filter(user=user).values_list('id', flat=True)[:5])
+    queryset = view_queryset(views.RecipeViewSet, user, action='cookable')
+    return filters.cookable_recipes(queryset, on_hand)[:api_settings.PAGE_SIZE]
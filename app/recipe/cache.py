@@ -0,0 +1,85 @@
+import hashlib
+import threading
+import uuid
+from collections import Counter
+from typing import Dict, Optional, Type
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Model
+from rest_framework.request import Request
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def get_cache():
+    """Return the cache backend holding the recipe attribute responses."""
+    return caches[settings.RECIPE_ATTR_CACHE_ALIAS]
+
+
+def _version_key(model: Type[Model], user_id: int) -> str:
+    return f'recipe-attrs:{model._meta.model_name}:{user_id}:version'
+
+
+def get_version(model: Type[Model], user_id: int) -> str:
+    """Return the current version of the cached `model` responses of a user."""
+    cache = get_cache()
+    key = _version_key(model, user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+
+    return version
+
+
+def invalidate(model: Type[Model], user_id: int) -> None:
+    """
+    Invalidate the cached `model` responses of a user.
+
+    The version is replaced by a random one rather than incremented, so a version evicted from the cache or set in a
+    rolled back transaction can never match entries cached before. It is replaced again once the transaction commits,
+    so responses cached by concurrent requests before the commit are not served either.
+    """
+    def replace_version():
+        get_cache().set(_version_key(model, user_id), uuid.uuid4().hex, None)
+
+    replace_version()
+    transaction.on_commit(replace_version)
+
+
+def response_key(model: Type[Model], request: Request) -> str:
+    """Return the cache key of a list response, built from the user, its current version and the full URL."""
+    url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return f'recipe-attrs:{model._meta.model_name}:{request.user.id}:{get_version(model, request.user.id)}:{url}'
+
+
+def get_response(key: str) -> Optional[dict]:
+    """Return the cached response data stored under `key` and count the hit or miss."""
+    data = get_cache().get(key)
+    with _stats_lock:
+        _stats['hits' if data is not None else 'misses'] += 1
+
+    return data
+
+
+def set_response(key: str, data: dict) -> None:
+    """Store the response data under `key`."""
+    get_cache().set(key, data)
+
+
+def stats() -> Dict[str, int]:
+    """Return the hit and miss counters of this process."""
+    with _stats_lock:
+        return {'hits': _stats['hits'], 'misses': _stats['misses']}
+
+
+def collect_metrics() -> dict:
+    """Return the hit and miss counters in the format of core.metrics collectors."""
+    return {
+        ('recipe_attr_cache_requests_total', 'counter', 'Recipe attribute list cache lookups.'): [
+            ('recipe_attr_cache_requests_total', f'{{result="{result}"}}', count) for result, count in stats().items()
+        ],
+    }
@@ -0,0 +1,62 @@
+import json
+from collections import defaultdict
+from itertools import islice
+from typing import Dict, Iterator, List
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models.query import QuerySet
+from rest_framework.request import Request
+
+from core.models import Recipe
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FIELDS = ('id', 'title', 'time_minutes', 'price', 'link', 'image')
+
+
+def iter_batches(queryset: QuerySet, batch_size: int) -> Iterator[List[dict]]:
+    """Yield the rows of `queryset` as lists of at most `batch_size` dicts, reading them with a chunked cursor."""
+    rows = queryset.values(*EXPORT_FIELDS).iterator(chunk_size=batch_size)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def related_objects(relation: str, recipe_ids: List[int]) -> Dict[int, List[dict]]:
+    """Return the `relation` objects of the given recipes, keyed by recipe ID, in one query."""
+    through = getattr(Recipe, relation).through
+    field = getattr(Recipe, relation).field.m2m_reverse_field_name()
+    rows = through.objects.filter(recipe_id__in=recipe_ids).order_by(f'{field}_id').values_list(
+        'recipe_id', f'{field}_id', f'{field}__name'
+    )
+
+    related = defaultdict(list)
+    for recipe_id, obj_id, name in rows:
+        related[recipe_id].append({'id': obj_id, 'name': name})
+
+    return related
+
+
+def export_recipes(queryset: QuerySet, request: Request, batch_size: int = None) -> Iterator[str]:
+    """
+    Stream recipes as newline delimited JSON.
+
+    Recipes are read as plain dicts in batches and the tags and ingredients of each batch are fetched with one query
+    per relation, so memory use depends on the batch size rather than on the number of recipes.
+    """
+    batch_size = batch_size or EXPORT_BATCH_SIZE
+    storage = Recipe._meta.get_field('image').storage
+    for batch in iter_batches(queryset.order_by('id'), batch_size):
+        recipe_ids = [row['id'] for row in batch]
+        tags = related_objects('tags', recipe_ids)
+        ingredients = related_objects('ingredients', recipe_ids)
+
+        lines = []
+        for row in batch:
+            row['image'] = request.build_absolute_uri(storage.url(row['image'])) if row['image'] else None
+            row['tags'] = tags.get(row['id'], [])
+            row['ingredients'] = ingredients.get(row['id'], [])
+            lines.append(json.dumps(row, cls=DjangoJSONEncoder))
+
+        yield '\n'.join(lines) + '\n'
@@ -0,0 +1,63 @@
+from typing import Iterable, List
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Model
+from django.db.models.query import QuerySet
+from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+
+class UserManyRelatedField(serializers.ManyRelatedField):
+    """Many related field that resolves all submitted primary keys at once."""
+
+    def to_internal_value(self, data) -> List[Model]:
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+
+        return self.child_relation.to_internal_values(data)
+
+
+class UserPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Primary key related field limited to the objects owned by the requesting user.
+
+    Used with `many=True`, all submitted keys are resolved with a single `id__in` query, and keys that don't exist or
+    belong to another user are all reported as not existing.
+    """
+
+    def get_queryset(self) -> QuerySet:
+        return super().get_queryset().filter(user=self.context['request'].user)
+
+    def to_internal_value(self, data) -> Model:
+        return self.to_internal_values([data])[0]
+
+    def to_internal_values(self, data: Iterable) -> List[Model]:
+        """Return the objects for the given primary keys in the submitted order, without duplicates."""
+        queryset = self.get_queryset()
+        pks = []
+        for item in data:
+            try:
+                pks.append(queryset.model._meta.pk.to_python(item))
+            except (DjangoValidationError, TypeError):
+                self.fail('incorrect_type', data_type=type(item).__name__)
+
+        pks = list(dict.fromkeys(pks))
+        objects = queryset.in_bulk(pks)
+        missing = [pk for pk in pks if pk not in objects]
+        if missing:
+            raise serializers.ValidationError(
+                [self.error_messages['does_not_exist'].format(pk_value=pk) for pk in missing],
+                code='does_not_exist',
+            )
+
+        return [objects[pk] for pk in pks]
+
+    @classmethod
+    def many_init(cls, *args, **kwargs) -> UserManyRelatedField:
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return UserManyRelatedField(**list_kwargs)
@@ -0,0 +1,150 @@
+from typing import Dict, List
+
+from django.db.models import Count, F, Q, QuerySet
+from django.utils.translation import gettext_lazy as _
+from rest_framework import serializers
+from rest_framework.fields import SkipField
+
+from core.models import Recipe
+
+# Orderings accepted by `ordering=`, each backed by the (user, field) index of the recipes.
+ORDERING_FIELDS = ('id', 'title', 'time_minutes', 'price')
+MAX_IDS = 100
+
+
+class IntegerListField(serializers.Field):
+    """Comma separated list of positive integers, such as `1,2,3`. An empty optional list is treated as absent."""
+
+    default_error_messages = {
+        'invalid': _('Enter a comma separated list of IDs.'),
+        'max_length': _('Ensure this list has no more than {max_length} IDs.'),
+    }
+
+    def validate_empty_values(self, data):
+        if data == '' and not self.required:
+            raise SkipField()
+
+        return super().validate_empty_values(data)
+
+    def to_internal_value(self, data):
+        try:
+            values = [int(value) for value in str(data).split(',')]
+        except ValueError:
+            self.fail('invalid')
+        if any(value < 1 for value in values):
+            self.fail('invalid')
+        if len(values) > MAX_IDS:
+            self.fail('max_length', max_length=MAX_IDS)
+
+        return list(dict.fromkeys(values))
+
+    def to_representation(self, value):
+        return ','.join(str(pk) for pk in value)
+
+
+class CookableParamsSerializer(serializers.Serializer):
+    """Query parameters of the recipes cookable with the ingredients on hand."""
+    ingredients = IntegerListField(help_text='Ingredients on hand.')
+    max_missing = serializers.IntegerField(required=False, min_value=0, help_text='Most ingredients missing.')
+
+
+class RecipeAttrFilterSerializer(serializers.Serializer):
+    """Query parameters of the tag and ingredient lists."""
+    assigned_only = serializers.BooleanField(required=False, help_text='Only the ones assigned to recipes.')
+    usage_count = serializers.BooleanField(required=False, help_text='Annotate the number of recipes using each.')
+
+
+class RecipeFilterSerializer(serializers.Serializer):
+    """Query parameters filtering and ordering the recipe list."""
+    tags = IntegerListField(required=False, help_text='Recipes with any of these tags.')
+    ingredients = IntegerListField(required=False, help_text='Recipes with any of these ingredients.')
+    tags_all = IntegerListField(required=False, help_text='Recipes with all of these tags.')
+    ingredients_all = IntegerListField(required=False, help_text='Recipes with all of these ingredients.')
+    time_minutes_min = serializers.IntegerField(required=False, min_value=0)
+    time_minutes_max = serializers.IntegerField(required=False, min_value=0)
+    price_min = serializers.DecimalField(required=False, max_digits=5, decimal_places=2, min_value=0)
+    price_max = serializers.DecimalField(required=False, max_digits=5, decimal_places=2, min_value=0)
+    ordering = serializers.ChoiceField(
+        required=False, choices=[prefix + field for field in ORDERING_FIELDS for prefix in ('', '-')]
+    )
+
+    def validate(self, attrs):
+        for field in ('time_minutes', 'price'):
+            low, high = attrs.get(f'{field}_min'), attrs.get(f'{field}_max')
+            if low is not None and high is not None and low > high:
+                raise serializers.ValidationError({f'{field}_max': _('Must not be lower than the minimum.')})
+
+        return attrs
+
+
+def related_recipe_ids(relation: str, ids: list, match_all: bool = False) -> QuerySet:
+    """
+    Return the IDs of the recipes linked to any, or with `match_all` to all, of the related objects `ids`.
+
+    Both read the link table once, rather than joining it to the recipes, so a recipe matching several objects is
+    returned once. All of them are required by grouping the links per recipe and counting the matching ones.
+    """
+    through = getattr(Recipe, relation).through
+    field = f'{getattr(Recipe, relation).field.m2m_reverse_field_name()}_id'
+    links = through.objects.filter(**{f'{field}__in': ids}).values('recipe_id')
+    if match_all:
+        links = links.annotate(matched=Count(field)).filter(matched=len(ids)).values('recipe_id')
+
+    return links
+
+
+def filter_recipes(queryset: QuerySet, query_params) -> QuerySet:
+    """Filter and order recipes by the query parameters, raising a validation error on invalid ones."""
+    serializer = RecipeFilterSerializer(data=query_params)
+    serializer.is_valid(raise_exception=True)
+    params = serializer.validated_data
+
+    for relation in ('tags', 'ingredients'):
+        if params.get(relation):
+            queryset = queryset.filter(id__in=related_recipe_ids(relation, params[relation]))
+        if params.get(f'{relation}_all'):
+            queryset = queryset.filter(id__in=related_recipe_ids(relation, params[f'{relation}_all'], match_all=True))
+
+    lookups = {
+        'time_minutes_min': 'time_minutes__gte',
+        'time_minutes_max': 'time_minutes__lte',
+        'price_min': 'price__gte',
+        'price_max': 'price__lte',
+    }
+    queryset = queryset.filter(**{lookup: params[param] for param, lookup in lookups.items() if param in params})
+
+    ordering = params.get('ordering')
+    if ordering:
+        queryset = queryset.order_by(ordering, '-id' if ordering.startswith('-') else 'id')
+
+    return queryset
+
+
+def cookable_recipes(queryset: QuerySet, on_hand: List[int], max_missing: int = None) -> QuerySet:
+    """
+    Rank recipes by how many of their ingredients are on hand, fewest missing first.
+
+    Recipes using none of the ingredients on hand are left out through the ingredient index of the link table, and the
+    others get their `ingredient_count`, `covered_count` and `missing_count` from one grouped aggregate over their
+    links, so only the candidate recipes are read.
+    """
+    queryset = queryset.filter(id__in=related_recipe_ids('ingredients', on_hand)).annotate(
+        ingredient_count=Count('ingredients'),
+        covered_count=Count('ingredients', filter=Q(ingredients__in=on_hand)),
+    ).annotate(missing_count=F('ingredient_count') - F('covered_count'))
+    if max_missing is not None:
+        queryset = queryset.filter(missing_count__lte=max_missing)
+
+    return queryset.order_by('missing_count', '-covered_count', 'id')
+
+
+def missing_ingredients(recipe_ids: List[int], on_hand: List[int]) -> Dict[int, List[dict]]:
+    """Return the ingredients missing from each recipe, by recipe ID, in one query."""
+    through = Recipe.ingredients.through
+    missing = {pk: [] for pk in recipe_ids}
+    links = through.objects.filter(recipe_id__in=recipe_ids).exclude(ingredient_id__in=on_hand) \
+        .order_by('ingredient__name').values_list('recipe_id', 'ingredient_id', 'ingredient__name')
+    for recipe_id, ingredient_id, name in links:
+        missing[recipe_id].append({'id': ingredient_id, 'name': name})
+
+    return missing
@@ -0,0 +1,168 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+from typing import Iterator, List
+
+from PIL import Image
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from core.models import Recipe, RecipeImageVariant, IMAGE_PENDING, IMAGE_PROCESSING, IMAGE_READY, IMAGE_FAILED
+from core.storage import last_saved
+
+logger = logging.getLogger(__name__)
+
+# Name, bounding box and format of the variants generated for each recipe image.
+VARIANTS = (
+    ('thumbnail', (150, 150), 'JPEG'),
+    ('medium', (800, 800), 'JPEG'),
+    ('webp', (800, 800), 'WEBP'),
+)
+EXTENSIONS = {'JPEG': 'jpg', 'WEBP': 'webp'}
+UPLOAD_DIR = 'uploads/recipe'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Return the pool processing the images in the background, creating it on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.RECIPE_IMAGE_WORKERS,
+                                           thread_name_prefix='recipe-image')
+        return _executor
+
+
+def schedule(recipe: Recipe) -> None:
+    """
+    Mark the recipe image as pending and queue its processing.
+
+    The work is queued once the current transaction commits, so the worker sees the new image. With
+    `RECIPE_IMAGE_PROCESSING` set to `sync` it runs right away in the calling thread instead.
+    """
+    recipe.image_status = IMAGE_PENDING
+    Recipe.objects.filter(pk=recipe.pk).update(image_status=IMAGE_PENDING, modified=timezone.now())
+
+    if settings.RECIPE_IMAGE_PROCESSING == 'sync':
+        process(recipe.pk)
+    else:
+        transaction.on_commit(lambda: get_executor().submit(_process_in_worker, recipe.pk))
+
+
+def _process_in_worker(recipe_id: int) -> None:
+    """Process an image in a pool thread, which has its own database connection to close afterwards."""
+    close_old_connections()
+    try:
+        process(recipe_id)
+    finally:
+        connection.close()
+
+
+def process(recipe_id: int) -> None:
+    """Generate the variants of a recipe image and record them on the recipe."""
+    recipe = Recipe.objects.filter(pk=recipe_id).first()
+    if recipe is None or not recipe.image:
+        return
+
+    image_name = recipe.image.name
+    Recipe.objects.filter(pk=recipe_id).update(image_status=IMAGE_PROCESSING, modified=timezone.now())
+    try:
+        with recipe.image.open('rb') as f:
+            image = decode(f)
+        for name, size, image_format in VARIANTS:
+            content = resize(image, size, image_format)
+            RecipeImageVariant.objects.filter(recipe=recipe, name=name).delete()
+            variant = RecipeImageVariant(recipe=recipe, name=name)
+            variant.image.save(f'{name}.{EXTENSIONS[image_format]}', content)
+        image_status = IMAGE_READY
+    except Exception:
+        logger.exception('Processing the image of recipe %s failed.', recipe_id)
+        image_status = IMAGE_FAILED
+
+    # The image may have been replaced while processing, in which case its own processing sets the status. The
+    # timestamp is bumped with the status, so conditional requests see the status and the variants change.
+    Recipe.objects.filter(pk=recipe_id, image=image_name).update(image_status=image_status, modified=timezone.now())
+
+
+def find_stalled(timeout: int) -> List[int]:
+    """
+    Return the IDs of the recipes whose image has been pending or processing for over `timeout` seconds.
+
+    The pool is in process memory, so the jobs queued or running when a process exits are lost and their recipes
+    would stay pending. The status changes bump the timestamp, so an unchanged one tells how long the job has waited.
+    """
+    deadline = timezone.now() - timedelta(seconds=timeout)
+    return list(Recipe.objects.filter(
+        image_status__in=(IMAGE_PENDING, IMAGE_PROCESSING), modified__lt=deadline
+    ).exclude(image='').order_by('pk').values_list('pk', flat=True))
+
+
+def is_referenced(name: str) -> bool:
+    """Return whether a recipe or an image variant references the file `name`."""
+    return (Recipe.objects.filter(image=name).exists()
+            or RecipeImageVariant.objects.filter(image=name).exists())
+
+
+def release(name: str) -> bool:
+    """
+    Delete the image file `name` if nothing references it anymore, and return whether it was deleted.
+
+    Files are shared between identical uploads, so the file stays while another row references it. A file touched within
+    `RECIPE_IMAGE_ORPHAN_GRACE` seconds is kept as well, as an upload deduplicated onto it may not be committed yet; the
+    orphan sweep deletes it later if it is still unreferenced.
+    """
+    storage = Recipe._meta.get_field('image').storage
+    if not name or is_referenced(name) or not storage.exists(name):
+        return False
+    if time.time() - last_saved(storage.path(name)) < settings.RECIPE_IMAGE_ORPHAN_GRACE:
+        return False
+
+    storage.delete(name)
+    return True
+
+
+def find_orphans(grace: int) -> Iterator[str]:
+    """Yield the names of the files under the recipe upload directory that no row references, untouched for `grace`s."""
+    storage = Recipe._meta.get_field('image').storage
+    referenced = set(Recipe.objects.exclude(image='').exclude(image=None).values_list('image', flat=True).iterator())
+    referenced.update(RecipeImageVariant.objects.values_list('image', flat=True).iterator())
+    root = storage.path(UPLOAD_DIR)
+    deadline = time.time() - grace
+
+    for directory, _dirs, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, storage.location).replace(os.sep, '/')
+            if name not in referenced and last_saved(path) < deadline:
+                yield name
+
+
+def decode(f) -> Image.Image:
+    """Decode an image into RGB pixels, dropping its metadata such as EXIF and ICC profiles."""
+    image = Image.open(f)
+    if image.width * image.height > settings.RECIPE_IMAGE_MAX_PIXELS:
+        raise ValueError(f'Image of {image.width}x{image.height} pixels is too large to decode.')
+    image.load()
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    image.info = {}
+
+    return image
+
+
+def resize(image: Image.Image, size: tuple, image_format: str) -> ContentFile:
+    """Return a copy of the image that fits `size`, encoded in `image_format`."""
+    variant = image.copy()
+    variant.thumbnail(size, Image.LANCZOS)
+    buffer = BytesIO()
+    variant.save(buffer, format=image_format, quality=settings.RECIPE_IMAGE_QUALITY)
+
+    return ContentFile(buffer.getvalue())
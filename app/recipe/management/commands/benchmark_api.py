@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipe import benchmarks
+
+
+class Rollback(Exception):
+    """Raised to roll back the benchmark data."""
+
+
+class Command(BaseCommand):
+    """Django command to time the main API queries and print their plans against generated data."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100000, help='Number of recipes of the benchmark user.')
+        parser.add_argument('--tags', type=int, default=50, help='Number of tags of the benchmark user.')
+        parser.add_argument('--ingredients', type=int, default=200, help='Number of ingredients of the user.')
+        parser.add_argument('--per-recipe', type=int, default=3, help='Tags and ingredients linked to each recipe.')
+        parser.add_argument('--repeat', type=int, default=5, help='Number of timed runs of each query.')
+        parser.add_argument('--scenario', action='append', dest='scenarios', choices=list(benchmarks.SCENARIOS),
+                            help='Scenario to run, may be repeated. Defaults to all.')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated data instead of rolling back.')
+
+    def handle(self, *args, **options):
+        scenarios = options['scenarios'] or list(benchmarks.SCENARIOS)
+        try:
+            with transaction.atomic():
+                self.stdout.write(f'Generating {options["recipes"]} recipes...')
+                user = benchmarks.create_user()
+                benchmarks.populate(user, options['recipes'], options['tags'], options['ingredients'],
+                                    options['per_recipe'])
+                for name in scenarios:
+                    self.run_scenario(name, user, options['repeat'])
+                if not options['keep']:
+                    raise Rollback
+        except Rollback:
+            pass
+        except Exception as exc:
+            raise CommandError(f'Benchmark failed: {exc}') from exc
+
+    def run_scenario(self, name: str, user, repeat: int) -> None:
+        """Print the best time of `repeat` runs of a scenario and its query plan."""
+        queryset = benchmarks.SCENARIOS[name](user)
+        timings = []
+        rows = 0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            rows = len(queryset.all())
+            timings.append(time.perf_counter() - start)
+
+        self.stdout.write(self.style.SUCCESS(f'{name}: {rows} rows, best of {repeat}: {min(timings) * 1000:.2f} ms'))
+        self.stdout.write(queryset.explain())
@@ -0,0 +1,64 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from recipe import benchmarks
+
+
+class Command(BaseCommand):
+    """
+    Django command to print the query plans of the main API queries.
+
+    Save a report with `--output` before a schema change and pass it to `--compare` afterwards to see both plans of
+    every query side by side.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', help='User to run the queries for. Defaults to the user with most recipes.')
+        parser.add_argument('--scenario', action='append', dest='scenarios', choices=list(benchmarks.SCENARIOS),
+                            help='Query to explain, may be repeated. Defaults to all.')
+        parser.add_argument('--output', help='Write the plans to this JSON file.')
+        parser.add_argument('--compare', help='JSON file written by an earlier run to compare the plans with.')
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['email'])
+        plans = {
+            name: benchmarks.SCENARIOS[name](user).explain()
+            for name in options['scenarios'] or benchmarks.SCENARIOS
+        }
+        previous = self.load(options['compare']) if options['compare'] else {}
+
+        for name, plan in plans.items():
+            self.stdout.write(self.style.SUCCESS(name))
+            if name in previous:
+                status = 'unchanged' if previous[name] == plan else 'changed'
+                self.stdout.write(f'-- before ({status}):')
+                self.stdout.write(previous[name])
+                self.stdout.write('-- after:')
+            self.stdout.write(plan)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(plans, f, indent=2)
+
+    @staticmethod
+    def get_user(email: str = None):
+        """Return the user with the given email or the one with the most recipes."""
+        users = get_user_model().objects.all()
+        user = users.filter(email=email).first() if email else \
+            users.annotate(recipes=Count('recipe')).order_by('-recipes').first()
+        if user is None:
+            raise CommandError('No user to run the queries for.')
+
+        return user
+
+    @staticmethod
+    def load(path: str) -> dict:
+        """Load a report written with `--output`."""
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f'Cannot read {path}: {exc}') from exc
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from recipe import sync
+
+
+class Command(BaseCommand):
+    """Django command to delete the sync tombstones older than the retention period."""
+
+    def handle(self, *args, **options):
+        deleted = sync.prune_tombstones()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} tombstones.'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from recipe import stats
+
+
+class Command(BaseCommand):
+    """Django command to rebuild the recipe statistics from the recipes, for a backfill or after a bulk import."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids', help='Only rebuild this user ID.')
+
+    def handle(self, *args, **options):
+        count = stats.rebuild(options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the recipe statistics of {count} users.'))
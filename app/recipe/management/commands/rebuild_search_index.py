@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from recipe import search
+
+
+class Command(BaseCommand):
+    """Django command to rebuild the recipe search index from scratch."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=search.BATCH_SIZE, help='Recipes indexed per batch.')
+
+    def handle(self, *args, **options):
+        count = search.rebuild(options['batch_size'])
+        backend = 'FTS5 table' if search.use_fts() else 'term index'
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} recipes in the {backend}.'))
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipe import images
+
+
+class Command(BaseCommand):
+    """Django command to process again the recipe images whose background processing was lost."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='List the stalled recipes without processing them.')
+        parser.add_argument('--timeout', type=int, default=settings.RECIPE_IMAGE_STALLED_TIMEOUT,
+                            help='Seconds an image must have been pending or processing for.')
+
+    def handle(self, *args, **options):
+        recipe_ids = images.find_stalled(options['timeout'])
+        for recipe_id in recipe_ids:
+            if options['verbosity'] > 1 or options['dry_run']:
+                self.stdout.write(str(recipe_id))
+            if not options['dry_run']:
+                # Processed right here, as a pool of this short lived process could exit before finishing.
+                images.process(recipe_id)
+
+        verb = 'Found' if options['dry_run'] else 'Processed'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {len(recipe_ids)} stalled recipe images.'))
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.models import Recipe
+from recipe import images
+
+
+class Command(BaseCommand):
+    """Django command to delete the recipe image files no recipe or variant references."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='List the orphaned files without deleting them.')
+        parser.add_argument('--grace', type=int, default=settings.RECIPE_IMAGE_ORPHAN_GRACE,
+                            help='Seconds a file must be untouched for before it is deleted.')
+
+    def handle(self, *args, **options):
+        storage = Recipe._meta.get_field('image').storage
+        count = 0
+        for name in images.find_orphans(options['grace']):
+            if options['verbosity'] > 1 or options['dry_run']:
+                self.stdout.write(name)
+            if not options['dry_run']:
+                storage.delete(name)
+            count += 1
+
+        verb = 'Found' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {count} orphaned image files.'))
@@ -0,0 +1,149 @@
+import hashlib
+from typing import Callable, Optional
+
+from django.db.models import Count, Max
+from django.db.models.query import QuerySet
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from core import routers
+from recipe import cache, sync
+
+
+class ConditionalGetMixin:
+    """
+    Answer conditional list and retrieve requests without running the serializers.
+
+    The ETag is derived from a watermark of the `modified` timestamps of the requested rows, read with a single
+    aggregate query, so a request whose `If-None-Match` still matches gets a 304 without loading any object.
+    """
+
+    def list(self, request: Request, *args, **kwargs) -> Response:
+        queryset = self.filter_queryset(self.get_queryset()).order_by()
+        if queryset.query.annotations:
+            # Aggregating annotated rows wraps them in a subquery, where some annotations such as the search rank can't
+            # be evaluated. The watermark doesn't need them, so only the matching IDs are selected.
+            queryset = queryset.model._default_manager.filter(pk__in=queryset.values('pk'))
+        watermark = queryset.aggregate(count=Count('pk'), modified=Max('modified'))
+        etag = self.make_etag(request, watermark['count'], watermark['modified'])
+        return self.conditional_response(etag, super().list, request, *args, **kwargs)
+
+    def retrieve(self, request: Request, *args, **kwargs) -> Response:
+        lookup = {self.lookup_field: kwargs[self.lookup_url_kwarg or self.lookup_field]}
+        modified = self.get_queryset().filter(**lookup).values_list('modified', flat=True).first()
+        etag = self.make_etag(request, modified) if modified else None
+        return self.conditional_response(etag, super().retrieve, request, *args, **kwargs)
+
+    @staticmethod
+    def make_etag(request: Request, *watermark) -> str:
+        """Return a strong ETag for the watermark of the rows, the user, the URL and the response format."""
+        parts = [request.user.pk, request.get_full_path(), request.accepted_renderer.format, *watermark]
+        return quote_etag(hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest())
+
+    @staticmethod
+    def conditional_response(etag: Optional[str], handler: Callable, request: Request, *args, **kwargs) -> Response:
+        """Return 304 when the request's `If-None-Match` matches `etag`, else the response of `handler`."""
+        if etag is None:
+            return handler(request, *args, **kwargs)
+
+        if_none_match = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+        if etag in if_none_match or '*' in if_none_match:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            response['ETag'] = etag
+
+        return response
+
+
+class CachedListMixin:
+    """Serve list responses from the recipe attribute cache until the user's objects change."""
+
+    def list(self, request: Request, *args, **kwargs) -> Response:
+        key = cache.response_key(self.queryset.model, request)
+        data = cache.get_response(key)
+        if data is not None:
+            return Response(data, headers={'X-Cache': 'HIT'})
+
+        response = super().list(request, *args, **kwargs)
+        cache.set_response(key, response.data)
+        response['X-Cache'] = 'MISS'
+
+        return response
+
+
+class DeltaSyncMixin:
+    """
+    Return only what changed since a sync token when the list is requested with `?since=<token>`.
+
+    The changed objects are returned in pages ordered by (modified, id), followed with the `next` links like the list.
+    An object written while the client pages through moves past the cursor, so it is returned again on a later page.
+    The last page holds the IDs of the deleted objects and the token to pass on the next sync, the other pages have a
+    null token. An empty `since` returns everything along with a first token. Query filters are ignored in this mode,
+    as an object leaving the filter could not be reported.
+    """
+
+    def list(self, request: Request, *args, **kwargs) -> Response:
+        if 'since' not in request.query_params:
+            return super().list(request, *args, **kwargs)
+
+        since = sync.parse_token(request.query_params['since'])
+        # Made before reading the page, so the changes committed while it is read are returned by the next sync.
+        token = sync.make_token()
+        changed = self.get_sync_queryset()
+        if since is not None:
+            changed = changed.filter(modified__gte=since)
+
+        page = self.paginate_queryset(changed.order_by('modified', 'id'))
+        last = not self.paginator.has_next
+
+        return Response({
+            'next': self.paginator.get_next_link(),
+            'results': self.get_serializer(page, many=True).data,
+            'deleted': sync.deleted_ids(self.queryset.model, request.user, since) if last else [],
+            'token': token if last else None,
+        })
+
+    def get_sync_queryset(self) -> QuerySet:
+        """Return every object of the user, whatever the query filters."""
+        return self.queryset.filter(user=self.request.user)
+
+
+class ReplicaReadMixin:
+    """
+    Read the `replica_actions` of the view set from a database replica.
+
+    A user who wrote through one of these views is pinned to the primary for `DB_REPLICA_STICKY_SECONDS`, long enough
+    for the replicas to catch up, so they always read their own writes. Delta syncs are always read from the primary.
+    """
+    replica_actions = ('list', 'retrieve')
+
+    def initial(self, request: Request, *args, **kwargs) -> None:
+        super().initial(request, *args, **kwargs)
+        if self.reads_from_replica(request):
+            routers.use_replica()
+
+    def dispatch(self, request, *args, **kwargs):
+        # Reset in dispatch rather than finalize_response(), which is skipped when the view raises.
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            routers.use_primary()
+
+    def reads_from_replica(self, request: Request) -> bool:
+        """Return whether the request can be answered from a replica."""
+        # Sync tokens are read from the clock, a lagging replica would have the client skip the changes it misses.
+        if request.method not in SAFE_METHODS or 'since' in request.query_params:
+            return False
+
+        return self.action in self.replica_actions and not routers.is_pinned(request.user.pk)
+
+    def finalize_response(self, request: Request, response: Response, *args, **kwargs) -> Response:
+        if request.method not in SAFE_METHODS and response.status_code < 400 and request.user.is_authenticated:
+            routers.pin(request.user.pk)
+
+        return super().finalize_response(request, response, *args, **kwargs)
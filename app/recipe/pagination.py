@@ -0,0 +1,111 @@
+import json
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.db.models.query import QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+
+
+class RecipeCursorPagination(CursorPagination):
+    """
+    Keyset pagination for the recipe API.
+
+    Pages are addressed by an opaque cursor that encodes the values of every ordering field of the row the page starts
+    after, the ordering always ending with the ID. The next page is then a range condition on the ordering rather than
+    an offset, so with an ordering backed by an index every page costs the same no matter how deep it is, even when
+    the first ordering field has duplicates, and a client can resume from any `next` link it has kept.
+    """
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+    max_page_size = settings.API_MAX_PAGE_SIZE
+
+    def get_ordering(self, request, queryset, view):
+        """
+        Keep the ordering the view applied, such as a requested ordering or the search rank, else the default.
+
+        The ID is appended when missing, so positions are unique.
+        """
+        if queryset.query.order_by:
+            ordering = tuple(queryset.query.order_by)
+        else:
+            ordering = super().get_ordering(request, queryset, view)
+        if ordering[-1].lstrip('-') not in ('id', 'pk'):
+            ordering += ('-id' if ordering[-1].startswith('-') else 'id', )
+
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """
+        Return the page following or preceding the position of the cursor.
+
+        Positions being unique, the offsets of the base class cursors are never needed and are ignored.
+        """
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        position = self.cursor.position if self.cursor is not None else None
+
+        queryset = queryset.order_by(*(_reverse_ordering(self.ordering) if reverse else self.ordering))
+        if position is not None:
+            queryset = self.after(queryset, position, reverse)
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        following = None
+        if len(results) > len(self.page):
+            following = self._get_position_from_instance(results[-1], self.ordering)
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.next_position = position is not None, position
+            self.has_previous, self.previous_position = following is not None, following
+        else:
+            self.has_next, self.next_position = following is not None, following
+            self.has_previous, self.previous_position = position is not None, position
+        self.display_page_controls = self.has_previous or self.has_next
+
+        return self.page
+
+    def after(self, queryset: QuerySet, position: str, reverse: bool) -> QuerySet:
+        """
+        Filter the rows after `position` in the ordering, or before it when `reverse`.
+
+        For an ordering (a, id), rows after (x, y) are the ones with a >= x and either a > x or id > y. The leading
+        range on the first field lets the database seek its index instead of evaluating the alternatives on every row.
+        """
+        try:
+            values = json.loads(position)
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError(position)
+
+            conditions = []
+            equal = Q()
+            for order, value in zip(self.ordering, values):
+                field = order.lstrip('-')
+                lookup = 'lt' if order.startswith('-') != reverse else 'gt'
+                conditions.append(equal & Q(**{f'{field}__{lookup}': value}))
+                equal &= Q(**{field: value})
+            first = self.ordering[0].lstrip('-')
+            first_lookup = 'lte' if self.ordering[0].startswith('-') != reverse else 'gte'
+
+            return queryset.filter(Q(**{f'{first}__{first_lookup}': values[0]}), reduce(or_, conditions))
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _get_position_from_instance(self, instance, ordering) -> str:
+        """Return the values of every ordering field of `instance`, as a JSON list of strings."""
+        values = []
+        for order in ordering:
+            field = order.lstrip('-')
+            values.append(str(instance[field] if isinstance(instance, dict) else getattr(instance, field)))
+
+        return json.dumps(values)
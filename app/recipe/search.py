@@ -0,0 +1,204 @@
+import re
+import threading
+import time
+import unicodedata
+from contextlib import contextmanager
+from functools import reduce
+from operator import or_
+from typing import Dict, Iterable, List
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import CharField, FloatField, OuterRef, Q, QuerySet, Subquery, Sum, Value
+from django.db.models.expressions import RawSQL
+
+from core.models import Recipe, RecipeSearchTerm
+
+FTS_TABLE = 'recipe_search_fts'
+# Weight of a match in each indexed field, the title counting most.
+WEIGHTS = {'title': 3, 'tags': 2, 'ingredients': 1}
+RELATIONS = ('tags', 'ingredients')
+MAX_QUERY_TERMS = 10
+TERM_MAX_LENGTH = RecipeSearchTerm._meta.get_field('term').max_length
+BATCH_SIZE = 500
+TERM_RE = re.compile(r'\w+')
+# Seconds before a database found without the FTS5 table is checked again, so processes started before the migration
+# creating it switch to it.
+FTS_RECHECK_SECONDS = 60
+
+_deferred = threading.local()
+_fts_checked = {}
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase terms without diacritics, as the FTS5 `unicode61` tokenizer does."""
+    text = ''.join(c for c in unicodedata.normalize('NFKD', text.lower()) if not unicodedata.combining(c))
+    return TERM_RE.findall(text)
+
+
+def use_fts() -> bool:
+    """Return whether searches use the FTS5 table rather than the portable term index."""
+    if settings.RECIPE_SEARCH_BACKEND != 'auto' or connection.vendor != 'sqlite':
+        return False
+    return _has_fts_table(connection.settings_dict['NAME'])
+
+
+def _has_fts_table(database_name: str) -> bool:
+    """Return whether the database has the FTS5 table, caching a found table for good and a missing one briefly."""
+    found, checked = _fts_checked.get(database_name, (False, None))
+    if not found and (checked is None or time.monotonic() - checked > FTS_RECHECK_SECONDS):
+        found = FTS_TABLE in connection.introspection.table_names()
+        _fts_checked[database_name] = (found, time.monotonic())
+
+    return found
+
+
+def search(queryset: QuerySet, q: str, user_id: int) -> QuerySet:
+    """
+    Filter recipes of a user on the terms of `q`, annotate their `search_rank` and order them best first.
+
+    Every term must prefix a word of the title, a tag name or an ingredient name. Lower ranks are better matches, the
+    rank weighing title matches over tag matches over ingredient matches. Both indexes are looked up by term within
+    the user, so the cost grows with the number of matches rather than the size of the library.
+    """
+    terms = tokenize(q)[:MAX_QUERY_TERMS]
+    if not terms:
+        return queryset.none()
+    if use_fts():
+        queryset = _search_fts(queryset, terms, user_id)
+    else:
+        queryset = _search_terms(queryset, terms, user_id)
+
+    return queryset.order_by('search_rank', 'id')
+
+
+def _search_fts(queryset: QuerySet, terms: List[str], user_id: int) -> QuerySet:
+    phrases = ' '.join(f'"{term}"*' for term in terms)
+    match = f'owner:u{user_id} AND {{{" ".join(WEIGHTS)}}}: ({phrases})'
+    weights = ', '.join(f'{float(weight)}' for weight in WEIGHTS.values())
+    # Joined rather than looked up per recipe, so the match runs once and bm25() ranks the rows it returns.
+    queryset = queryset.extra(
+        tables=[FTS_TABLE],
+        where=[f'{FTS_TABLE}.rowid = {Recipe._meta.db_table}.id', f'{FTS_TABLE} MATCH %s'],
+        params=[match],
+    )
+
+    return queryset.annotate(search_rank=RawSQL(f'bm25({FTS_TABLE}, {weights}, 0.0)', (), output_field=FloatField()))
+
+
+def _search_terms(queryset: QuerySet, terms: List[str], user_id: int) -> QuerySet:
+    # Term ranges rather than LIKE prefixes, so every database can use the (user, term) index.
+    prefixes = [Q(term__gte=term, term__lt=term + '\U0010ffff') for term in terms]
+    index = RecipeSearchTerm.objects.filter(user_id=user_id)
+    for prefix in prefixes:
+        queryset = queryset.filter(id__in=index.filter(prefix).values('recipe_id'))
+    rank = index.filter(reduce(or_, prefixes), recipe_id=OuterRef('pk')).order_by() \
+        .values('recipe_id').annotate(rank=Sum('weight') * -1).values('rank')
+
+    return queryset.annotate(search_rank=Subquery(rank, output_field=FloatField()))
+
+
+@contextmanager
+def deferred():
+    """Collect the recipes reindexed within the block, for instance by signals, and reindex them once at its end."""
+    if getattr(_deferred, 'recipe_ids', None) is not None:
+        yield
+        return
+
+    _deferred.recipe_ids = []
+    try:
+        yield
+        recipe_ids = _deferred.recipe_ids
+    finally:
+        _deferred.recipe_ids = None
+    reindex(recipe_ids)
+
+
+def reindex(recipe_ids: Iterable[int]) -> None:
+    """Update the search index of recipes, removing the ones that no longer exist."""
+    if getattr(_deferred, 'recipe_ids', None) is not None:
+        _deferred.recipe_ids.extend(recipe_ids)
+        return
+
+    recipe_ids = list(dict.fromkeys(recipe_ids))
+    for start in range(0, len(recipe_ids), BATCH_SIZE):
+        batch = recipe_ids[start:start + BATCH_SIZE]
+        documents = _documents(batch)
+        # Within the transaction of the write when there is one, without a savepoint of its own.
+        with transaction.atomic(savepoint=False):
+            if use_fts():
+                _write_fts(batch, documents)
+            else:
+                _write_terms(batch, documents)
+
+
+def _documents(recipe_ids: List[int]) -> Dict[int, dict]:
+    """Return the indexed text of recipes, with one query for the recipes and one for the names of both relations."""
+    documents = {
+        pk: {'user_id': user_id, 'title': title, 'tags': [], 'ingredients': []}
+        for pk, user_id, title in Recipe.objects.filter(pk__in=recipe_ids).values_list('pk', 'user_id', 'title')
+    }
+    if not documents:
+        return documents
+
+    names = [
+        getattr(Recipe, relation).through.objects.filter(recipe_id__in=documents)
+        .annotate(relation=Value(relation, output_field=CharField()))
+        .values_list('recipe_id', f'{getattr(Recipe, relation).field.m2m_reverse_field_name()}__name', 'relation')
+        for relation in RELATIONS
+    ]
+    for recipe_id, name, relation in names[0].union(*names[1:], all=True):
+        documents[recipe_id][relation].append(name)
+
+    return documents
+
+
+def _write_fts(recipe_ids: List[int], documents: Dict[int, dict]) -> None:
+    # Indexed recipes are replaced by rowid, so only the ones that no longer exist need a delete.
+    removed = [pk for pk in recipe_ids if pk not in documents]
+    with connection.cursor() as cursor:
+        if removed:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({", ".join(["%s"] * len(removed))})', removed)
+        if documents:
+            cursor.executemany(
+                f'INSERT OR REPLACE INTO {FTS_TABLE} (rowid, title, tags, ingredients, owner) '
+                'VALUES (%s, %s, %s, %s, %s)',
+                [(pk, doc['title'], ' '.join(doc['tags']), ' '.join(doc['ingredients']), f'u{doc["user_id"]}')
+                 for pk, doc in documents.items()],
+            )
+
+
+def _write_terms(recipe_ids: List[int], documents: Dict[int, dict]) -> None:
+    RecipeSearchTerm.objects.filter(recipe_id__in=recipe_ids).delete()
+    entries = []
+    for pk, doc in documents.items():
+        weights = {}
+        for field, weight in WEIGHTS.items():
+            text = doc[field] if field == 'title' else ' '.join(doc[field])
+            for term in set(tokenize(text)):
+                weights[term[:TERM_MAX_LENGTH]] = weights.get(term[:TERM_MAX_LENGTH], 0) + weight
+        entries.extend(RecipeSearchTerm(user_id=doc['user_id'], recipe_id=pk, term=term, weight=weight)
+                       for term, weight in weights.items())
+    RecipeSearchTerm.objects.bulk_create(entries)
+
+
+def remove(recipe_ids: Iterable[int]) -> None:
+    """Remove deleted recipes from the FTS5 table, the term index rows are deleted with the recipes."""
+    recipe_ids = list(recipe_ids)
+    if recipe_ids and use_fts():
+        _write_fts(recipe_ids, {})
+
+
+def rebuild(batch_size: int = BATCH_SIZE) -> int:
+    """Rebuild the search index of every recipe and return the number of recipes indexed."""
+    if use_fts():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+    else:
+        RecipeSearchTerm.objects.all().delete()
+
+    recipe_ids = list(Recipe.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(recipe_ids), batch_size):
+        reindex(recipe_ids[start:start + batch_size])
+
+    return len(recipe_ids)
@@ -1,47 +1,352 @@
+from collections import Counter
+from typing import List
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import QuerySet
+from django.utils import timezone
 from rest_framework import serializers
+from rest_framework.exceptions import ErrorDetail
+from rest_framework.validators import UniqueTogetherValidator
+
+from core.metrics import TimedSerializerMixin
+from core.models import Tag, Ingredient, Recipe, RecipeImageVariant
+from recipe import cache, search, stats, sync
+from recipe.fields import UserPrimaryKeyRelatedField
+
+RELATIONS = {'tags': Tag, 'ingredients': Ingredient}
+
 
-from core.models import Tag, Ingredient, Recipe
+def _delete_links(links: QuerySet) -> None:
+    """Delete recipe links with one query, where `delete()` reads them first for the `m2m_changed` receivers."""
+    links._raw_delete(links.db)
 
 
-class TagSerializer(serializers.ModelSerializer):
+def _cache_related(recipe: Recipe, relation: str, objects: List) -> None:
+    """Cache the tags or ingredients just written to a recipe, as a prefetch does, so rendering it doesn't read them."""
+    queryset = RELATIONS[relation].objects.all()
+    queryset._result_cache = list(objects)
+    queryset._prefetch_done = True
+    recipe._prefetched_objects_cache = {**getattr(recipe, '_prefetched_objects_cache', {}), relation: queryset}
+
+
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for tag object."""
+    user = serializers.HiddenField(default=serializers.CurrentUserDefault())
+    usage_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Tag
-        fields = ('id', 'name')
+        fields = ('id', 'name', 'user', 'usage_count')
+        validators = [UniqueTogetherValidator(queryset=Tag.objects.all(), fields=('user', 'name'))]
         read_only_fields = ('id', )
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for ingredient objects."""
+    user = serializers.HiddenField(default=serializers.CurrentUserDefault())
+    usage_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Ingredient
-        fields = ('id', 'name')
+        fields = ('id', 'name', 'user', 'usage_count')
+        validators = [UniqueTogetherValidator(queryset=Ingredient.objects.all(), fields=('user', 'name'))]
         read_only_fields = ('id',)
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for recipe object."""
-    ingredients = serializers.PrimaryKeyRelatedField(many=True, queryset=Ingredient.objects.all())
-    tags = serializers.PrimaryKeyRelatedField(many=True, queryset=Tag.objects.all())
+    ingredients = UserPrimaryKeyRelatedField(many=True, queryset=Ingredient.objects.all())
+    tags = UserPrimaryKeyRelatedField(many=True, queryset=Tag.objects.all())
 
     class Meta:
         model = Recipe
         fields = ('id', 'title', 'ingredients', 'tags', 'time_minutes', 'price', 'link')
         read_only_fields = ('id', )
 
+    def create(self, validated_data: dict) -> Recipe:
+        relations = {relation: validated_data.pop(relation) for relation in RELATIONS if relation in validated_data}
+        recipe = super().create(validated_data)
+        self._set_relations(recipe, relations, created=True)
+
+        return recipe
+
+    def update(self, instance: Recipe, validated_data: dict) -> Recipe:
+        relations = {relation: validated_data.pop(relation) for relation in RELATIONS if relation in validated_data}
+        # Read along with the recipe, so the save doesn't read them again for the statistics and the search index.
+        instance._loaded_values = {field: getattr(instance, field) for field in ('title', *stats.FIELDS)}
+        recipe = super().update(instance, validated_data)
+        self._set_relations(recipe, relations)
+
+        return recipe
+
+    @staticmethod
+    def _set_relations(recipe: Recipe, relations: dict, created: bool = False) -> None:
+        """
+        Replace the tags and ingredients of a saved recipe with the given ones.
+
+        The related managers read the links again before each change and their signals read them once more, so the
+        links are written directly instead, with a read of the current links, a delete and an insert per relation,
+        and the statistics, caches and search index the signals keep are updated here.
+        """
+        for relation, objects in relations.items():
+            through = getattr(Recipe, relation).through
+            field = f'{getattr(Recipe, relation).field.m2m_reverse_field_name()}_id'
+            pks = [obj.pk for obj in objects]
+            current = set() if created else set(
+                through.objects.filter(recipe_id=recipe.pk).values_list(field, flat=True)
+            )
+            removed = current.difference(pks)
+            added = [pk for pk in pks if pk not in current]
+            if removed:
+                _delete_links(through.objects.filter(recipe_id=recipe.pk, **{f'{field}__in': removed}))
+            through.objects.bulk_create(through(recipe_id=recipe.pk, **{field: pk}) for pk in added)
+
+            if removed or added:
+                stats.add_usage(recipe.user_id, relation, {**{pk: -1 for pk in removed}, **{pk: 1 for pk in added}})
+                cache.invalidate(RELATIONS[relation], recipe.user_id)
+                search.reindex([recipe.pk])
+            _cache_related(recipe, relation, objects)
+
+
+class RecipeImageVariantSerializer(serializers.ModelSerializer):
+    """Serializer for recipe image variants."""
+
+    class Meta:
+        model = RecipeImageVariant
+        fields = ('name', 'image', 'width', 'height')
+        read_only_fields = fields
+
 
 class RecipeDetailSerializer(RecipeSerializer):
     """Serializer for recipe detail."""
     ingredients = IngredientSerializer(many=True, read_only=True)
     tags = TagSerializer(many=True, read_only=True)
+    image_variants = RecipeImageVariantSerializer(many=True, read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('image_status', 'image_variants')
+        read_only_fields = ('id', 'image_status')
+
+
+class CookableRecipeSerializer(RecipeSerializer):
+    """Serializer for a recipe ranked by the ingredients on hand, with the missing ones."""
+    ingredient_count = serializers.IntegerField(read_only=True)
+    covered_count = serializers.IntegerField(read_only=True)
+    missing_count = serializers.IntegerField(read_only=True)
+    missing_ingredients = serializers.SerializerMethodField()
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('ingredient_count', 'covered_count', 'missing_count',
+                                                 'missing_ingredients')
+
+    def get_missing_ingredients(self, recipe: Recipe) -> List[dict]:
+        return self.context['missing_ingredients'].get(recipe.id, [])
 
 
-class RecipeImageSerializer(serializers.ModelSerializer):
+class RecipeImageSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for uploading image to recipe."""
 
     class Meta:
         model = Recipe
-        fields = ('id', 'image')
-        read_only_fields = ('id', )
+        fields = ('id', 'image', 'image_status')
+        read_only_fields = ('id', 'image_status')
+
+
+class RecipeBulkListSerializer(serializers.ListSerializer):
+    """
+    Serializer for writing many recipes at once.
+
+    Items with an `id` update the matching recipe with the fields they give, like a PATCH, their tags or ingredients
+    only being replaced when given. Tags, ingredients and recipes to update are checked with one query per type for
+    the whole list, and the recipes and their relations are written with bulk queries inside a single transaction.
+    """
+    relations = RELATIONS
+    default_error_messages = {
+        'max_items': 'Ensure this list has no more than {max_items} items.',
+        'does_not_exist': 'Invalid pk "{pk_value}" - object does not exist.',
+        'duplicate': 'Recipe "{pk_value}" is updated more than once.',
+    }
+
+    def to_internal_value(self, data):
+        """Validate every item, then check that the referenced objects exist and belong to the user."""
+        if not isinstance(data, list):
+            return super().to_internal_value(data)
+
+        max_items = settings.RECIPE_BULK_MAX_ITEMS
+        if len(data) > max_items:
+            self.fail('max_items', max_items=max_items)
+
+        items = []
+        errors = []
+        partial = self.partial
+        for item in data:
+            # Required fields are checked against the root, so updates are made partial through it.
+            self.partial = partial or (isinstance(item, dict) and 'id' in item)
+            try:
+                items.append(self.child.run_validation(item))
+                errors.append({})
+            except serializers.ValidationError as exc:
+                items.append({})
+                errors.append(exc.detail)
+            finally:
+                self.partial = partial
+
+        user = self.context['request'].user
+        existing = {
+            relation: set(model.objects.filter(
+                user=user, id__in={pk for item in items for pk in item.get(relation, [])}
+            ).values_list('id', flat=True))
+            for relation, model in self.relations.items()
+        }
+        updated_ids = Counter(item['id'] for item in items if 'id' in item)
+        self.recipes = Recipe.objects.filter(user=user, id__in=updated_ids).in_bulk()
+
+        for item, item_errors in zip(items, errors):
+            item_errors.update({
+                field: messages for field, messages in self._item_errors(item, existing, updated_ids).items()
+                if field not in item_errors
+            })
+        if any(errors):
+            raise serializers.ValidationError(errors)
+
+        return items
+
+    def _item_errors(self, item: dict, existing: dict, updated_ids: Counter) -> dict:
+        """Return the errors of the objects referenced by one item."""
+        errors = {}
+        for relation in self.relations:
+            missing = [pk for pk in item.get(relation, []) if pk not in existing[relation]]
+            if missing:
+                errors[relation] = [self._error('does_not_exist', pk) for pk in missing]
+
+        if 'id' in item:
+            if item['id'] not in self.recipes:
+                errors['id'] = [self._error('does_not_exist', item['id'])]
+            elif updated_ids[item['id']] > 1:
+                errors['id'] = [self._error('duplicate', item['id'])]
+
+        return errors
+
+    def _error(self, code: str, pk_value: int) -> ErrorDetail:
+        return ErrorDetail(self.error_messages[code].format(pk_value=pk_value), code=code)
+
+    def create(self, validated_data: List[dict]) -> List[Recipe]:
+        """Create the new recipes, update the existing ones and set the relations the items give."""
+        recipes = []
+        new_recipes = []
+        updated_fields = {'modified'}
+        now = timezone.now()
+        old_values = [{field: getattr(recipe, field) for field in stats.FIELDS} for recipe in self.recipes.values()]
+        for item in validated_data:
+            fields = {k: v for k, v in item.items() if k not in self.relations and k != 'id'}
+            if 'id' in item:
+                recipe = self.recipes[item['id']]
+                recipe.modified = now
+                for attr, value in fields.items():
+                    setattr(recipe, attr, value)
+                updated_fields.update(fields)
+            else:
+                recipe = Recipe(**fields)
+                new_recipes.append(recipe)
+            recipes.append(recipe)
+
+        user_id = self.context['request'].user.id
+        with transaction.atomic(), search.deferred(), stats.deferred(), sync.deferred():
+            self._insert_recipes(new_recipes)
+            if self.recipes:
+                Recipe.objects.bulk_update(list(self.recipes.values()), updated_fields - {'user'})
+                stats.add_recipes(user_id, removed=old_values, added=[
+                    {field: getattr(recipe, field) for field in stats.FIELDS} for recipe in self.recipes.values()
+                ])
+
+            for relation in self.relations:
+                through = getattr(Recipe, relation).through
+                field = getattr(Recipe, relation).field.m2m_reverse_field_name()
+                usage = Counter()
+                replaced = [item['id'] for item in validated_data if 'id' in item and relation in item]
+                if replaced:
+                    old_links = through.objects.filter(recipe_id__in=replaced)
+                    usage.subtract(old_links.values_list(f'{field}_id', flat=True))
+                    _delete_links(old_links)
+                links = [
+                    through(recipe_id=recipe.id, **{f'{field}_id': pk})
+                    for recipe, item in zip(recipes, validated_data)
+                    for pk in dict.fromkeys(item.get(relation, []))
+                ]
+                through.objects.bulk_create(links)
+                usage.update(getattr(link, f'{field}_id') for link in links)
+                stats.add_usage(user_id, relation, usage)
+                cache.invalidate(self.relations[relation], user_id)
+            search.reindex(recipe.id for recipe in recipes)
+
+        return recipes
+
+    @staticmethod
+    def _insert_recipes(recipes: List[Recipe]) -> None:
+        """Insert new recipes, falling back to one insert per recipe on databases that don't return bulk IDs."""
+        if connections[router.db_for_write(Recipe)].features.can_return_ids_from_bulk_insert:
+            Recipe.objects.bulk_create(recipes)
+            # Bulk inserts send no post_save signal to count the recipes.
+            if recipes:
+                stats.add_recipes(recipes[0].user_id, added=[
+                    {field: getattr(recipe, field) for field in stats.FIELDS} for recipe in recipes
+                ])
+            return
+
+        for recipe in recipes:
+            recipe.save(force_insert=True)
+
+
+class RecipeBulkItemSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Serializer for one recipe of a bulk write, with tags and ingredients given as IDs."""
+    id = serializers.IntegerField(required=False)
+    ingredients = serializers.ListField(child=serializers.IntegerField(), required=False)
+    tags = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+    class Meta:
+        model = Recipe
+        fields = ('id', 'title', 'ingredients', 'tags', 'time_minutes', 'price', 'link')
+        list_serializer_class = RecipeBulkListSerializer
+
+
+class RecipeStatsParamsSerializer(serializers.Serializer):
+    """Query parameters of the recipe statistics."""
+    top = serializers.IntegerField(required=False, default=10, min_value=1, max_value=100,
+                                   help_text='Number of top tags and ingredients.')
+
+
+class TimeStatsSerializer(serializers.Serializer):
+    """Distribution of the preparation times of the recipes of a user."""
+    average = serializers.DecimalField(max_digits=12, decimal_places=2, allow_null=True)
+    min = serializers.IntegerField(allow_null=True)
+    max = serializers.IntegerField(allow_null=True)
+    p50 = serializers.IntegerField(allow_null=True)
+    p90 = serializers.IntegerField(allow_null=True)
+    p99 = serializers.IntegerField(allow_null=True)
+
+
+class PriceStatsSerializer(serializers.Serializer):
+    """Distribution of the prices of the recipes of a user."""
+    average = serializers.DecimalField(max_digits=12, decimal_places=2, allow_null=True)
+    min = serializers.DecimalField(max_digits=12, decimal_places=2, allow_null=True)
+    max = serializers.DecimalField(max_digits=12, decimal_places=2, allow_null=True)
+    p50 = serializers.DecimalField(max_digits=12, decimal_places=2, allow_null=True)
+    p90 = serializers.DecimalField(max_digits=12, decimal_places=2, allow_null=True)
+    p99 = serializers.DecimalField(max_digits=12, decimal_places=2, allow_null=True)
+
+
+class TopAttrSerializer(serializers.Serializer):
+    """Tag or ingredient among the most used by the recipes of a user."""
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    recipe_count = serializers.IntegerField()
+
+
+class RecipeStatsSerializer(TimedSerializerMixin, serializers.Serializer):
+    """Statistics of the recipes of a user."""
+    recipe_count = serializers.IntegerField()
+    time_minutes = TimeStatsSerializer()
+    price = PriceStatsSerializer()
+    top_tags = TopAttrSerializer(many=True)
+    top_ingredients = TopAttrSerializer(many=True)
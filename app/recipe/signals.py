@@ -0,0 +1,248 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.models import Tag, Ingredient, Recipe, RecipeImageVariant
+from recipe import cache, images, search, stats, sync
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_recipe_attr(sender, instance, **kwargs):
+    """Invalidate the cached lists of a tag or ingredient when it is written."""
+    cache.invalidate(sender, instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(sender, instance, action, **kwargs):
+    """Invalidate the cached tag lists when the tags of a recipe change, as they affect the assigned only list."""
+    if action.startswith('post_'):
+        cache.invalidate(Tag, instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_recipe_ingredients(sender, instance, action, **kwargs):
+    """Invalidate the cached ingredient lists when the ingredients of a recipe change."""
+    if action.startswith('post_'):
+        cache.invalidate(Ingredient, instance.user_id)
+
+
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe(sender, instance, **kwargs):
+    """Invalidate the cached lists of a user when one of their recipes, and so its links, is deleted."""
+    cache.invalidate(Tag, instance.user_id)
+    cache.invalidate(Ingredient, instance.user_id)
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_new_user(sender, instance, created, **kwargs):
+    """Start new users with empty caches, in case their ID was used before by a rolled back transaction."""
+    if created:
+        cache.invalidate(Tag, instance.id)
+        cache.invalidate(Ingredient, instance.id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def touch_recipe_relations(sender, instance, action, reverse, pk_set, **kwargs):
+    """Bump the modified timestamp of the recipes whose tags or ingredients change."""
+    if not reverse:
+        if action.startswith('post_'):
+            instance.modified = timezone.now()
+            sync.touch([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        sync.touch(pk_set)
+    elif action == 'pre_clear':
+        sync.touch(instance.recipe_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Recipe)
+def record_recipe_save(sender, instance, update_fields=None, **kwargs):
+    """Record a save bumping the modified timestamp, so relation changes in the same write don't bump it again."""
+    if update_fields is None or 'modified' in update_fields:
+        sync.record_save(instance.pk)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def touch_tag_recipes(sender, instance, created=False, **kwargs):
+    """Bump the modified timestamp of the recipes showing a tag that is renamed or deleted."""
+    if not created:
+        Recipe.objects.filter(tags=instance).update(modified=timezone.now())
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Ingredient)
+def touch_ingredient_recipes(sender, instance, created=False, **kwargs):
+    """Bump the modified timestamp of the recipes showing an ingredient that is renamed or deleted."""
+    if not created:
+        Recipe.objects.filter(ingredients=instance).update(modified=timezone.now())
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def record_deletion(sender, instance, **kwargs):
+    """Keep a tombstone of deleted objects so syncing clients learn about the deletion."""
+    sync.record_deletion(instance)
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_replaced_image(sender, instance, **kwargs):
+    """Remember the image a new upload replaces, so its file can be released once saved."""
+    if instance.pk and instance.image and not instance.image._committed:
+        instance._replaced_image = Recipe.objects.filter(pk=instance.pk).values_list('image', flat=True).first()
+
+
+@receiver(post_save, sender=Recipe)
+def release_replaced_image(sender, instance, **kwargs):
+    """Release the file of a replaced recipe image after the replacement is committed."""
+    name = instance.__dict__.pop('_replaced_image', None)
+    if name and name != instance.image.name:
+        transaction.on_commit(lambda: images.release(name))
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=RecipeImageVariant)
+def release_deleted_image(sender, instance, **kwargs):
+    """Release the image file of a deleted recipe or variant after the deletion is committed."""
+    name = instance.image.name
+    if name:
+        transaction.on_commit(lambda: images.release(name))
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe(sender, instance, created, **kwargs):
+    """Update the search index of a new recipe or of one whose title changed, the only indexed field it holds."""
+    old = instance.__dict__.get('_saved_values') or {}
+    if created or ('title' in old and old['title'] != instance.title):
+        search.reindex([instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def unindex_recipe(sender, instance, **kwargs):
+    """Remove a deleted recipe from the search index."""
+    search.remove([instance.pk])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def index_recipe_relations(sender, instance, action, reverse, pk_set, **kwargs):
+    """Update the search index of the recipes whose tags or ingredients change."""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            search.reindex([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        search.reindex(pk_set)
+    elif action == 'pre_clear':
+        instance._search_recipe_ids = list(instance.recipe_set.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        search.reindex(instance.__dict__.pop('_search_recipe_ids', []))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def index_renamed_attr(sender, instance, created, **kwargs):
+    """Update the search index of the recipes showing a renamed tag or ingredient."""
+    if not created:
+        search.reindex(instance.recipe_set.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def remember_attr_recipes(sender, instance, **kwargs):
+    """Remember the recipes of a tag or ingredient being deleted, as the deletion removes the links."""
+    instance._search_recipe_ids = list(instance.recipe_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def index_deleted_attr(sender, instance, **kwargs):
+    """Update the search index of the recipes that showed a deleted tag or ingredient."""
+    search.reindex(instance.__dict__.pop('_search_recipe_ids', []))
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_recipe_values(sender, instance, update_fields=None, **kwargs):
+    """
+    Remember the title, time and price an updated recipe had, so it is only reindexed when the title changes and moved
+    between the statistics histograms when the time or price change. They are read with one query, unless the writer
+    gives the values it loaded the recipe with as `_loaded_values`.
+    """
+    fields = []
+    if update_fields is None or 'title' in update_fields:
+        fields.append('title')
+    if update_fields is None or set(stats.FIELDS) & set(update_fields):
+        fields.extend(stats.FIELDS)
+    loaded = instance.__dict__.pop('_loaded_values', None)
+    instance._saved_values = None
+    if instance.pk and fields:
+        if loaded is not None:
+            instance._saved_values = {field: loaded[field] for field in fields}
+        else:
+            instance._saved_values = Recipe.objects.filter(pk=instance.pk).values(*fields).first()
+
+
+@receiver(post_save, sender=Recipe)
+def count_recipe(sender, instance, created, **kwargs):
+    """Count a new recipe into the statistics of its user, or move an updated one to its new values."""
+    old = instance.__dict__.get('_saved_values') or {}
+    new = {field: getattr(instance, field) for field in stats.FIELDS}
+    if created:
+        stats.add_recipes(instance.user_id, added=[new])
+    elif all(field in old for field in stats.FIELDS) and \
+            any(stats.decimal_value(old[field]) != stats.decimal_value(new[field]) for field in stats.FIELDS):
+        stats.add_recipes(instance.user_id, added=[new], removed=[{field: old[field] for field in stats.FIELDS}])
+
+
+@receiver(pre_delete, sender=Recipe)
+def remember_recipe_links(sender, instance, **kwargs):
+    """Remember the tags and ingredients of a recipe being deleted, as the deletion removes the links."""
+    instance._stats_links = {
+        relation: list(getattr(instance, relation).values_list('pk', flat=True)) for relation in stats.RELATIONS
+    }
+
+
+@receiver(post_delete, sender=Recipe)
+def uncount_recipe(sender, instance, **kwargs):
+    """Count a deleted recipe and its links out of the statistics of its user."""
+    stats.add_recipes(instance.user_id, removed=[{field: getattr(instance, field) for field in stats.FIELDS}])
+    for relation, pks in instance.__dict__.pop('_stats_links', {}).items():
+        stats.add_usage(instance.user_id, relation, {pk: -1 for pk in pks})
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def count_recipe_relations(sender, instance, action, reverse, pk_set, **kwargs):
+    """Update the usage statistics of the tags or ingredients linked to or unlinked from recipes."""
+    relation = 'tags' if sender is Recipe.tags.through else 'ingredients'
+    attr_field = f'{getattr(Recipe, relation).field.m2m_reverse_field_name()}_id'
+    own_field, other_field = (attr_field, 'recipe_id') if reverse else ('recipe_id', attr_field)
+
+    if action in ('pre_remove', 'pre_clear'):
+        # Only the existing links are removed, which may be fewer than the objects given to remove().
+        links = sender.objects.filter(**{own_field: instance.pk})
+        if action == 'pre_remove':
+            links = links.filter(**{f'{other_field}__in': pk_set})
+        instance._stats_unlinked = list(links.values_list(other_field, flat=True))
+        return
+    if action == 'post_add':
+        linked, sign = pk_set, 1
+    elif action in ('post_remove', 'post_clear'):
+        linked, sign = instance.__dict__.pop('_stats_unlinked', []), -1
+    else:
+        return
+
+    deltas = {instance.pk: sign * len(linked)} if reverse else {pk: sign for pk in linked}
+    stats.add_usage(instance.user_id, relation, deltas)
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def forget_attr_usage(sender, instance, **kwargs):
+    """Drop the usage statistics of a deleted tag or ingredient."""
+    stats.remove_object('tags' if sender is Tag else 'ingredients', instance.pk)
@@ -0,0 +1,211 @@
+import math
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from django.db import connection, transaction
+from django.db.models import Count, Model, Sum
+
+from core.models import Ingredient, Recipe, RecipeStats, RecipeStatsUsage, RecipeStatsValue, Tag
+
+FIELDS = ('time_minutes', 'price')
+RELATIONS = {'tags': Tag, 'ingredients': Ingredient}
+PERCENTILES = (50, 90, 99)
+CENT = Decimal('0.01')
+
+_deferred = threading.local()
+
+
+def decimal_value(value) -> Decimal:
+    """Return a time or price value as a decimal rounded to the cent, as stored in the histograms."""
+    return Decimal(str(value)).quantize(CENT)
+
+
+def _upsert(model: Model, unique_fields: List[str], rows: List[dict], sum_fields: List[str]) -> None:
+    """
+    Insert `rows`, adding their `sum_fields` to the ones of the existing rows they conflict with on `unique_fields`.
+
+    Each batch is a single `INSERT ... ON CONFLICT DO UPDATE`, supported by SQLite 3.24+ and PostgreSQL, so a write
+    costs one query per table however many keys it touches.
+    """
+    qn = connection.ops.quote_name
+    names = list(rows[0])
+    fields = [model._meta.get_field(name) for name in names]
+    table = qn(model._meta.db_table)
+    columns = ', '.join(qn(field.column) for field in fields)
+    conflict = ', '.join(qn(model._meta.get_field(name).column) for name in unique_fields)
+    sums = ', '.join(
+        f'{column} = {table}.{column} + excluded.{column}'
+        for column in (qn(model._meta.get_field(name).column) for name in sum_fields)
+    )
+    batch_size = connection.ops.bulk_batch_size(fields, rows)
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            values = ', '.join([f'({", ".join(["%s"] * len(fields))})'] * len(batch))
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) VALUES {values} ON CONFLICT ({conflict}) DO UPDATE SET {sums}',
+                [field.get_db_prep_save(row[name], connection) for row in batch for name, field in zip(names, fields)],
+            )
+
+
+def _apply(model: Model, lookup: dict, key_fields: Tuple[str, ...], deltas: Dict[tuple, int]) -> None:
+    """
+    Add `deltas` to the counts of their keys in a count table, creating rows for new keys.
+
+    Keys are tuples of `key_fields` values. All the keys are upserted with one query, so the cost doesn't depend on the
+    number of keys. Rows left at zero are kept rather than deleted with another query, the reads skip them and
+    `rebuild()` drops them.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    rows = [{**lookup, **dict(zip(key_fields, key)), 'count': delta} for key, delta in deltas.items()]
+    _upsert(model, [*lookup, *key_fields], rows, ['count'])
+
+
+@contextmanager
+def deferred():
+    """Collect the statistics changes made within the block, for instance by signals, and apply them once at its end."""
+    if getattr(_deferred, 'changes', None) is not None:
+        yield
+        return
+
+    _deferred.changes = defaultdict(lambda: {'added': [], 'removed': [], 'usage': Counter()})
+    try:
+        yield
+        changes = _deferred.changes
+    finally:
+        _deferred.changes = None
+    for user_id, change in changes.items():
+        add_recipes(user_id, change['added'], change['removed'])
+        _apply(RecipeStatsUsage, {'user_id': user_id}, ('relation', 'object_id'), change['usage'])
+
+
+def add_recipes(user_id: int, added: List[dict] = (), removed: List[dict] = ()) -> None:
+    """Count recipes, given by their time and price values, into or out of the totals and histograms of a user."""
+    if getattr(_deferred, 'changes', None) is not None:
+        _deferred.changes[user_id]['added'].extend(added)
+        _deferred.changes[user_id]['removed'].extend(removed)
+        return
+
+    count = 0
+    totals = {field: Decimal(0) for field in FIELDS}
+    histogram = Counter()
+    for values, sign in [(v, 1) for v in added] + [(v, -1) for v in removed]:
+        count += sign
+        for field in FIELDS:
+            value = decimal_value(values[field])
+            totals[field] += sign * value
+            histogram[field, value] += sign
+
+    if count or any(totals.values()):
+        _upsert(RecipeStats, ['user_id'], [{
+            'user_id': user_id,
+            'recipe_count': count,
+            'time_minutes_total': int(totals['time_minutes']),
+            'price_total': totals['price'],
+        }], ['recipe_count', 'time_minutes_total', 'price_total'])
+    _apply(RecipeStatsValue, {'user_id': user_id}, ('field', 'value'), histogram)
+
+
+def add_usage(user_id: int, relation: str, deltas: Dict[int, int]) -> None:
+    """Add `deltas` to the number of recipes using each of the tags or ingredients of a user, by ID."""
+    deltas = {(relation, object_id): delta for object_id, delta in deltas.items()}
+    if getattr(_deferred, 'changes', None) is not None:
+        _deferred.changes[user_id]['usage'].update(deltas)
+        return
+
+    _apply(RecipeStatsUsage, {'user_id': user_id}, ('relation', 'object_id'), deltas)
+
+
+def remove_object(relation: str, object_id: int) -> None:
+    """Forget the usage of a deleted tag or ingredient."""
+    RecipeStatsUsage.objects.filter(relation=relation, object_id=object_id).delete()
+
+
+def rebuild(user_ids: Optional[List[int]] = None) -> int:
+    """
+    Recompute the statistics of the given users, or of every user, from the recipes and return the number of users.
+
+    Each table is filled by one grouped query over all the users, so a backfill doesn't run a query per user.
+    """
+    recipes = Recipe.objects.all() if user_ids is None else Recipe.objects.filter(user_id__in=user_ids)
+    with transaction.atomic():
+        for model in (RecipeStats, RecipeStatsValue, RecipeStatsUsage):
+            rows = model.objects.all() if user_ids is None else model.objects.filter(user_id__in=user_ids)
+            rows.delete()
+
+        totals = recipes.order_by().values('user_id').annotate(
+            count=Count('id'), time_minutes=Sum('time_minutes'), price=Sum('price'),
+        )
+        RecipeStats.objects.bulk_create(
+            RecipeStats(user_id=row['user_id'], recipe_count=row['count'], time_minutes_total=row['time_minutes'],
+                        price_total=row['price'])
+            for row in totals
+        )
+        for field in FIELDS:
+            histogram = recipes.order_by().values('user_id', field).annotate(count=Count('id'))
+            RecipeStatsValue.objects.bulk_create(
+                RecipeStatsValue(user_id=row['user_id'], field=field, value=row[field], count=row['count'])
+                for row in histogram
+            )
+        for relation in RELATIONS:
+            through = getattr(Recipe, relation).through
+            field = f'{getattr(Recipe, relation).field.m2m_reverse_field_name()}_id'
+            usage = through.objects.filter(recipe__in=recipes).order_by().values('recipe__user_id', field) \
+                .annotate(count=Count('recipe_id'))
+            RecipeStatsUsage.objects.bulk_create(
+                RecipeStatsUsage(user_id=row['recipe__user_id'], relation=relation, object_id=row[field],
+                                 count=row['count'])
+                for row in usage
+            )
+
+    return RecipeStats.objects.count() if user_ids is None else len(user_ids)
+
+
+def percentiles(histogram: List[tuple]) -> dict:
+    """Return the minimum, maximum and nearest rank percentiles of a histogram of (value, count) pairs by value."""
+    total = sum(count for _, count in histogram)
+    if not total:
+        return {'min': None, 'max': None, **{f'p{p}': None for p in PERCENTILES}}
+
+    result = {'min': histogram[0][0], 'max': histogram[-1][0]}
+    ranks = iter(PERCENTILES)
+    percentile = next(ranks)
+    seen = 0
+    for value, count in histogram:
+        seen += count
+        while percentile is not None and seen >= math.ceil(percentile / 100 * total):
+            result[f'p{percentile}'] = value
+            percentile = next(ranks, None)
+
+    return result
+
+
+def get_stats(user, top: int) -> dict:
+    """Return the recipe statistics of a user from the summary tables, with their `top` tags and ingredients."""
+    summary = RecipeStats.objects.filter(user=user).first() or RecipeStats(user=user)
+    stats = {'recipe_count': summary.recipe_count}
+
+    for field, total in (('time_minutes', summary.time_minutes_total), ('price', summary.price_total)):
+        histogram = list(RecipeStatsValue.objects.filter(user=user, field=field, count__gt=0).order_by('value')
+                         .values_list('value', 'count'))
+        if field == 'time_minutes':
+            histogram = [(int(value), count) for value, count in histogram]
+        average = decimal_value(Decimal(total) / summary.recipe_count) if summary.recipe_count else None
+        stats[field] = {'average': average, **percentiles(histogram)}
+
+    for relation, model in RELATIONS.items():
+        usage = list(RecipeStatsUsage.objects.filter(user=user, relation=relation, count__gt=0)
+                     .order_by('-count', 'object_id').values_list('object_id', 'count')[:top])
+        names = model.objects.only('name').in_bulk([object_id for object_id, _ in usage])
+        stats[f'top_{relation}'] = [
+            {'id': object_id, 'name': names[object_id].name, 'recipe_count': count}
+            for object_id, count in usage if object_id in names
+        ]
+
+    return stats
@@ -0,0 +1,110 @@
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Type
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Model
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions, status
+
+from core.models import Recipe, Tombstone
+
+TOKEN_SALT = 'recipe.sync'
+
+_deferred = threading.local()
+
+
+class SyncTokenExpired(exceptions.APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = _('Sync token expired, a full sync is required.')
+    default_code = 'sync_token_expired'
+
+
+def make_token() -> str:
+    """
+    Return a token for the changes made from now on.
+
+    The token is backdated by `SYNC_TOKEN_OVERLAP` seconds so rows written by transactions still running now are
+    returned again on the next sync rather than missed. Clients apply changes as upserts, so repeats are harmless.
+    """
+    since = timezone.now() - timedelta(seconds=settings.SYNC_TOKEN_OVERLAP)
+    return signing.dumps(since.isoformat(), salt=TOKEN_SALT)
+
+
+def parse_token(token: str) -> Optional[datetime]:
+    """Return the time encoded in a sync token, or None for an empty token which asks for everything."""
+    if not token:
+        return None
+
+    try:
+        since = parse_datetime(signing.loads(token, salt=TOKEN_SALT))
+    except (signing.BadSignature, TypeError, ValueError):
+        raise exceptions.ValidationError({'since': [_('Invalid sync token.')]})
+
+    if since < timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS):
+        raise SyncTokenExpired()
+
+    return since
+
+
+def record_deletion(instance: Model) -> None:
+    """Record the deletion of a user owned object for the clients syncing later."""
+    Tombstone.objects.create(user_id=instance.user_id, model=instance._meta.model_name, object_id=instance.pk)
+
+
+def deleted_ids(model: Type[Model], user, since: Optional[datetime]) -> List[int]:
+    """Return the IDs of the `model` objects of the user deleted since the given time."""
+    if since is None:
+        return []
+
+    return list(Tombstone.objects.filter(
+        user_id=user.pk, model=model._meta.model_name, deleted__gte=since
+    ).values_list('object_id', flat=True))
+
+
+def prune_tombstones() -> int:
+    """Delete the tombstones older than the retention period and return how many were deleted."""
+    cutoff = timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+    return Tombstone.objects.filter(deleted__lt=cutoff).delete()[0]
+
+
+@contextmanager
+def deferred():
+    """
+    Collect the recipes touched within the block, for instance by signals, and touch them once at its end.
+
+    Recipes saved within the block already got a new timestamp from the save, so they are left alone. The block must
+    run in a transaction, else the changes made after the save could be read with the timestamp of the save.
+    """
+    if getattr(_deferred, 'touched', None) is not None:
+        yield
+        return
+
+    _deferred.touched, _deferred.saved = set(), set()
+    try:
+        yield
+        recipe_ids = _deferred.touched - _deferred.saved
+    finally:
+        _deferred.touched = _deferred.saved = None
+    touch(recipe_ids)
+
+
+def touch(recipe_ids: Iterable[int]) -> None:
+    """Bump the modified timestamp of recipes whose related objects changed, so the ETags and delta syncs see it."""
+    if getattr(_deferred, 'touched', None) is not None:
+        _deferred.touched.update(recipe_ids)
+        return
+
+    recipe_ids = list(recipe_ids)
+    if recipe_ids:
+        Recipe.objects.filter(pk__in=recipe_ids).update(modified=timezone.now())
+
+
+def record_save(recipe_id: int) -> None:
+    """Record that a recipe was saved within a deferred block, which bumped its modified timestamp."""
+    if getattr(_deferred, 'saved', None) is not None:
+        _deferred.saved.add(recipe_id)
@@ -0,0 +1,87 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from core.models import Recipe, IMAGE_PENDING, IMAGE_READY
+
+
+class CommandsTestCase(TestCase):
+
+    def test_benchmark_api(self):
+        """The benchmark prints the timing and plan of each scenario and rolls back its data."""
+        out = StringIO()
+        call_command('benchmark_api', recipes=20, tags=3, ingredients=5, repeat=1, scenarios=['tags_assigned_only'],
+                     stdout=out)
+
+        self.assertIn('tags_assigned_only: 3 rows', out.getvalue())
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_explain_queries_compare(self):
+        """The query plans are saved and compared with an earlier report."""
+        get_user_model().objects.create_user(email='user@example.com', password='password')
+        with tempfile.TemporaryDirectory() as tmp:
+            report = os.path.join(tmp, 'before.json')
+            with open(report, 'w') as f:
+                json.dump({'tags': 'old plan'}, f)
+
+            out = StringIO()
+            call_command('explain_queries', scenarios=['tags', 'recipes'], compare=report,
+                         output=os.path.join(tmp, 'after.json'), stdout=out)
+            with open(os.path.join(tmp, 'after.json')) as f:
+                after = json.load(f)
+
+        self.assertIn('-- before (changed):\nold plan', out.getvalue())
+        self.assertEqual(set(after), {'tags', 'recipes'})
+
+    def test_sweep_images(self):
+        """Image files no recipe references are listed on a dry run and deleted otherwise."""
+        user = get_user_model().objects.create_user(email='user@example.com', password='password')
+        with tempfile.TemporaryDirectory() as tmp, override_settings(MEDIA_ROOT=tmp):
+            recipe = Recipe.objects.create(user=user, title='Pancakes', time_minutes=5, price=5)
+            recipe.image.save('used.jpg', ContentFile(b'used'))
+            storage = recipe.image.storage
+            orphan = storage.save('uploads/recipe/variants/orphan.jpg', ContentFile(b'orphan'))
+
+            out = StringIO()
+            call_command('sweep_images', dry_run=True, grace=0, stdout=out)
+            self.assertIn(orphan, out.getvalue())
+            self.assertTrue(storage.exists(orphan))
+
+            call_command('sweep_images', grace=0, stdout=StringIO())
+            self.assertFalse(storage.exists(orphan))
+            self.assertTrue(storage.exists(recipe.image.name))
+
+            call_command('sweep_images', stdout=StringIO())
+
+    def test_retry_images(self):
+        """Images left pending past the timeout, as their process exited, are processed again."""
+        user = get_user_model().objects.create_user(email='user@example.com', password='password')
+        buffer = BytesIO()
+        Image.new('RGB', (20, 20)).save(buffer, format='JPEG')
+        with tempfile.TemporaryDirectory() as tmp, override_settings(MEDIA_ROOT=tmp):
+            stalled, recent = [Recipe.objects.create(user=user, title=title, time_minutes=5, price=5)
+                               for title in ('Stalled', 'Recent')]
+            for recipe in (stalled, recent):
+                recipe.image.save('image.jpg', ContentFile(buffer.getvalue()))
+            Recipe.objects.update(image_status=IMAGE_PENDING)
+            Recipe.objects.filter(pk=stalled.pk).update(modified=timezone.now() - timedelta(hours=1))
+
+            out = StringIO()
+            call_command('retry_images', dry_run=True, stdout=out)
+            self.assertIn('Found 1 stalled recipe images.', out.getvalue())
+            self.assertEqual(Recipe.objects.get(pk=stalled.pk).image_status, IMAGE_PENDING)
+
+            call_command('retry_images', stdout=StringIO())
+            stalled.refresh_from_db()
+            self.assertEqual(stalled.image_status, IMAGE_READY)
+            self.assertEqual(stalled.image_variants.count(), 3)
+            self.assertEqual(Recipe.objects.get(pk=recent.pk).image_status, IMAGE_PENDING)
@@ -41,7 +41,7 @@ class PrivateIngredientsApiTestCase(TestCase):
         response = self.client.get(INGREDIENTS_URL)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data['results'], serializer.data)
 
     def test_ingredients_limited_to_user(self):
         """Test that only ingredients for the authenticated user are returned."""
@@ -52,8 +52,8 @@ class PrivateIngredientsApiTestCase(TestCase):
         response = self.client.get(INGREDIENTS_URL)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['name'], ingredient.name)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['name'], ingredient.name)
 
     def test_create_ingredient_successful(self):
         """Test create a new ingredient is successful."""
@@ -84,8 +84,8 @@ class PrivateIngredientsApiTestCase(TestCase):
 
         response = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
 
-        self.assertIn(serializer1.data, response.data)
-        self.assertNotIn(serializer2.data, response.data)
+        self.assertIn(serializer1.data, response.data['results'])
+        self.assertNotIn(serializer2.data, response.data['results'])
 
     def test_retrieve_ingredients_assigned_unique(self):
         """Filtering ingredients by assigned returns unique items."""
@@ -98,4 +98,33 @@ class PrivateIngredientsApiTestCase(TestCase):
 
         response = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
 
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_retrieve_ingredients_usage_count(self):
+        """The number of recipes using each ingredient is returned when requested."""
+        used = Ingredient.objects.create(user=self.user, name='Used')
+        Ingredient.objects.create(user=self.user, name='Unused')
+        for title in ('First', 'Second'):
+            recipe = Recipe.objects.create(title=title, time_minutes=5, price=3.00, user=self.user)
+            recipe.ingredients.add(used)
+
+        response = self.client.get(INGREDIENTS_URL, {'usage_count': 1})
+        counts = {item['name']: item['usage_count'] for item in response.data['results']}
+
+        self.assertEqual(counts, {'Used': 2, 'Unused': 0})
+        self.assertNotIn('usage_count', self.client.get(INGREDIENTS_URL).data['results'][0])
+
+    def test_retrieve_ingredients_invalid_flags(self):
+        """Flags that are not booleans return 400."""
+        for params in ({'usage_count': 'yes please'}, {'assigned_only': 'x'}):
+            response = self.client.get(INGREDIENTS_URL, params)
+
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+    def test_create_duplicate_ingredient_invalid(self):
+        """Test that a user cannot create two ingredients with the same name."""
+        Ingredient.objects.create(user=self.user, name='Salt')
+
+        response = self.client.post(INGREDIENTS_URL, {'name': 'Salt'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,93 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag, Ingredient, Recipe
+from recipe import cache
+
+TAGS_URL = reverse('recipe:tag-list')
+INGREDIENTS_URL = reverse('recipe:ingredient-list')
+
+
+class RecipeAttrCacheTestCase(TestCase):
+    """Test the cache of the tag and ingredient lists."""
+
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+
+    def test_list_served_from_cache(self):
+        """The second identical request is served from the cache without querying the database."""
+        first = self.client.get(TAGS_URL)
+        with self.assertNumQueries(0):
+            second = self.client.get(TAGS_URL)
+
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(first.data, second.data)
+
+    def test_cache_keyed_by_query_params(self):
+        """Responses with different query parameters are cached separately."""
+        self.client.get(TAGS_URL)
+
+        response = self.client.get(TAGS_URL, {'assigned_only': 1})
+
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'], [])
+
+    def test_cache_keyed_by_user(self):
+        """Users never get each other's cached responses."""
+        self.client.get(TAGS_URL)
+        other_user = get_user_model().objects.create_user(email='other@example.com', password='password')
+        self.client.force_authenticate(other_user)
+
+        response = self.client.get(TAGS_URL)
+
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'], [])
+
+    def test_cache_invalidated_on_write(self):
+        """Creating, updating and deleting tags invalidates the cached lists."""
+        self.client.get(TAGS_URL)
+
+        self.client.post(TAGS_URL, {'name': 'Dessert'})
+        created = self.client.get(TAGS_URL)
+        self.tag.name = 'Vegetarian'
+        self.tag.save()
+        updated = self.client.get(TAGS_URL)
+        self.tag.delete()
+        deleted = self.client.get(TAGS_URL)
+
+        self.assertEqual([t['name'] for t in created.data['results']], ['Vegan', 'Dessert'])
+        self.assertEqual([t['name'] for t in updated.data['results']], ['Vegetarian', 'Dessert'])
+        self.assertEqual([t['name'] for t in deleted.data['results']], ['Dessert'])
+
+    def test_assigned_only_invalidated_on_recipe_change(self):
+        """Assigning an ingredient to a recipe or deleting the recipe invalidates the assigned only list."""
+        ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+        self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
+
+        recipe = Recipe.objects.create(user=self.user, title='Chips', time_minutes=5, price=2.00)
+        recipe.ingredients.add(ingredient)
+        assigned = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
+        recipe.delete()
+        unassigned = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
+
+        self.assertEqual([i['name'] for i in assigned.data['results']], ['Salt'])
+        self.assertEqual(unassigned.data['results'], [])
+
+    def test_stats_counted(self):
+        """Hits and misses are counted."""
+        before = cache.stats()
+
+        self.client.get(TAGS_URL)
+        self.client.get(TAGS_URL)
+        after = cache.stats()
+
+        self.assertEqual(after['misses'] - before['misses'], 1)
+        self.assertEqual(after['hits'] - before['hits'], 1)
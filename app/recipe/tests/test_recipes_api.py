@@ -1,17 +1,27 @@
+import json
 import os
 import tempfile
+from unittest.mock import patch
 
 from PIL import Image
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.db import connection
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
 
 from core.models import Recipe, Tag, Ingredient
+from recipe import images
+from recipe.pagination import RecipeCursorPagination
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
 
 RECIPES_URL = reverse('recipe:recipe-list')
+EXPORT_URL = reverse('recipe:recipe-export')
+BULK_URL = reverse('recipe:recipe-bulk')
+COOKABLE_URL = reverse('recipe:recipe-cookable')
 
 
 def image_upload_url(recipe_id) -> str:
@@ -75,7 +85,7 @@ class PrivateRecipeApiTestCase(TestCase):
         serializer = RecipeSerializer(recipes, many=True)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data['results'], serializer.data)
 
     def test_recipes_limited_user(self):
         """Test retrieve recipes of the authenticated user."""
@@ -88,8 +98,8 @@ class PrivateRecipeApiTestCase(TestCase):
         serializer = RecipeSerializer(recipes, many=True)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'], serializer.data)
 
     def test_retrieve_recipe_detail(self):
         """Test retrieve a recipe detail."""
@@ -160,6 +170,53 @@ class PrivateRecipeApiTestCase(TestCase):
         self.assertIn(ingredient1, ingredients)
         self.assertIn(ingredient2, ingredients)
 
+    def test_create_recipe_with_other_users_tag(self):
+        """Tags and ingredients of other users cannot be assigned."""
+        other_user = get_user_model().objects.create_user(email='other@example.com', password='password')
+        own_tag = sample_tag(user=self.user)
+        other_tag = sample_tag(user=other_user)
+        other_ingredient = sample_ingredient(user=other_user)
+        payload = {
+            'title': 'Borrowed curry',
+            'tags': [own_tag.id, other_tag.id],
+            'ingredients': [other_ingredient.id],
+            'time_minutes': 20,
+            'price': 7.00,
+        }
+
+        response = self.client.post(RECIPES_URL, payload)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['tags'], [f'Invalid pk "{other_tag.id}" - object does not exist.'])
+        self.assertEqual(len(response.data['ingredients']), 1)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_create_recipe_with_invalid_ingredient_id(self):
+        """Non numeric IDs are rejected."""
+        payload = {'title': 'Soup', 'ingredients': ['abc'], 'time_minutes': 20, 'price': 7.00}
+
+        response = self.client.post(RECIPES_URL, payload)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('ingredients', response.data)
+
+    def test_create_recipe_related_queries_constant(self):
+        """All submitted ingredients are resolved with a single query."""
+        ingredients = [sample_ingredient(user=self.user, name=f'Ingredient {i}') for i in range(50)]
+        payload = {
+            'title': 'Everything stew',
+            'ingredients': [ingredient.id for ingredient in ingredients],
+            'time_minutes': 90,
+            'price': 20.00,
+        }
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(RECIPES_URL, payload)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        lookups = [q for q in queries.captured_queries if '"core_ingredient"."user_id" =' in q['sql']]
+        self.assertEqual(len(lookups), 1)
+
     def test_partial_update_recipe(self):
         """Test updating a recipe with 'patch' method."""
         recipe = sample_recipe(user=self.user)
@@ -218,9 +275,9 @@ class PrivateRecipeApiTestCase(TestCase):
 
         response = self.client.get(RECIPES_URL, {'tags': f'{tag1.id},{tag2.id}'})
 
-        self.assertIn(serializer1.data, response.data)
-        self.assertIn(serializer2.data, response.data)
-        self.assertNotIn(serializer3.data, response.data)
+        self.assertIn(serializer1.data, response.data['results'])
+        self.assertIn(serializer2.data, response.data['results'])
+        self.assertNotIn(serializer3.data, response.data['results'])
 
     def test_filter_recipes_by_ingredients(self):
         """Return recipes with specific ingredients."""
@@ -237,9 +294,186 @@ class PrivateRecipeApiTestCase(TestCase):
 
         response = self.client.get(RECIPES_URL, {'ingredients': f'{ingredient1.id},{ingredient2.id}'})
 
-        self.assertIn(serializer1.data, response.data)
-        self.assertIn(serializer2.data, response.data)
-        self.assertNotIn(serializer3.data, response.data)
+        self.assertIn(serializer1.data, response.data['results'])
+        self.assertIn(serializer2.data, response.data['results'])
+        self.assertNotIn(serializer3.data, response.data['results'])
+
+    def test_filter_recipes_by_tags_no_duplicates(self):
+        """A recipe with several of the requested tags is returned once."""
+        recipe = sample_recipe(user=self.user)
+        tag1 = sample_tag(user=self.user, name='Vegan')
+        tag2 = sample_tag(user=self.user, name='Vegetarian')
+        recipe.tags.add(tag1, tag2)
+
+        response = self.client.get(RECIPES_URL, {'tags': f'{tag1.id},{tag2.id}'})
+
+        self.assertEqual([r['id'] for r in response.data['results']], [recipe.id])
+
+    def test_filter_recipes_by_all_tags_and_ingredients(self):
+        """Return recipes with all of the requested tags and ingredients."""
+        vegan = sample_tag(user=self.user, name='Vegan')
+        quick = sample_tag(user=self.user, name='Quick')
+        tofu = sample_ingredient(user=self.user, name='Tofu')
+        recipe1 = sample_recipe(user=self.user, title='Tofu stir fry')
+        recipe1.tags.add(vegan, quick)
+        recipe1.ingredients.add(tofu)
+        recipe2 = sample_recipe(user=self.user, title='Lentil stew')
+        recipe2.tags.add(vegan)
+        recipe2.ingredients.add(tofu)
+
+        by_tags = self.client.get(RECIPES_URL, {'tags_all': f'{vegan.id},{quick.id}'})
+        by_both = self.client.get(RECIPES_URL, {'tags_all': f'{vegan.id}', 'ingredients_all': f'{tofu.id}'})
+
+        self.assertEqual([r['id'] for r in by_tags.data['results']], [recipe1.id])
+        self.assertEqual([r['id'] for r in by_both.data['results']], [recipe1.id, recipe2.id])
+
+    def test_filter_recipes_by_ranges_and_ordering(self):
+        """Return recipes within the time and price ranges, in the requested order."""
+        quick = sample_recipe(user=self.user, title='Quick', time_minutes=5, price=2.50)
+        medium = sample_recipe(user=self.user, title='Medium', time_minutes=20, price=8.00)
+        sample_recipe(user=self.user, title='Slow', time_minutes=90, price=4.00)
+
+        response = self.client.get(RECIPES_URL, {'time_minutes_max': 30, 'price_min': '2.00', 'ordering': '-price'})
+
+        self.assertEqual([r['id'] for r in response.data['results']], [medium.id, quick.id])
+
+    def test_ordering_paginated(self):
+        """Pages follow the requested ordering."""
+        for minutes in (30, 10, 20, 10):
+            sample_recipe(user=self.user, title=f'{minutes} minutes', time_minutes=minutes)
+
+        response = self.client.get(RECIPES_URL, {'ordering': 'time_minutes', 'page_size': 3})
+        minutes = [r['time_minutes'] for r in response.data['results']]
+        minutes += [r['time_minutes'] for r in self.client.get(response.data['next']).data['results']]
+
+        self.assertEqual(minutes, [10, 10, 20, 30])
+
+    def test_ordering_paginated_through_duplicates(self):
+        """Pages of an ordering with duplicate values are positioned on the value and the ID, without offsets."""
+        recipes = [sample_recipe(user=self.user, title=f'Recipe {i}', price=price)
+                   for i, price in enumerate((5, 5, 5, 2, 5))]
+
+        seen = []
+        url = RECIPES_URL + '?ordering=-price&page_size=2'
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            seen.extend(r['id'] for r in response.data['results'])
+            url = response.data['next']
+            self.assertFalse(any('OFFSET' in query['sql'] for query in queries.captured_queries))
+        previous = self.client.get(response.data['previous'])
+
+        self.assertEqual(seen, [recipes[i].id for i in (4, 2, 1, 0, 3)])
+        self.assertEqual([r['id'] for r in previous.data['results']], seen[2:4])
+
+    def test_invalid_cursor(self):
+        """A cursor that doesn't match the ordering returns 404."""
+        sample_recipe(user=self.user)
+        sample_recipe(user=self.user)
+        next_url = self.client.get(RECIPES_URL, {'page_size': 1, 'ordering': 'title'}).data['next']
+
+        for replaced in ('ordering=price', 'ordering=id'):
+            response = self.client.get(next_url.replace('ordering=title', replaced))
+
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, replaced)
+
+    def test_filter_invalid_params(self):
+        """Invalid filter parameters return 400."""
+        for params in ({'tags': 'a,b'}, {'ingredients_all': '1,,2'}, {'time_minutes_min': 'soon'},
+                       {'price_min': '5', 'price_max': '1'}, {'ordering': 'user'}):
+            response = self.client.get(RECIPES_URL, params)
+
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+    def test_filter_empty_params(self):
+        """Empty ID list parameters, as sent by forms with nothing selected, are ignored."""
+        recipe = sample_recipe(user=self.user)
+
+        response = self.client.get(RECIPES_URL, {'tags': '', 'ingredients': '', 'tags_all': ''})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['id'] for r in response.data['results']], [recipe.id])
+
+    def test_recipes_paginated(self):
+        """Recipes are returned in pages that can be followed with the cursor links."""
+        recipes = [sample_recipe(user=self.user, title=f'Recipe {i}') for i in range(5)]
+
+        response = self.client.get(RECIPES_URL, {'page_size': 2})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data['previous'])
+        self.assertEqual([r['id'] for r in response.data['results']], [r.id for r in recipes[:2]])
+
+        seen = []
+        url = RECIPES_URL + '?page_size=2'
+        while url:
+            response = self.client.get(url)
+            seen.extend(r['id'] for r in response.data['results'])
+            url = response.data['next']
+
+        self.assertEqual(seen, [r.id for r in recipes])
+
+    def test_recipes_page_size_capped(self):
+        """The requested page size cannot exceed the configured maximum."""
+        sample_recipe(user=self.user)
+        sample_recipe(user=self.user)
+
+        with patch.object(RecipeCursorPagination, 'max_page_size', 1):
+            response = self.client.get(RECIPES_URL, {'page_size': 100})
+
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNotNone(response.data['next'])
+
+
+class RecipeCookableApiTestCase(TestCase):
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='password')
+        self.client.force_authenticate(self.user)
+        self.eggs = sample_ingredient(user=self.user, name='Eggs')
+        self.flour = sample_ingredient(user=self.user, name='Flour')
+        self.milk = sample_ingredient(user=self.user, name='Milk')
+        self.cheese = sample_ingredient(user=self.user, name='Cheese')
+        self.pancakes = sample_recipe(user=self.user, title='Pancakes')
+        self.pancakes.ingredients.add(self.eggs, self.flour, self.milk)
+        self.omelette = sample_recipe(user=self.user, title='Omelette')
+        self.omelette.ingredients.add(self.eggs, self.cheese)
+        self.boiled_eggs = sample_recipe(user=self.user, title='Boiled eggs')
+        self.boiled_eggs.ingredients.add(self.eggs)
+        sample_recipe(user=self.user, title='Cheese toast').ingredients.add(self.cheese)
+
+    def test_cookable_ranked_by_missing_ingredients(self):
+        """Recipes are ranked by missing ingredients and list them, those using none on hand are left out."""
+        response = self.client.get(COOKABLE_URL, {'ingredients': f'{self.eggs.id},{self.flour.id}'})
+        results = response.data['results']
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['id'] for r in results], [self.boiled_eggs.id, self.pancakes.id, self.omelette.id])
+        self.assertEqual((results[1]['ingredient_count'], results[1]['covered_count'], results[1]['missing_count']),
+                         (3, 2, 1))
+        self.assertEqual(results[1]['missing_ingredients'], [{'id': self.milk.id, 'name': 'Milk'}])
+        self.assertEqual(results[0]['missing_ingredients'], [])
+
+    def test_cookable_max_missing(self):
+        """Recipes missing more ingredients than allowed are left out."""
+        response = self.client.get(COOKABLE_URL, {'ingredients': f'{self.eggs.id}', 'max_missing': 1})
+
+        self.assertEqual([r['id'] for r in response.data['results']], [self.boiled_eggs.id, self.omelette.id])
+
+    def test_cookable_queries_constant(self):
+        """The ranking, its relations and the missing ingredients take a fixed number of queries."""
+        for i in range(5):
+            sample_recipe(user=self.user, title=f'Egg dish {i}').ingredients.add(self.eggs, self.milk)
+
+        with self.assertNumQueries(4):
+            self.client.get(COOKABLE_URL, {'ingredients': f'{self.eggs.id}'})
+
+    def test_cookable_invalid_params(self):
+        """Missing or invalid ingredients return 400."""
+        self.assertEqual(self.client.get(COOKABLE_URL).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(COOKABLE_URL, {'ingredients': 'eggs'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
 
 
 class RecipeImageUploadTestCase(TestCase):
@@ -265,8 +499,9 @@ class RecipeImageUploadTestCase(TestCase):
 
         self.recipe.refresh_from_db()
 
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
         self.assertIn('image', response.data)
+        self.assertEqual(response.data['image_status'], 'pending')
         self.assertTrue(os.path.exists(self.recipe.image.path))
 
     def test_upload_invalid_image_to_recipe(self):
@@ -275,3 +510,449 @@ class RecipeImageUploadTestCase(TestCase):
         response = self.client.post(url, {'image': 'not image'}, format='multipart')
 
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(RECIPE_IMAGE_MAX_UPLOAD_SIZE=1000)
+    def test_upload_image_too_large(self):
+        """Upload an image over the size limit is refused."""
+        url = image_upload_url(self.recipe.id)
+        image = ContentFile(os.urandom(2000), name='large.jpg')
+
+        response = self.client.post(url, {'image': image}, format='multipart')
+
+        self.recipe.refresh_from_db()
+
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertFalse(self.recipe.image)
+
+    @override_settings(RECIPE_IMAGE_MAX_PIXELS=100 * 100)
+    def test_upload_image_too_many_pixels(self):
+        """Upload an image over the pixel limit is refused from its header."""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.png') as ntf:
+            Image.new('RGB', (200, 100)).save(ntf, format='PNG')
+            ntf.seek(0)
+
+            with patch('PIL.ImageFile.ImageFile.load') as load:
+                response = self.client.post(url, {'image': ntf}, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', response.data)
+        load.assert_not_called()
+
+    def test_upload_unsupported_image_format(self):
+        """Upload an image in a format outside RECIPE_IMAGE_FORMATS is refused."""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.bmp') as ntf:
+            Image.new('RGB', (10, 10)).save(ntf, format='BMP')
+            ntf.seek(0)
+
+            response = self.client.post(url, {'image': ntf}, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RecipeExportTestCase(TestCase):
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='password')
+        self.client.force_authenticate(self.user)
+
+    def export(self) -> list:
+        """Request the export and return the decoded records."""
+        response = self.client.get(EXPORT_URL)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+
+        content = b''.join(response.streaming_content).decode()
+        return [json.loads(line) for line in content.splitlines()]
+
+    def test_export_recipes(self):
+        """All recipes of the user are exported with their tags and ingredients."""
+        recipe = sample_recipe(user=self.user, title='Thai curry', price=7.50)
+        tag = sample_tag(user=self.user, name='Spicy')
+        ingredient = sample_ingredient(user=self.user, name='Lemongrass')
+        recipe.tags.add(tag)
+        recipe.ingredients.add(ingredient)
+        sample_recipe(user=self.user, title='Toast')
+        other_user = get_user_model().objects.create_user(email='other@example.com', password='password')
+        sample_recipe(user=other_user, title='Not mine')
+
+        records = self.export()
+
+        self.assertEqual([r['title'] for r in records], ['Thai curry', 'Toast'])
+        self.assertEqual(records[0]['price'], '7.50')
+        self.assertEqual(records[0]['tags'], [{'id': tag.id, 'name': tag.name}])
+        self.assertEqual(records[0]['ingredients'], [{'id': ingredient.id, 'name': ingredient.name}])
+        self.assertEqual(records[1]['tags'], [])
+        self.assertIsNone(records[1]['image'])
+
+    @override_settings(RECIPE_IMAGE_PROCESSING='sync')
+    def test_export_image_url(self):
+        """The image URL is the one the API returns for the recipe."""
+        recipe = sample_recipe(user=self.user)
+        with tempfile.TemporaryDirectory() as media_root, self.settings(MEDIA_ROOT=media_root), \
+                tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            Image.new('RGB', (10, 10)).save(ntf, format='JPEG')
+            ntf.seek(0)
+            uploaded = self.client.post(image_upload_url(recipe.id), {'image': ntf}, format='multipart')
+
+            records = self.export()
+
+        self.assertEqual(uploaded.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(records[0]['image'], uploaded.data['image'])
+
+    def test_export_queries_per_batch(self):
+        """Related objects are fetched once per batch rather than once per recipe."""
+        tag = sample_tag(user=self.user)
+        for i in range(5):
+            sample_recipe(user=self.user, title=f'Recipe {i}').tags.add(tag)
+
+        with patch('recipe.export.EXPORT_BATCH_SIZE', 2), self.assertNumQueries(7):
+            records = self.export()
+
+        self.assertEqual(len(records), 5)
+
+
+class RecipeBulkApiTestCase(TestCase):
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='password')
+        self.client.force_authenticate(self.user)
+        self.tag = sample_tag(user=self.user, name='Vegan')
+        self.ingredient = sample_ingredient(user=self.user, name='Tofu')
+
+    def payload(self, count: int) -> list:
+        """Return a bulk payload of `count` new recipes."""
+        return [
+            {
+                'title': f'Recipe {i}',
+                'time_minutes': 10,
+                'price': '5.00',
+                'tags': [self.tag.id],
+                'ingredients': [self.ingredient.id],
+            }
+            for i in range(count)
+        ]
+
+    def test_bulk_create_recipes(self):
+        """Many recipes are created with their tags and ingredients."""
+        response = self.client.post(BULK_URL, self.payload(3), format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([r['title'] for r in response.data], ['Recipe 0', 'Recipe 1', 'Recipe 2'])
+        recipes = Recipe.objects.filter(user=self.user)
+        self.assertEqual(recipes.count(), 3)
+        for recipe in recipes:
+            self.assertEqual(list(recipe.tags.all()), [self.tag])
+            self.assertEqual(list(recipe.ingredients.all()), [self.ingredient])
+
+    def test_bulk_update_recipes(self):
+        """Items with an ID update the matching recipe, replacing the relations they give."""
+        recipe = sample_recipe(user=self.user)
+        recipe.tags.add(self.tag)
+        payload = [{'id': recipe.id, 'title': 'Updated', 'time_minutes': 20, 'price': '2.00', 'tags': []}]
+        payload += self.payload(1)
+
+        response = self.client.post(BULK_URL, payload, format='json')
+        recipe.refresh_from_db()
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data[0]['id'], recipe.id)
+        self.assertEqual(recipe.title, 'Updated')
+        self.assertEqual(recipe.time_minutes, 20)
+        self.assertEqual(recipe.tags.count(), 0)
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 2)
+
+    def test_bulk_update_partial(self):
+        """Fields and relations left out of an update item are kept."""
+        recipe = sample_recipe(user=self.user, time_minutes=15)
+        recipe.tags.add(self.tag)
+        recipe.ingredients.add(self.ingredient)
+
+        response = self.client.post(BULK_URL, [{'id': recipe.id, 'title': 'Renamed'}], format='json')
+        recipe.refresh_from_db()
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(recipe.title, 'Renamed')
+        self.assertEqual(recipe.time_minutes, 15)
+        self.assertEqual(list(recipe.tags.all()), [self.tag])
+        self.assertEqual(list(recipe.ingredients.all()), [self.ingredient])
+        self.assertEqual(response.data[0]['tags'], [self.tag.id])
+
+    def test_bulk_errors_reported_per_item(self):
+        """Invalid items are reported at their position and nothing is written."""
+        other_user = get_user_model().objects.create_user(email='other@example.com', password='password')
+        other_tag = sample_tag(user=other_user)
+        other_recipe = sample_recipe(user=other_user)
+        payload = self.payload(4)
+        payload[1]['tags'] = [self.tag.id, other_tag.id]
+        payload[2]['title'] = ''
+        payload[3]['id'] = other_recipe.id
+
+        response = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('tags', response.data[1])
+        self.assertIn('title', response.data[2])
+        self.assertEqual(response.data[3]['id'][0].code, 'does_not_exist')
+        self.assertEqual(response.data[1]['tags'][0].code, 'does_not_exist')
+        self.assertFalse(Recipe.objects.filter(user=self.user).exists())
+
+    def test_bulk_max_items(self):
+        """Requests with more items than allowed are rejected."""
+        with self.settings(RECIPE_BULK_MAX_ITEMS=2):
+            response = self.client.post(BULK_URL, self.payload(3), format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_bulk_validation_queries_constant(self):
+        """References are validated and the recipes indexed with the same queries whatever the number of items."""
+        for count in (1, 10):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(BULK_URL, self.payload(count), format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            selects = [q for q in queries.captured_queries if q['sql'].startswith('SELECT')]
+            self.assertEqual(len(selects), 7)
+
+
+class RecipeConditionalGetTestCase(TestCase):
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='password')
+        self.client.force_authenticate(self.user)
+        self.recipe = sample_recipe(user=self.user)
+
+    def test_list_not_modified(self):
+        """A list request with the current ETag gets a 304 without loading the recipes."""
+        response = self.client.get(RECIPES_URL)
+
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=response['ETag'])
+
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(not_modified['ETag'], response['ETag'])
+
+    def test_detail_not_modified(self):
+        """A detail request with the current ETag gets a 304."""
+        url = detail_url(self.recipe.id)
+        response = self.client.get(url)
+
+        not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_etag_changes_on_write(self):
+        """Updating, creating or deleting recipes changes the list ETag, which only depends on the current rows."""
+        etags = [self.client.get(RECIPES_URL)['ETag']]
+
+        self.client.patch(detail_url(self.recipe.id), {'title': 'Updated'})
+        etags.append(self.client.get(RECIPES_URL)['ETag'])
+        other = sample_recipe(user=self.user)
+        etags.append(self.client.get(RECIPES_URL)['ETag'])
+        other.delete()
+        etags.append(self.client.get(RECIPES_URL)['ETag'])
+
+        self.assertEqual(len(set(etags[:3])), 3)
+        self.assertNotEqual(etags[3], etags[2])
+        self.assertEqual(etags[3], etags[1])
+
+    def test_etag_changes_on_relation_change(self):
+        """Changing the tags of a recipe or renaming one of its tags changes the detail ETag."""
+        url = detail_url(self.recipe.id)
+        tag = sample_tag(user=self.user)
+        etags = [self.client.get(url)['ETag']]
+
+        self.recipe.tags.add(tag)
+        etags.append(self.client.get(url)['ETag'])
+        tag.name = 'Renamed'
+        tag.save()
+        etags.append(self.client.get(url)['ETag'])
+        tag.delete()
+        etags.append(self.client.get(url)['ETag'])
+
+        self.assertEqual(len(set(etags)), 4)
+
+    def test_write_touches_recipe_once(self):
+        """Writing a recipe with its relations relies on the save for the new timestamp instead of touching it."""
+        tag = sample_tag(user=self.user)
+        ingredient = sample_ingredient(user=self.user)
+        url = detail_url(self.recipe.id)
+        etag = self.client.get(url)['ETag']
+        payload = {'title': 'Curry', 'tags': [tag.id], 'ingredients': [ingredient.id], 'time_minutes': 5, 'price': 2}
+
+        for method, write_url in (('post', RECIPES_URL), ('put', url)):
+            with CaptureQueriesContext(connection) as queries:
+                response = getattr(self.client, method)(write_url, payload)
+
+            self.assertLess(response.status_code, 300)
+            touch = 'UPDATE "core_recipe" SET "modified"'
+            self.assertFalse(any(q['sql'].startswith(touch) for q in queries.captured_queries), method)
+        self.assertNotEqual(self.client.get(url)['ETag'], etag)
+
+    def test_etag_depends_on_query(self):
+        """Different pages and filters get different ETags."""
+        first = self.client.get(RECIPES_URL)
+
+        response = self.client.get(RECIPES_URL, {'page_size': 1}, HTTP_IF_NONE_MATCH=first['ETag'])
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+
+@override_settings(RECIPE_IMAGE_PROCESSING='sync')
+class RecipeImageProcessingTestCase(TestCase):
+
+    def setUp(self) -> None:
+        self.media_root = tempfile.TemporaryDirectory()
+        self.settings_override = self.settings(MEDIA_ROOT=self.media_root.name)
+        self.settings_override.enable()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='password')
+        self.client.force_authenticate(self.user)
+        self.recipe = sample_recipe(user=self.user)
+
+    def tearDown(self) -> None:
+        self.settings_override.disable()
+        self.media_root.cleanup()
+
+    def upload(self, image: Image.Image, **save_kwargs):
+        """Upload `image` as a JPEG to the recipe."""
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            image.save(ntf, format='JPEG', **save_kwargs)
+            ntf.seek(0)
+            return self.client.post(image_upload_url(self.recipe.id), {'image': ntf}, format='multipart')
+
+    def test_variants_generated(self):
+        """Resized variants are generated and listed on the recipe detail."""
+        self.upload(Image.new('RGB', (1600, 1200)), exif=b'Exif\x00\x00II*\x00\x08\x00\x00\x00\x00\x00')
+        with Image.open(Recipe.objects.get(pk=self.recipe.pk).image.path) as original:
+            self.assertIn('exif', original.info)
+
+        response = self.client.get(detail_url(self.recipe.id))
+        variants = {v['name']: v for v in response.data['image_variants']}
+
+        self.assertEqual(response.data['image_status'], 'ready')
+        self.assertEqual(set(variants), {'thumbnail', 'medium', 'webp'})
+        self.assertEqual(variants['thumbnail']['width'], 150)
+        self.assertLess(variants['thumbnail']['height'], 150)
+        self.assertEqual((variants['medium']['width'], variants['medium']['height']), (800, 600))
+        for variant in self.recipe.image_variants.all():
+            with Image.open(variant.image.path) as image:
+                self.assertNotIn('exif', image.info)
+        self.assertTrue(self.recipe.image_variants.get(name='webp').image.name.endswith('.webp'))
+
+    def test_variants_replaced(self):
+        """Uploading a new image replaces the variants."""
+        self.upload(Image.new('RGB', (100, 100)))
+        self.upload(Image.new('RGB', (300, 200)))
+
+        self.assertEqual(self.recipe.image_variants.count(), 3)
+        self.assertEqual(self.recipe.image_variants.get(name='medium').width, 300)
+
+    def test_processing_failure(self):
+        """A stored image that cannot be decoded is marked as failed."""
+        self.recipe.image.save('broken.jpg', ContentFile(b'not an image'))
+
+        with self.assertLogs('recipe.images', level='ERROR'):
+            images.process(self.recipe.id)
+        self.recipe.refresh_from_db()
+
+        self.assertEqual(self.recipe.image_status, 'failed')
+
+    @override_settings(RECIPE_IMAGE_PROCESSING='thread')
+    def test_processing_changes_etag(self):
+        """A client polling the recipe with its ETag sees the processing finish."""
+        self.upload(Image.new('RGB', (100, 100)))
+        pending = self.client.get(detail_url(self.recipe.id))
+
+        images.process(self.recipe.id)
+        response = self.client.get(detail_url(self.recipe.id), HTTP_IF_NONE_MATCH=pending['ETag'])
+
+        self.assertEqual(pending.data['image_status'], 'pending')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['image_status'], 'ready')
+        self.assertEqual(len(response.data['image_variants']), 3)
+
+    @override_settings(RECIPE_IMAGE_PROCESSING='thread')
+    def test_processing_queued_after_commit(self):
+        """In thread mode the processing is queued on the pool once the transaction commits."""
+        with patch('django.db.transaction.on_commit', side_effect=lambda func: func()), \
+                patch('recipe.images.get_executor') as get_executor:
+            response = self.upload(Image.new('RGB', (10, 10)))
+
+        self.assertEqual(response.data['image_status'], 'pending')
+        get_executor.return_value.submit.assert_called_once_with(images._process_in_worker, self.recipe.id)
+
+
+@override_settings(RECIPE_IMAGE_ORPHAN_GRACE=0)
+class RecipeImageStorageTestCase(TestCase):
+
+    def setUp(self) -> None:
+        self.media_root = tempfile.TemporaryDirectory()
+        self.settings_override = self.settings(MEDIA_ROOT=self.media_root.name)
+        self.settings_override.enable()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='password')
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self) -> None:
+        self.settings_override.disable()
+        self.media_root.cleanup()
+
+    def upload(self, recipe: Recipe, color: str) -> Recipe:
+        """Upload a JPEG of a single `color` to the recipe, committing right away, and return the saved recipe."""
+        with tempfile.NamedTemporaryFile(suffix='.JPG') as ntf:
+            Image.new('RGB', (10, 10), color).save(ntf, format='JPEG')
+            ntf.seek(0)
+            with patch('django.db.transaction.on_commit', side_effect=lambda func: func()), \
+                    patch('recipe.images.get_executor'):
+                self.client.post(image_upload_url(recipe.id), {'image': ntf}, format='multipart')
+
+        return Recipe.objects.get(pk=recipe.pk)
+
+    def test_identical_images_share_a_file(self):
+        """The same image uploaded to two recipes is stored once, under the hash of its content."""
+        first = self.upload(sample_recipe(user=self.user), 'red')
+        second = self.upload(sample_recipe(user=self.user, title='Other'), 'red')
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r'^uploads/recipe/[0-9a-f]{64}\.jpg$')
+        self.assertEqual(len(os.listdir(os.path.dirname(first.image.path))), 1)
+
+    def test_replaced_image_released(self):
+        """A replaced image is deleted unless another recipe still uses it."""
+        shared = self.upload(sample_recipe(user=self.user), 'red')
+        recipe = self.upload(sample_recipe(user=self.user, title='Other'), 'red')
+        recipe = self.upload(recipe, 'blue')
+
+        self.assertTrue(os.path.exists(shared.image.path))
+
+        new_path = recipe.image.path
+        self.upload(recipe, 'green')
+
+        self.assertFalse(os.path.exists(new_path))
+
+    def test_deleted_recipe_image_released(self):
+        """Deleting a recipe deletes its image file once committed."""
+        recipe = self.upload(sample_recipe(user=self.user), 'red')
+
+        with patch('django.db.transaction.on_commit', side_effect=lambda func: func()):
+            recipe.delete()
+
+        self.assertFalse(os.path.exists(recipe.image.path))
+
+    def test_image_kept_within_grace(self):
+        """A file touched within the grace period is kept, as a deduplicated upload may not be committed yet."""
+        recipe = self.upload(sample_recipe(user=self.user), 'red')
+
+        with override_settings(RECIPE_IMAGE_ORPHAN_GRACE=60):
+            self.assertFalse(images.release(recipe.image.name))
+            recipe.delete()
+            self.assertFalse(images.release(recipe.image.name))
+
+        self.assertTrue(images.release(recipe.image.name))
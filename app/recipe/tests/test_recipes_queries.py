@@ -0,0 +1,113 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+from recipe import search
+
+RECIPES_URL = reverse('recipe:recipe-list')
+BULK_URL = reverse('recipe:recipe-bulk')
+
+
+def detail_url(recipe_id):
+    """Return recipe detail URL"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class RecipeQueryCountTestCase(TestCase):
+    """Test that the recipe endpoints run a fixed number of queries regardless of the number of rows."""
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='password')
+        self.client.force_authenticate(self.user)
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.ingredient = Ingredient.objects.create(user=self.user, name='Tofu')
+        self.tags = [Tag.objects.create(user=self.user, name=f'Spicy {i}').id for i in range(3)]
+        self.ingredients = [Ingredient.objects.create(user=self.user, name=f'Chili {i}').id for i in range(3)]
+        # Looks the search table up once for the process, so it isn't counted by the first test writing a recipe.
+        search.use_fts()
+
+    def populate(self, count: int) -> None:
+        """Create `count` recipes, each with its own tag and ingredient plus the shared ones."""
+        start = Recipe.objects.count()
+        for i in range(start, start + count):
+            recipe = Recipe.objects.create(user=self.user, title=f'Recipe {i}', time_minutes=10, price=5.00)
+            recipe.tags.add(self.tag, Tag.objects.create(user=self.user, name=f'Tag {i}'))
+            recipe.ingredients.add(self.ingredient, Ingredient.objects.create(user=self.user, name=f'Ingredient {i}'))
+
+    def assertConstantQueries(self, num: int, url: str, params: dict = None) -> None:
+        """Assert that `url` runs `num` queries with both a small and a large number of recipes."""
+        for count in (1, 20):
+            self.populate(count)
+            with self.assertNumQueries(num):
+                response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_list_query_count(self):
+        """Listing recipes runs one query for the ETag, one for the recipes and one per relation."""
+        self.assertConstantQueries(4, RECIPES_URL)
+
+    def test_filtered_list_query_count(self):
+        """Filtering recipes does not add per-row queries."""
+        self.assertConstantQueries(4, RECIPES_URL, {'tags': self.tag.id, 'ingredients': self.ingredient.id})
+
+    def test_retrieve_query_count(self):
+        """Retrieving a recipe loads its tags, ingredients and image variants in one query each."""
+        self.populate(20)
+        recipe = Recipe.objects.filter(user=self.user).first()
+
+        with self.assertNumQueries(5):
+            response = self.client.get(detail_url(recipe.id))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['tags']), 2)
+        self.assertEqual(response.data['tags'][0].keys(), {'id', 'name'})
+
+    def test_create_query_count(self):
+        """
+        Creating a recipe validates each relation with one query, inserts the recipe and its links, writes each
+        statistics table once and indexes it with two reads and a write, without reading the links back. The write's
+        transaction is a savepoint pair within the test's one.
+        """
+        payload = {'title': 'Curry', 'tags': self.tags[:2], 'ingredients': self.ingredients[:2], 'time_minutes': 5,
+                   'price': 2}
+
+        with self.assertNumQueries(13):
+            response = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['tags'], self.tags[:2])
+
+    def test_update_query_count(self):
+        """Replacing a recipe and its relations reads, deletes and inserts the links once per relation."""
+        recipe = Recipe.objects.create(user=self.user, title='Curry', time_minutes=5, price=2)
+        recipe.tags.set(self.tags[:2])
+        recipe.ingredients.set(self.ingredients[:2])
+        payload = {'title': 'Red curry', 'tags': self.tags[1:], 'ingredients': self.ingredients[1:], 'time_minutes': 6,
+                   'price': 3}
+
+        with self.assertNumQueries(18):
+            response = self.client.put(detail_url(recipe.id), payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['ingredients'], self.ingredients[1:])
+        self.assertEqual(set(recipe.tags.values_list('id', flat=True)), set(self.tags[1:]))
+
+    def test_bulk_query_count(self):
+        """
+        Creating and updating recipes in bulk validates, links, counts and indexes them with one query per type. New
+        recipes are inserted one by one on SQLite, which doesn't return the IDs of bulk inserts.
+        """
+        recipes = [Recipe.objects.create(user=self.user, title=f'Old {i}', time_minutes=5, price=2) for i in range(2)]
+        payload = [{'title': f'New {i}', 'tags': self.tags, 'ingredients': self.ingredients, 'time_minutes': 5,
+                    'price': 2} for i in range(2)]
+        payload += [{'id': recipe.id, 'tags': self.tags[:1], 'price': 3} for recipe in recipes]
+
+        with self.assertNumQueries(21):
+            response = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([recipe['tags'] for recipe in response.data[2:]], [self.tags[:1]] * 2)
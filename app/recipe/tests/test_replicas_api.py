@@ -0,0 +1,131 @@
+import os
+import sqlite3
+import tempfile
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import routers
+from core.models import Recipe, Tag
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+REPLICA = 'replica_test'
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaReadApiTestCase(TransactionTestCase):
+    """
+    Test the reads sent to a replica, stood in for by a copy of the test database in another SQLite file.
+
+    The copy isn't updated by later writes, as a lagging replica, so the responses tell which database was read.
+    """
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='password')
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(user=self.user, title='Pancakes', time_minutes=10, price=5)
+
+        handle, self.replica_path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        connections['default'].ensure_connection()
+        replica = sqlite3.connect(self.replica_path)
+        connections['default'].connection.backup(replica)
+        replica.close()
+        connections.databases[REPLICA] = {**connections['default'].settings_dict, 'NAME': self.replica_path}
+
+    def tearDown(self) -> None:
+        routers.use_primary()
+        connections[REPLICA].close()
+        del connections.databases[REPLICA]
+        delattr(connections._connections, REPLICA)
+        os.remove(self.replica_path)
+
+    def test_list_read_from_replica(self):
+        """Lists are read from the replica, without the rows it hasn't received yet."""
+        Recipe.objects.create(user=self.user, title='Waffles', time_minutes=10, price=5)
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        recipes = self.client.get(RECIPES_URL)
+        tags = self.client.get(TAGS_URL)
+
+        self.assertEqual([recipe['title'] for recipe in recipes.data['results']], ['Pancakes'])
+        self.assertEqual(tags.data['results'], [])
+
+    def test_retrieve_read_from_replica(self):
+        """Details are read from the replica."""
+        Recipe.objects.filter(pk=self.recipe.pk).update(title='Crepes')
+
+        response = self.client.get(reverse('recipe:recipe-detail', args=[self.recipe.id]))
+
+        self.assertEqual(response.data['title'], 'Pancakes')
+
+    def test_writer_reads_primary(self):
+        """A user who just wrote reads from the primary, so they see their write."""
+        response = self.client.post(RECIPES_URL, {'title': 'Waffles', 'time_minutes': 10, 'price': '5.00'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Recipe.objects.count(), 2)
+
+        response = self.client.get(RECIPES_URL)
+
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_other_users_read_replica_after_write(self):
+        """Only the user who wrote is pinned to the primary."""
+        self.client.post(RECIPES_URL, {'title': 'Waffles', 'time_minutes': 10, 'price': '5.00'})
+        other_user = get_user_model().objects.create_user(email='other@example.com', password='password')
+        Recipe.objects.create(user=other_user, title='Soup', time_minutes=10, price=5)
+        self.client.force_authenticate(other_user)
+
+        response = self.client.get(RECIPES_URL)
+
+        self.assertEqual(response.data['results'], [])
+
+    def test_pin_expires(self):
+        """Reads go back to the replica once the sticky window is over."""
+        with self.settings(DB_REPLICA_STICKY_SECONDS=0):
+            self.client.post(RECIPES_URL, {'title': 'Waffles', 'time_minutes': 10, 'price': '5.00'})
+            response = self.client.get(RECIPES_URL)
+
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_sync_read_from_primary(self):
+        """Delta syncs are read from the primary, as their tokens come from the clock."""
+        Recipe.objects.create(user=self.user, title='Waffles', time_minutes=10, price=5)
+
+        response = self.client.get(RECIPES_URL, {'since': ''})
+
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_other_actions_read_primary(self):
+        """Actions other than list and retrieve are read from the primary."""
+        Recipe.objects.create(user=self.user, title='Waffles', time_minutes=10, price=5)
+
+        response = self.client.get(reverse('recipe:stats'))
+
+        self.assertEqual(response.data['recipe_count'], 2)
+
+    def test_primary_restored_after_error(self):
+        """A view raising an unhandled error sends the later reads of the thread back to the primary."""
+        with patch('recipe.views.TagViewSet.list', side_effect=ValueError('boom')):
+            with self.assertRaises(ValueError):
+                self.client.get(TAGS_URL)
+
+        self.assertIsNone(routers.ReplicaRouter().db_for_read(Recipe))
+
+    def test_no_replicas(self):
+        """Reads go to the primary without replicas."""
+        Recipe.objects.create(user=self.user, title='Waffles', time_minutes=10, price=5)
+
+        with self.settings(DATABASE_REPLICAS=[]):
+            response = self.client.get(RECIPES_URL)
+
+        self.assertEqual(len(response.data['results']), 2)
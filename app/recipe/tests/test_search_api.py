@@ -0,0 +1,164 @@
+import time
+from importlib import import_module
+from io import StringIO
+from types import SimpleNamespace
+
+from django.apps import apps
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, RecipeSearchTerm, Tag
+from recipe import search
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class RecipeSearchApiTestCase(TestCase):
+    """Test the recipe search with the FTS5 table."""
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='password')
+        self.client.force_authenticate(self.user)
+
+    def create_recipe(self, title: str, tags=(), ingredients=(), user=None) -> Recipe:
+        user = user or self.user
+        recipe = Recipe.objects.create(user=user, title=title, time_minutes=10, price=5.00)
+        recipe.tags.set(Tag.objects.get_or_create(user=user, name=name)[0] for name in tags)
+        recipe.ingredients.set(Ingredient.objects.get_or_create(user=user, name=name)[0] for name in ingredients)
+
+        return recipe
+
+    def search(self, q: str, **params) -> list:
+        response = self.client.get(RECIPES_URL, {'q': q, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        return [recipe['title'] for recipe in response.data['results']]
+
+    def test_backend(self):
+        """The FTS5 table is used on SQLite, also by processes that looked for it before it was created."""
+        self.assertTrue(search.use_fts())
+
+        database_name = connection.settings_dict['NAME']
+        search._fts_checked[database_name] = (False, time.monotonic())
+        self.assertFalse(search.use_fts())
+        search._fts_checked[database_name] = (False, time.monotonic() - search.FTS_RECHECK_SECONDS - 1)
+        self.assertTrue(search.use_fts())
+
+    def test_search_title_tags_and_ingredients(self):
+        """Terms match the title, tag names and ingredient names, by prefix and without diacritics."""
+        self.create_recipe('Crème brûlée', tags=['Dessert'], ingredients=['Cream'])
+        self.create_recipe('Omelette', tags=['Breakfast'], ingredients=['Eggs'])
+
+        self.assertEqual(self.search('creme'), ['Crème brûlée'])
+        self.assertEqual(self.search('dess'), ['Crème brûlée'])
+        self.assertEqual(self.search('egg'), ['Omelette'])
+        self.assertEqual(self.search('egg dessert'), [])
+        self.assertEqual(self.search('!!'), [])
+
+    def test_search_ranked(self):
+        """Title matches rank above tag matches, which rank above ingredient matches."""
+        self.create_recipe('Pasta', ingredients=['Tomato'])
+        self.create_recipe('Tomato soup')
+        self.create_recipe('Salad', tags=['Tomato lovers'])
+
+        self.assertEqual(self.search('tomato'), ['Tomato soup', 'Salad', 'Pasta'])
+
+    def test_search_paginated(self):
+        """Results are paginated by rank."""
+        self.create_recipe('Pasta', ingredients=['Tomato'])
+        self.create_recipe('Tomato soup')
+        self.create_recipe('Tomato salad')
+
+        response = self.client.get(RECIPES_URL, {'q': 'tomato', 'page_size': 2})
+        titles = [recipe['title'] for recipe in response.data['results']]
+        titles += [recipe['title'] for recipe in self.client.get(response.data['next']).data['results']]
+
+        self.assertEqual(len(titles), 3)
+        self.assertEqual(titles[-1], 'Pasta')
+
+    def test_search_own_recipes(self):
+        """Only the recipes of the user are searched."""
+        other = get_user_model().objects.create_user(email='other@example.com', password='password')
+        self.create_recipe('Tomato soup', user=other)
+
+        self.assertEqual(self.search('tomato'), [])
+
+    def test_index_updated(self):
+        """Renamed, removed and deleted tags and recipes are reflected in the results."""
+        recipe = self.create_recipe('Soup', tags=['Winter'])
+        tag = Tag.objects.get(name='Winter')
+
+        tag.name = 'Autumn'
+        tag.save()
+        self.assertEqual(self.search('autumn'), ['Soup'])
+        self.assertEqual(self.search('winter'), [])
+
+        recipe.tags.clear()
+        self.assertEqual(self.search('autumn'), [])
+
+        recipe.ingredients.add(Ingredient.objects.create(user=self.user, name='Leek'))
+        self.assertEqual(self.search('leek'), ['Soup'])
+        Ingredient.objects.filter(name='Leek').delete()
+        self.assertEqual(self.search('leek'), [])
+
+        self.client.patch(reverse('recipe:recipe-detail', args=[recipe.id]), {'title': 'Stew'})
+        self.assertEqual(self.search('stew'), ['Stew'])
+
+        recipe.delete()
+        self.assertEqual(self.search('stew'), [])
+
+    def test_unindexed_save_not_reindexed(self):
+        """Saving a recipe without changing its title leaves the index alone."""
+        recipe = self.create_recipe('Soup', tags=['Winter'])
+        recipe.price = 6.00
+
+        with CaptureQueriesContext(connection) as queries:
+            recipe.save()
+
+        self.assertFalse([q['sql'] for q in queries if 'search' in q['sql'].lower()])
+        self.assertEqual(self.search('soup'), ['Soup'])
+
+    def test_backfill_migration(self):
+        """The migration indexes the existing recipes, replacing their entries."""
+        self.create_recipe('Soup', tags=['Winter'])
+        Recipe.objects.update(title='Stew')
+
+        migration = import_module('core.migrations.0016_backfill_recipe_search')
+        migration.backfill_search_index(apps, SimpleNamespace(connection=connection))
+
+        self.assertEqual(self.search('stew winter'), ['Stew'])
+        self.assertEqual(self.search('soup'), [])
+
+    def test_rebuild_search_index(self):
+        """The command rebuilds the index of every recipe."""
+        self.create_recipe('Soup', tags=['Winter'])
+        Recipe.objects.update(title='Stew')
+
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+
+        self.assertIn('Indexed 1 recipes', out.getvalue())
+        self.assertEqual(self.search('stew winter'), ['Stew'])
+
+
+@override_settings(RECIPE_SEARCH_BACKEND='index')
+class RecipeTermIndexSearchApiTestCase(RecipeSearchApiTestCase):
+    """Test the recipe search with the portable term index."""
+
+    def test_backend(self):
+        """The term index is used when configured, with one row per term of each recipe."""
+        self.create_recipe('Tomato soup', ingredients=['Tomato'])
+
+        self.assertFalse(search.use_fts())
+        self.assertEqual(
+            dict(RecipeSearchTerm.objects.values_list('term', 'weight')),
+            {'tomato': 4, 'soup': 3},
+        )
@@ -0,0 +1,181 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, RecipeStats, RecipeStatsUsage, RecipeStatsValue, Tag
+from recipe import stats
+
+STATS_URL = reverse('recipe:stats')
+BULK_URL = reverse('recipe:recipe-bulk')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class PublicRecipeStatsApiTestCase(TestCase):
+
+    def test_login_required(self):
+        """The statistics require authentication."""
+        response = APIClient().get(STATS_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class RecipeStatsApiTestCase(TestCase):
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='password')
+        self.client.force_authenticate(self.user)
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+
+    def create_recipe(self, time_minutes: int, price: str, tags=(), ingredients=()) -> Recipe:
+        recipe = Recipe.objects.create(user=self.user, title='Recipe', time_minutes=time_minutes, price=price)
+        recipe.tags.set(tags)
+        recipe.ingredients.set(ingredients)
+
+        return recipe
+
+    def snapshot(self) -> tuple:
+        """Return the non-zero summary rows of the user, to compare the incremental updates with a rebuild."""
+        return (
+            list(RecipeStats.objects.filter(user=self.user)
+                 .values_list('recipe_count', 'time_minutes_total', 'price_total')),
+            sorted(RecipeStatsValue.objects.filter(user=self.user, count__gt=0)
+                   .values_list('field', 'value', 'count')),
+            sorted(RecipeStatsUsage.objects.filter(user=self.user, count__gt=0)
+                   .values_list('relation', 'object_id', 'count')),
+        )
+
+    def assertMatchesRebuild(self):
+        incremental = self.snapshot()
+        stats.rebuild([self.user.id])
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_empty(self):
+        """A user without recipes gets zero counts and no distribution."""
+        response = self.client.get(STATS_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['recipe_count'], 0)
+        self.assertIsNone(response.data['time_minutes']['average'])
+        self.assertIsNone(response.data['price']['p50'])
+        self.assertEqual(response.data['top_tags'], [])
+
+    def test_distribution(self):
+        """The average, extremes and nearest rank percentiles of times and prices are returned."""
+        for minutes in range(1, 11):
+            self.create_recipe(minutes, f'{minutes}.50')
+
+        response = self.client.get(STATS_URL)
+
+        self.assertEqual(response.data['recipe_count'], 10)
+        self.assertEqual(response.data['time_minutes'], {
+            'average': '5.50', 'min': 1, 'max': 10, 'p50': 5, 'p90': 9, 'p99': 10,
+        })
+        self.assertEqual(response.data['price']['average'], '6.00')
+        self.assertEqual(response.data['price']['p50'], '5.50')
+
+    def test_top_attrs(self):
+        """Tags and ingredients are ranked by the number of recipes using them, up to `top`."""
+        other_tag = Tag.objects.create(user=self.user, name='Quick')
+        self.create_recipe(5, '1.00', tags=[self.tag, other_tag], ingredients=[self.ingredient])
+        self.create_recipe(5, '1.00', tags=[self.tag])
+
+        response = self.client.get(STATS_URL, {'top': 1})
+
+        self.assertEqual(response.data['top_tags'], [{'id': self.tag.id, 'name': 'Vegan', 'recipe_count': 2}])
+        self.assertEqual(response.data['top_ingredients'],
+                         [{'id': self.ingredient.id, 'name': 'Salt', 'recipe_count': 1}])
+
+    def test_invalid_top(self):
+        """`top` must be between 1 and 100."""
+        response = self.client.get(STATS_URL, {'top': 0})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_other_users_excluded(self):
+        """Only the recipes of the authenticated user are counted."""
+        other_user = get_user_model().objects.create_user(email='other@example.com', password='password')
+        Recipe.objects.create(user=other_user, title='Other', time_minutes=5, price=1)
+        self.create_recipe(10, '2.00')
+
+        response = self.client.get(STATS_URL)
+
+        self.assertEqual(response.data['recipe_count'], 1)
+        self.assertEqual(response.data['time_minutes']['max'], 10)
+
+    def test_incremental_updates(self):
+        """Saves, deletions and relation changes keep the summary equal to a rebuild."""
+        other_tag = Tag.objects.create(user=self.user, name='Quick')
+        recipe = self.create_recipe(5, '1.00', tags=[self.tag, other_tag], ingredients=[self.ingredient])
+        kept = self.create_recipe(5, '1.00', tags=[self.tag])
+        self.assertMatchesRebuild()
+
+        recipe.time_minutes = 20
+        recipe.save()
+        recipe.tags.remove(other_tag, other_tag.id + 100)
+        self.tag.recipe_set.remove(kept)
+        self.assertMatchesRebuild()
+
+        self.ingredient.recipe_set.add(kept)
+        recipe.ingredients.clear()
+        other_tag.delete()
+        self.assertMatchesRebuild()
+
+        recipe.delete()
+        self.assertMatchesRebuild()
+        self.assertEqual(RecipeStats.objects.get(user=self.user).recipe_count, 1)
+
+    def test_bulk_updates(self):
+        """Recipes created and updated by the bulk endpoint are counted."""
+        recipe = self.create_recipe(5, '1.00', tags=[self.tag])
+        payload = [
+            {'id': recipe.id, 'title': 'Updated', 'time_minutes': 15, 'price': '3.00',
+             'ingredients': [self.ingredient.id]},
+            {'title': 'New', 'time_minutes': 30, 'price': '4.00', 'tags': [self.tag.id]},
+        ]
+
+        response = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertMatchesRebuild()
+        self.assertEqual(self.client.get(STATS_URL).data['time_minutes']['max'], 30)
+
+    def test_api_writes(self):
+        """Recipes created and updated through the recipe endpoints are counted along with their links."""
+        other_tag = Tag.objects.create(user=self.user, name='Quick')
+        payload = {'title': 'Soup', 'time_minutes': 10, 'price': '2.00', 'tags': [self.tag.id],
+                   'ingredients': [self.ingredient.id]}
+        response = self.client.post(RECIPES_URL, payload, format='json')
+        self.assertMatchesRebuild()
+
+        payload.update(time_minutes=20, tags=[other_tag.id], ingredients=[])
+        self.client.put(reverse('recipe:recipe-detail', args=[response.data['id']]), payload, format='json')
+        self.assertMatchesRebuild()
+
+        top_tags = self.client.get(STATS_URL).data['top_tags']
+        self.assertEqual([tag['id'] for tag in top_tags], [other_tag.id])
+
+    def test_stats_queries_constant(self):
+        """The statistics are read with a fixed number of queries whatever the number of recipes."""
+        for _ in range(5):
+            self.create_recipe(5, '1.00', tags=[self.tag], ingredients=[self.ingredient])
+
+        with self.assertNumQueries(7):
+            self.client.get(STATS_URL)
+
+    def test_rebuild_recipe_stats(self):
+        """The command recomputes the summary of recipes written without signals."""
+        self.create_recipe(5, '1.00', tags=[self.tag])
+        Recipe.objects.update(time_minutes=8)
+
+        out = StringIO()
+        call_command('rebuild_recipe_stats', stdout=out)
+
+        self.assertIn('of 1 users', out.getvalue())
+        self.assertEqual(self.client.get(STATS_URL).data['time_minutes']['min'], 8)
@@ -0,0 +1,121 @@
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Tombstone
+from recipe import sync
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+class DeltaSyncApiTestCase(TestCase):
+    """Test the delta sync mode of the list endpoints."""
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='password')
+        self.client.force_authenticate(self.user)
+
+    def sync(self, url: str, token: str = '') -> dict:
+        response = self.client.get(url, {'since': token})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_full_sync(self):
+        """An empty token returns every object and a token."""
+        recipe = Recipe.objects.create(user=self.user, title='Soup', time_minutes=5, price=2.00)
+        other_user = get_user_model().objects.create_user(email='other@example.com', password='password')
+        Recipe.objects.create(user=other_user, title='Not mine', time_minutes=5, price=2.00)
+
+        data = self.sync(RECIPES_URL)
+
+        self.assertEqual([r['id'] for r in data['results']], [recipe.id])
+        self.assertEqual(data['deleted'], [])
+        self.assertTrue(data['token'])
+
+    def test_changes_since_token(self):
+        """Only the objects written after the token are returned, with the deleted IDs."""
+        kept = Recipe.objects.create(user=self.user, title='Kept', time_minutes=5, price=2.00)
+        modified = Recipe.objects.create(user=self.user, title='Modified', time_minutes=5, price=2.00)
+        deleted = Recipe.objects.create(user=self.user, title='Deleted', time_minutes=5, price=2.00)
+        Recipe.objects.filter(pk=kept.pk).update(modified=timezone.now() - timedelta(minutes=1))
+        with self.settings(SYNC_TOKEN_OVERLAP=0):
+            token = self.sync(RECIPES_URL)['token']
+
+        modified.title = 'Modified again'
+        modified.save()
+        deleted_id = deleted.id
+        deleted.delete()
+        created = Recipe.objects.create(user=self.user, title='Created', time_minutes=5, price=2.00)
+        data = self.sync(RECIPES_URL, token)
+
+        self.assertEqual([r['id'] for r in data['results']], [modified.id, created.id])
+        self.assertEqual(data['deleted'], [deleted_id])
+        self.assertNotEqual(data['token'], token)
+
+    def test_tag_changes_since_token(self):
+        """Tags created, renamed and deleted since the token are reported."""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        Tag.objects.filter(pk=tag.pk).update(modified=timezone.now() - timedelta(minutes=1))
+        with self.settings(SYNC_TOKEN_OVERLAP=0):
+            token = self.sync(TAGS_URL)['token']
+
+        tag_id = tag.id
+        tag.delete()
+        new_tag = Tag.objects.create(user=self.user, name='Dessert')
+        data = self.sync(TAGS_URL, token)
+
+        self.assertEqual([t['id'] for t in data['results']], [new_tag.id])
+        self.assertEqual(data['deleted'], [tag_id])
+
+    def test_sync_paginated(self):
+        """Changes are returned in pages, with the token on the last one and the objects written meanwhile."""
+        recipes = [Recipe.objects.create(user=self.user, title=f'Recipe {i}', time_minutes=5, price=2.00)
+                   for i in range(3)]
+
+        first = self.client.get(RECIPES_URL, {'since': '', 'page_size': 2}).data
+        recipes[0].title = 'Updated'
+        recipes[0].save()
+        second = self.client.get(first['next']).data
+
+        self.assertEqual([r['id'] for r in first['results']], [recipes[0].id, recipes[1].id])
+        self.assertIsNone(first['token'])
+        self.assertEqual([r['id'] for r in second['results']], [recipes[2].id, recipes[0].id])
+        self.assertIsNone(second['next'])
+        self.assertTrue(second['token'])
+
+    def test_invalid_token(self):
+        """A tampered token is rejected."""
+        response = self.client.get(RECIPES_URL, {'since': 'not-a-token'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_expired_token(self):
+        """A token older than the tombstone retention asks for a full sync."""
+        with patch('django.utils.timezone.now', return_value=timezone.now() - timedelta(days=365)):
+            token = sync.make_token()
+
+        response = self.client.get(RECIPES_URL, {'since': token})
+
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
+    def test_prune_tombstones(self):
+        """Tombstones older than the retention period are deleted."""
+        old = Tombstone.objects.create(user_id=self.user.id, model='recipe', object_id=1)
+        Tombstone.objects.filter(pk=old.pk).update(deleted=timezone.now() - timedelta(days=365))
+        Tombstone.objects.create(user_id=self.user.id, model='recipe', object_id=2)
+        out = StringIO()
+
+        call_command('prune_tombstones', stdout=out)
+
+        self.assertEqual(list(Tombstone.objects.values_list('object_id', flat=True)), [2])
+        self.assertIn('Deleted 1 tombstones.', out.getvalue())
@@ -41,7 +41,7 @@ class PrivateTagsApiTestCase(TestCase):
         response = self.client.get(TAGS_URL)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data['results'], serializer.data)
 
     def test_tags_limited_to_owner(self):
         """Test that tags returned are only belong to the authenticated user."""
@@ -52,8 +52,8 @@ class PrivateTagsApiTestCase(TestCase):
         response = self.client.get(TAGS_URL)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['name'], tag.name)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['name'], tag.name)
 
     def test_create_tag_successful(self):
         """Test creating a new tag."""
@@ -84,8 +84,8 @@ class PrivateTagsApiTestCase(TestCase):
 
         response = self.client.get(TAGS_URL, {'assigned_only': 1})
 
-        self.assertIn(serializer1.data, response.data)
-        self.assertNotIn(serializer2.data, response.data)
+        self.assertIn(serializer1.data, response.data['results'])
+        self.assertNotIn(serializer2.data, response.data['results'])
 
     def test_retrive_unique_tags(self):
         """Filtering tags by assigned returns unique item."""
@@ -98,5 +98,50 @@ class PrivateTagsApiTestCase(TestCase):
 
         response = self.client.get(TAGS_URL, {'assigned_only': 1})
 
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
 
+    def test_tags_paginated_by_name(self):
+        """Tags are paginated in descending name order."""
+        for name in ('Breakfast', 'Lunch', 'Dinner'):
+            Tag.objects.create(user=self.user, name=name)
+
+        response = self.client.get(TAGS_URL, {'page_size': 2})
+        next_response = self.client.get(response.data['next'])
+
+        self.assertEqual([t['name'] for t in response.data['results']], ['Lunch', 'Dinner'])
+        self.assertEqual([t['name'] for t in next_response.data['results']], ['Breakfast'])
+        self.assertIsNone(next_response.data['next'])
+
+    def test_retrieve_tags_usage_count(self):
+        """The number of recipes using each tag is returned when requested."""
+        used = Tag.objects.create(user=self.user, name='Used')
+        Tag.objects.create(user=self.user, name='Unused')
+        for title in ('First', 'Second'):
+            recipe = Recipe.objects.create(title=title, time_minutes=5, price=3.00, user=self.user)
+            recipe.tags.add(used)
+
+        response = self.client.get(TAGS_URL, {'usage_count': 1})
+        counts = {item['name']: item['usage_count'] for item in response.data['results']}
+
+        self.assertEqual(counts, {'Used': 2, 'Unused': 0})
+        self.assertNotIn('usage_count', self.client.get(TAGS_URL).data['results'][0])
+
+    def test_retrieve_tags_invalid_flags(self):
+        """Flags that are not booleans return 400."""
+        for params in ({'usage_count': 'yes please'}, {'assigned_only': 'x'}):
+            response = self.client.get(TAGS_URL, params)
+
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+    def test_create_duplicate_tag_invalid(self):
+        """Test that a user cannot create two tags with the same name."""
+        Tag.objects.create(user=self.user, name='Vegan')
+        other_user = get_user_model().objects.create_user(email='other@example.com', password='password')
+        Tag.objects.create(user=other_user, name='Dessert')
+
+        duplicate = self.client.post(TAGS_URL, {'name': 'Vegan'})
+        other_users_name = self.client.post(TAGS_URL, {'name': 'Dessert'})
+
+        self.assertEqual(duplicate.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(other_users_name.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Tag.objects.filter(user=self.user, name='Vegan').count(), 1)
@@ -0,0 +1,67 @@
+from PIL import Image
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions, status
+
+# Room left in the request body for the multipart boundaries, part headers and other fields.
+BODY_OVERHEAD = 64 * 2 ** 10
+
+
+class ImageTooLarge(exceptions.APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = _('Image upload is too large.')
+    default_code = 'image_too_large'
+
+
+class BoundedImageUploadHandler(TemporaryFileUploadHandler):
+    """
+    Upload handler streaming an image to a temporary file within `RECIPE_IMAGE_MAX_UPLOAD_SIZE` bytes.
+
+    The body is read in `chunk_size` chunks written straight to disk, so the memory used per upload is bounded whatever
+    the image size. A body announcing more than the limit is refused before any of it is read, and a file growing past
+    the limit aborts the upload at the chunk crossing it. Once complete, only the image header is read to check its
+    format and dimensions, so a decompression bomb is refused without decoding a single pixel.
+    """
+
+    chunk_size = 64 * 2 ** 10
+
+    def __init__(self, request=None) -> None:
+        super().__init__(request)
+        self.max_size = settings.RECIPE_IMAGE_MAX_UPLOAD_SIZE
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None) -> None:
+        if content_length and content_length > self.max_size + BODY_OVERHEAD:
+            raise ImageTooLarge()
+
+    def receive_data_chunk(self, raw_data: bytes, start: int) -> None:
+        if start + len(raw_data) > self.max_size:
+            self.file.close()
+            raise ImageTooLarge()
+        super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size: int):
+        file = super().file_complete(file_size)
+        try:
+            check_image_header(file)
+        except exceptions.ValidationError:
+            file.close()
+            raise
+        file.seek(0)
+
+        return file
+
+
+def check_image_header(file) -> None:
+    """Check the format and dimensions of an image from its header, without decoding it."""
+    try:
+        image = Image.open(file)
+    except Exception:
+        raise exceptions.ValidationError({'image': [_('Upload a valid image.')]})
+
+    if image.format not in settings.RECIPE_IMAGE_FORMATS:
+        raise exceptions.ValidationError({'image': [_('Unsupported image format %s.') % image.format]})
+    width, height = image.size
+    if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+        raise exceptions.ValidationError({'image': [_('Image of %(width)sx%(height)s pixels is too large.') % {
+            'width': width, 'height': height}]})
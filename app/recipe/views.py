@@ -1,30 +1,53 @@
-from typing import List
-
+from django.db import transaction
+from django.db.models import Count, Exists, IntegerField, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
+from django.http import StreamingHttpResponse
 from django.db.models.query import QuerySet
 from rest_framework import viewsets, mixins, status
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.request import Request
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from core.authentication import CachedTokenAuthentication
 from core.models import Tag, Ingredient, Recipe
-from recipe import serializers
+from core.profiling import ProfilingMixin
+from recipe import filters, images, search, serializers, stats, sync, uploads
+from recipe.export import export_recipes
+from recipe.mixins import CachedListMixin, ConditionalGetMixin, DeltaSyncMixin, ReplicaReadMixin
+from recipe.pagination import RecipeCursorPagination
 
 
-class BaseRecipeAttrViewSet(viewsets.GenericViewSet, mixins.ListModelMixin, mixins.CreateModelMixin):
+class BaseRecipeAttrViewSet(ReplicaReadMixin, DeltaSyncMixin, CachedListMixin, viewsets.GenericViewSet,
+                            mixins.ListModelMixin, mixins.CreateModelMixin):
     """Base view set for user owned recipes attributes."""
-    authentication_classes = (TokenAuthentication, )
+    authentication_classes = (CachedTokenAuthentication, )
     permission_classes = (IsAuthenticated, )
+    pagination_class = RecipeCursorPagination
 
     def get_queryset(self) -> QuerySet:
         """Return object for the current authenticated user only."""
-        assigned_only = bool(
-            int(self.request.query_params.get('assigned_only', 0))
+        params = filters.RecipeAttrFilterSerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        queryset = self.queryset.filter(user=self.request.user)
+        if params.validated_data.get('assigned_only'):
+            queryset = queryset.annotate(assigned=Exists(self._recipe_links())).filter(assigned=True)
+        if params.validated_data.get('usage_count'):
+            queryset = queryset.annotate(usage_count=self._usage_count())
+        return queryset.order_by('-name')
+
+    def _recipe_links(self) -> QuerySet:
+        """Return the recipe links of the outer object, as a correlated subquery on the M2M through table."""
+        relation = getattr(Recipe, self.recipe_relation)
+        return relation.through.objects.filter(**{relation.field.m2m_reverse_field_name(): OuterRef('pk')})
+
+    def _usage_count(self) -> Coalesce:
+        """Return the number of recipes using the outer object, as a correlated subquery."""
+        links = self._recipe_links().order_by().values(
+            getattr(Recipe, self.recipe_relation).field.m2m_reverse_field_name()
         )
-        queryset = self.queryset
-        queryset = queryset.filter(recipe__isnull=False) if assigned_only else queryset
-        return queryset.filter(user=self.request.user).order_by('-name').distinct()
+        return Coalesce(Subquery(links.annotate(count=Count('*')).values('count'), output_field=IntegerField()), 0)
 
     def perform_create(self, serializer):
         """Create a new object."""
@@ -35,35 +58,48 @@ class TagViewSet(BaseRecipeAttrViewSet):
     """Manage tags in the database."""
     queryset = Tag.objects.all()
     serializer_class = serializers.TagSerializer
+    recipe_relation = 'tags'
 
 
 class IngredientViewSet(BaseRecipeAttrViewSet):
     """Manage ingredients in the database."""
     queryset = Ingredient.objects.all()
     serializer_class = serializers.IngredientSerializer
+    recipe_relation = 'ingredients'
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ProfilingMixin, ReplicaReadMixin, DeltaSyncMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     """Manage recipes in the database."""
     serializer_class = serializers.RecipeSerializer
     queryset = Recipe.objects.all()
-    authentication_classes = (TokenAuthentication, )
+    authentication_classes = (CachedTokenAuthentication, )
     permission_classes = (IsAuthenticated, )
+    pagination_class = RecipeCursorPagination
+    prefetch_fields = {
+        'list': ('id', ),
+        'retrieve': ('id', 'name'),
+        'bulk': ('id', ),
+        'cookable': ('id', ),
+    }
 
     def get_queryset(self) -> QuerySet:
         """Retrieve the recipes for the authenticated user."""
         qs = self.queryset.filter(user=self.request.user)
-        tags = self.request.query_params.get('tags')
-        ingredients = self.request.query_params.get('ingredients')
 
-        if tags:
-            tag_ids = self._params_to_ints(tags)
-            qs = qs.filter(tags__id__in=tag_ids)
-        if ingredients:
-            ingredient_ids = self._params_to_ints(ingredients)
-            qs = qs.filter(ingredients__id__in=ingredient_ids)
+        if self.action == 'list':
+            q = self.request.query_params.get('q')
+            if q:
+                qs = search.search(qs, q, self.request.user.id)
+            qs = filters.filter_recipes(qs, self.request.query_params)
+
+        return self._prefetch_related_objects(qs)
 
-        return qs
+    def get_sync_queryset(self) -> QuerySet:
+        """Return all recipes of the user with the related IDs the list serializer renders."""
+        return self.queryset.filter(user=self.request.user).prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.only('id')),
+            Prefetch('ingredients', queryset=Ingredient.objects.only('id')),
+        )
 
     def get_serializer_class(self):
         """Return appropriate serializer class."""
@@ -71,6 +107,10 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return serializers.RecipeDetailSerializer
         elif self.action == 'upload_image':
             return serializers.RecipeImageSerializer
+        elif self.action == 'bulk':
+            return serializers.RecipeBulkItemSerializer
+        elif self.action == 'cookable':
+            return serializers.CookableRecipeSerializer
 
         return serializers.RecipeSerializer
 
@@ -82,22 +122,125 @@ class RecipeViewSet(viewsets.ModelViewSet):
         :type serializer: RecipeSerializer
         :return: None
         """
-        serializer.save(user=self.request.user)
+        with transaction.atomic(), search.deferred(), stats.deferred(), sync.deferred():
+            serializer.save(user=self.request.user)
+
+    def update(self, request: Request, *args, **kwargs) -> Response:
+        """Update a recipe, rendering the tags and ingredients it was given rather than reading them back."""
+        partial = kwargs.pop('partial', False)
+        serializer = self.get_serializer(self.get_object(), data=request.data, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        # Unlike UpdateModelMixin, the prefetch cache isn't dropped: the update actions don't prefetch, so it only holds
+        # the relations the serializer just wrote.
+        self.perform_update(serializer)
+
+        return Response(serializer.data)
+
+    def perform_update(self, serializer: serializers.RecipeSerializer) -> None:
+        """Update a recipe, indexing, counting and touching it once after its relations are set."""
+        with transaction.atomic(), search.deferred(), stats.deferred(), sync.deferred():
+            serializer.save()
 
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request: Request, pk: int = None) -> Response:
-        """Upload an image to the selected recipe."""
+        """
+        Upload an image to the selected recipe.
+
+        The image is stored as uploaded and its variants are generated in the background, so the response only reports
+        the processing status. The variants are listed on the recipe detail once the status is `ready`.
+        """
         del pk
 
         recipe = self.get_object()
+        # Set before the body is parsed, so the upload is bounded and checked while it streams in.
+        request.upload_handlers = [uploads.BoundedImageUploadHandler(request)]
         serializer = self.get_serializer(recipe, data=request.data)
 
         if serializer.is_valid():
             serializer.save()
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            images.schedule(recipe)
+            return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-    @staticmethod
-    def _params_to_ints(params: str) -> List[int]:
-        """Convert a string of IDs to a list intergers of IDs."""
-        return [int(str_id) for str_id in params.split(',')]
+    def _prefetch_related_objects(self, queryset: QuerySet) -> QuerySet:
+        """
+        Prefetch tags and ingredients for the actions that render them.
+
+        The list serializer only renders the related IDs while the detail serializer also renders the names, so each
+        action fetches just the columns it needs in one query per relation instead of one query per recipe.
+        """
+        related_fields = self.prefetch_fields.get(self.action)
+        if related_fields is None:
+            return queryset
+
+        queryset = queryset.prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.only(*related_fields)),
+            Prefetch('ingredients', queryset=Ingredient.objects.only(*related_fields)),
+        )
+        return queryset.prefetch_related('image_variants') if self.action == 'retrieve' else queryset
+
+    @action(methods=['POST'], detail=False)
+    def bulk(self, request: Request) -> Response:
+        """
+        Create and update many recipes in one request.
+
+        Items with an `id` update the matching recipe with the fields they give, the others are created. Nothing is
+        written unless every item is valid, in which case the errors are returned in the order of the submitted items.
+        """
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        recipes = serializer.save(user=request.user)
+
+        saved = self._prefetch_related_objects(self.queryset.filter(id__in=[recipe.id for recipe in recipes])).in_bulk()
+        output = serializers.RecipeSerializer([saved[recipe.id] for recipe in recipes], many=True)
+
+        return Response(output.data, status=status.HTTP_201_CREATED)
+
+    @action(methods=['GET'], detail=False)
+    def cookable(self, request: Request) -> Response:
+        """
+        Rank the recipes by how many of their ingredients are on hand, with the missing ones.
+
+        The ingredients on hand are given as `ingredients=` IDs, and `max_missing=` leaves out the recipes missing more
+        ingredients than that. Recipes using none of them are not returned.
+        """
+        params = filters.CookableParamsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        on_hand = params.validated_data['ingredients']
+
+        queryset = filters.cookable_recipes(self.get_queryset(), on_hand, params.validated_data.get('max_missing'))
+        page = self.paginate_queryset(queryset)
+        context = self.get_serializer_context()
+        context['missing_ingredients'] = filters.missing_ingredients([recipe.id for recipe in page], on_hand)
+        serializer = self.get_serializer_class()(page, many=True, context=context)
+
+        return self.get_paginated_response(serializer.data)
+
+    @action(methods=['GET'], detail=False)
+    def export(self, request: Request) -> StreamingHttpResponse:
+        """Stream every recipe of the authenticated user as newline delimited JSON."""
+        queryset = self.queryset.filter(user=request.user)
+        response = StreamingHttpResponse(export_recipes(queryset, request), content_type='application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename="recipes.ndjson"'
+
+        return response
+
+
+class RecipeStatsView(APIView):
+    """Statistics of the recipes of the authenticated user."""
+    authentication_classes = (CachedTokenAuthentication, )
+    permission_classes = (IsAuthenticated, )
+
+    def get(self, request: Request) -> Response:
+        """
+        Return the recipe count, the distribution of times and prices and the `top=` most used tags and ingredients.
+
+        They are read from summary tables kept up to date as recipes are written, so the cost doesn't grow with the
+        number of recipes.
+        """
+        params = serializers.RecipeStatsParamsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+
+        summary = stats.get_stats(request.user, params.validated_data['top'])
+
+        return Response(serializers.RecipeStatsSerializer(summary).data)
@@ -0,0 +1,48 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import authenticate, get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import override_settings
+
+
+class Rollback(Exception):
+    """Raised to roll back the benchmark user."""
+
+
+class Command(BaseCommand):
+    """Django command to measure the login throughput of one core with the configured password hashing."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=20, help='Number of timed logins.')
+        parser.add_argument('--hasher', choices=list(settings.PASSWORD_HASHER_CHOICES),
+                            help='Hasher to benchmark instead of PASSWORD_HASHER.')
+
+    def handle(self, *args, **options):
+        hasher = options['hasher'] or settings.PASSWORD_HASHER
+        preferred = settings.PASSWORD_HASHER_CHOICES[hasher]
+        hashers = [preferred] + [h for h in settings.PASSWORD_HASHERS if h != preferred]
+        try:
+            with override_settings(PASSWORD_HASHERS=hashers), transaction.atomic():
+                self.run(hasher, options['logins'])
+                raise Rollback
+        except Rollback:
+            pass
+        except Exception as exc:
+            raise CommandError(f'Benchmark failed: {exc}') from exc
+
+    def run(self, hasher: str, logins: int) -> None:
+        """Time `logins` sequential logins, each hashing the password once."""
+        email, password = 'benchmark-login@example.com', 'benchmark-password'
+        get_user_model().objects.create_user(email=email, password=password)
+
+        start = time.perf_counter()
+        for _ in range(logins):
+            if authenticate(username=email, password=password) is None:
+                raise CommandError('Login failed.')
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{hasher}: {logins} logins in {elapsed:.2f} s, {elapsed / logins * 1000:.1f} ms per login, '
+            f'{logins / elapsed:.1f} logins per second per core'))
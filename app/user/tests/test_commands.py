@@ -0,0 +1,17 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+
+class CommandsTestCase(TestCase):
+
+    @override_settings(PASSWORD_PBKDF2_ITERATIONS=1000)
+    def test_benchmark_login(self):
+        """The benchmark prints the login throughput and rolls back its user."""
+        out = StringIO()
+        call_command('benchmark_login', logins=2, hasher='pbkdf2', stdout=out)
+
+        self.assertIn('pbkdf2: 2 logins', out.getvalue())
+        self.assertFalse(get_user_model().objects.exists())
@@ -1,4 +1,6 @@
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from rest_framework.test import APIClient
@@ -74,6 +76,42 @@ class PublicUserApiTestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('token', response.data)
 
+    @override_settings(TOKEN_AUTH_CACHE_ALIAS='default')
+    def test_create_token_reused_without_writes(self):
+        """Logging in again returns the existing token without writing to the database."""
+        payload = {
+            'email': 'user@example.com',
+            'password': 'password',
+        }
+        create_user(**payload)
+        token = self.client.post(TOKEN_URL, payload).data['token']
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(TOKEN_URL, payload)
+        writes = [q['sql'] for q in queries if not q['sql'].startswith('SELECT')]
+
+        self.assertEqual(response.data['token'], token)
+        self.assertEqual(writes, [])
+        with self.assertNumQueries(0):
+            self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+            self.client.get(ME_URL)
+
+    def test_create_token_upgrades_password_hash(self):
+        """A login rehashes the password when the hashing costs changed."""
+        payload = {
+            'email': 'user@example.com',
+            'password': 'password',
+        }
+        with override_settings(PASSWORD_PBKDF2_ITERATIONS=1000):
+            user = create_user(**payload)
+
+        response = self.client.post(TOKEN_URL, payload)
+        user.refresh_from_db()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$150000$'))
+        self.assertTrue(user.check_password(payload['password']))
+
     def test_create_token_invalid_credentials(self):
         """A token is NOT created if invalid credentials are given."""
         create_user(email='user@example.com', password='password')
@@ -1,7 +1,11 @@
-from rest_framework import generics, authentication, permissions
+from rest_framework import generics, permissions
+from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.request import Request
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
 
+from core.authentication import CachedTokenAuthentication, cache_token
 from user.serializers import UserSerializer, AuthTokenSerializer
 
 
@@ -15,11 +19,18 @@ class CreateTokenView(ObtainAuthToken):
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
 
+    def post(self, request: Request, *args, **kwargs) -> Response:
+        """Return the token of the user, also caching it, when caching is enabled, for the requests that follow."""
+        response = super().post(request, *args, **kwargs)
+        cache_token(Token.objects.select_related('user').get(key=response.data['token']))
+
+        return response
+
 
 class ManageUserView(generics.RetrieveUpdateAPIView):
     """Manage the authenticated user."""
     serializer_class = UserSerializer
-    authentication_classes = (authentication.TokenAuthentication, )
+    authentication_classes = (CachedTokenAuthentication, )
     permission_classes = (permissions.IsAuthenticated, )
 
     def get_object(self):